@@ -0,0 +1,85 @@
+import os
+import time
+import random
+import threading
+import numpy as np
+from tracing import record, increment
+
+# Latency masking: when validation and extraction run long, a short
+# prerendered acknowledgement plays in the background so the rep does not
+# hear dead air. It is stopped, or allowed to finish its last syllable,
+# before the real response starts.
+ACK_DELAY = float(os.getenv('ACK_DELAY', '0.8'))    # processing time before the first acknowledgement
+ACK_REPEAT = float(os.getenv('ACK_REPEAT', '3.0'))  # gap before a follow-up while still busy
+ACK_MAX = int(os.getenv('ACK_MAX', '2'))            # acknowledgements per turn at most
+ACK_MAX_TAIL = 0.6                                  # how long stop() lets a playing clip finish
+
+FIRST_ACKS = ["Got it.", "Okay.", "Thank you."]
+FOLLOW_UP_ACKS = ["One moment please.", "Just a second.", "Still checking, one moment."]
+
+
+def _play_pcm(pcm, sample_rate):
+    import simpleaudio as sa
+    return sa.WaveObject(memoryview(pcm), 1, 2, sample_rate).play()
+
+
+class AcknowledgementPlayer:
+    def __init__(self, clip_bank, first=FIRST_ACKS, follow_ups=FOLLOW_UP_ACKS, delay=ACK_DELAY,
+                 repeat=ACK_REPEAT, max_acks=ACK_MAX, play=_play_pcm, seed=None):
+        self.sample_rate = clip_bank.sample_rate
+        self.first = [np.ascontiguousarray(clip_bank.carrier(text)) for text in first]
+        self.follow_ups = [np.ascontiguousarray(clip_bank.carrier(text)) for text in follow_ups]
+        self.delay = delay
+        self.repeat = repeat
+        self.max_acks = max_acks
+        self.play = play
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._play_obj = None
+        print(f"Acknowledgements ready: {len(self.first) + len(self.follow_ups)} clips")
+
+    def _run(self, stop, started):
+        wait = self.delay
+        for count in range(self.max_acks):
+            if stop.wait(wait):
+                return
+            pcm = self.random.choice(self.first if count == 0 else self.follow_ups)
+            with self._lock:
+                if stop.is_set():
+                    return
+                try:
+                    self._play_obj = self.play(pcm, self.sample_rate)
+                except Exception as e:
+                    print(f"Error playing acknowledgement: {str(e)}")
+                    return
+            increment('acks_played')
+            record('ack_start', time.perf_counter() - started)
+            wait = self.repeat + len(pcm) / self.sample_rate
+
+    def start(self):
+        """Arm the timer for the turn being processed; nothing plays if stop() comes first"""
+        self.stop()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop, time.perf_counter()), daemon=True)
+        self._thread.start()
+
+    def stop(self, tail=ACK_MAX_TAIL):
+        """Cancel pending acknowledgements and let a playing one finish briefly before cutting it"""
+        self._stop.set()
+        with self._lock:
+            play_obj, self._play_obj = self._play_obj, None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if play_obj is None:
+            return
+        deadline = time.perf_counter() + tail
+        try:
+            while play_obj.is_playing() and time.perf_counter() < deadline:
+                time.sleep(0.02)
+            if play_obj.is_playing():
+                play_obj.stop()
+        except Exception as e:
+            print(f"Error stopping acknowledgement: {str(e)}")
@@ -0,0 +1,247 @@
+"""Batch extraction benchmark over insurance_qa_sample.json.
+
+Streams (question, answer) pairs -- the labelled sample answers plus synthetic
+paraphrases -- through InsuranceVerification's extractors across a process
+pool, and reports throughput, latency percentiles and accuracy per extractor
+and per backend (local fast path, cache, LLM).
+
+    python batch_extract.py --pairs 5000 --workers 4
+    python batch_extract.py --backends llm --llm local --llm-latency 0.05
+    python batch_extract.py --llm gemini --pairs 200 --workers 2
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from tracing import percentile
+from utils import fake_patient
+from schema import SPEC_BY_FIELD
+
+SAMPLE_FILE = 'insurance_qa_sample.json'
+
+PREFIXES = ['', '', 'Um, ', 'Let me check. ', 'Alright, ', 'One moment... ', 'So, ']
+SUFFIXES = ['', '', ' Anything else?', ' Is there anything else I can help with?', ' Let me know if you need more.']
+
+AMOUNT_FIELDS = {'annual_maximum', 'remaining_maximum', 'deductible', 'deductible_met'}
+PERCENTAGE_FIELDS = {'preventive', 'basic', 'major', 'periodontics', 'endodontics'}
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+               'September', 'October', 'November', 'December']
+
+AMOUNT_TEMPLATES = ["It's ${value:,}.", "That would be {value} dollars.", "The amount is ${value}.",
+                    "We show ${value:,} on file."]
+PERCENTAGE_TEMPLATES = ["It's covered at {value}%.", "That's {value} percent.", "We cover {value} percent of that.",
+                        "Coverage is {value}% after deductible."]
+DATE_TEMPLATES = ["Coverage started on {month_name} {day}, {year}.", "The effective date is {month}/{day}/{year}.",
+                  "It became effective {month_name} {day}, {year}."]
+
+_verification = None
+
+
+def load_samples(path=SAMPLE_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def labelled_pairs(samples):
+    """(category, field, question, answer, expected) for every labelled sample answer"""
+    for category, fields in samples.items():
+        for field, entry in fields.items():
+            for answer, expected in zip(entry['sample_answers'], entry.get('expected_answers', [])):
+                yield category, field, entry['question'], answer, expected
+
+
+def _generated(rng, category, field, question):
+    """A synthetic answer with a known label, or None for fields without a generator"""
+    if field in AMOUNT_FIELDS:
+        value = rng.choice([25, 50, 75, 100, 150, 250, 500, 750, 1000, 1200, 1500, 2000, 2500, 3000])
+        return category, field, question, rng.choice(AMOUNT_TEMPLATES).format(value=value), value
+    if field in PERCENTAGE_FIELDS:
+        value = rng.choice([0, 20, 40, 50, 60, 70, 75, 80, 90, 100])
+        return category, field, question, rng.choice(PERCENTAGE_TEMPLATES).format(value=value), value
+    if field == 'effective_date':
+        month, day, year = rng.randint(1, 12), rng.randint(1, 28), rng.randint(2019, 2025)
+        answer = rng.choice(DATE_TEMPLATES).format(
+            month_name=MONTH_NAMES[month - 1], month=month, day=day, year=year
+        )
+        return category, field, question, answer, f"{month:02d}/{day:02d}/{year}"
+    return None
+
+
+def stream_pairs(samples, total, seed=0):
+    """Yield (category, field, question, answer, expected, source) until total pairs"""
+    rng = random.Random(seed)
+    pairs = list(labelled_pairs(samples))
+    count = 0
+    for category, field, question, answer, expected in pairs:
+        if count >= total:
+            return
+        yield category, field, question, answer, expected, 'sample'
+        count += 1
+
+    while count < total:
+        category, field, question, answer, expected = rng.choice(pairs)
+        item = _generated(rng, category, field, question) if rng.random() < 0.5 else None
+        if item:
+            yield item + ('generated',)
+        else:
+            answer = f"{rng.choice(PREFIXES)}{answer}{rng.choice(SUFFIXES)}"
+            yield category, field, question, answer, expected, 'paraphrase'
+        count += 1
+
+
+def normalize(value):
+    """Comparable form of an extracted value: numbers numerically, text casefolded"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return ('bool', value)
+    if isinstance(value, (int, float)):
+        return ('number', round(float(value), 2))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((str(k).strip().casefold(), str(v).strip().casefold())
+                                     for k, v in value.items())))
+    return ('text', str(value).strip().casefold())
+
+
+def _init_worker(llm, latency, jitter, backends):
+    global _verification
+    from verification import InsuranceVerification
+    chat = None
+    if llm == 'local':
+        from local_llm import LocalChat
+        chat = LocalChat(latency, jitter, seed=os.getpid())
+    _verification = InsuranceVerification("Batch Dental", fake_patient(), chat=chat)
+    _verification.extraction_backends = tuple(backends)
+
+
+def _extractor(category, field):
+    if field == 'group_number':
+        return 'extract_group_number', _verification.extract_group_number
+    function = _verification.extractor(SPEC_BY_FIELD[(category, field)])
+    name = 'extract_boolean' if function.__name__ == '_extract_boolean_answer' else function.__name__
+    return name, function
+
+
+def _run_chunk(chunk):
+    results = []
+    for category, field, question, answer, expected, source in chunk:
+        name, function = _extractor(category, field)
+        start = time.perf_counter()
+        try:
+            value = function(answer, question)
+        except Exception as e:
+            print(f"Error extracting {category}.{field}: {str(e)}")
+            value = None
+        elapsed = time.perf_counter() - start
+        results.append({
+            'extractor': name,
+            'field': f"{category}.{field}",
+            'source': source,
+            'backend': _verification.last_extraction_backend or 'none',
+            'latency_s': elapsed,
+            'correct': normalize(value) == normalize(expected)
+        })
+    return results
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(pairs, workers, chunk_size, llm='local', latency=0.0, jitter=0.0, backends=('local', 'cache', 'llm')):
+    """Run pairs through a process pool, keeping a bounded number of chunks in flight"""
+    results = []
+    context = multiprocessing.get_context('fork' if sys.platform != 'win32' else 'spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(llm, latency, jitter, backends)) as pool:
+        pending = set()
+        for chunk in _chunks(pairs, chunk_size):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.extend(future.result())
+            pending.add(pool.submit(_run_chunk, chunk))
+        for future in pending:
+            results.extend(future.result())
+    return results
+
+
+def _group_stats(rows):
+    latencies = [row['latency_s'] for row in rows]
+    return {
+        'count': len(rows),
+        'accuracy': round(sum(row['correct'] for row in rows) / len(rows), 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3)
+    }
+
+
+def summarize(results, wall):
+    groups = {'extractor': defaultdict(list), 'backend': defaultdict(list), 'source': defaultdict(list)}
+    for row in results:
+        for key, grouped in groups.items():
+            grouped[row[key]].append(row)
+    return {
+        'pairs': len(results),
+        'wall_s': round(wall, 3),
+        'pairs_per_s': round(len(results) / wall, 1) if wall else None,
+        'overall': _group_stats(results) if results else {},
+        **{f"per_{key}": {name: _group_stats(rows) for name, rows in sorted(grouped.items())}
+           for key, grouped in groups.items()}
+    }
+
+
+def print_report(report):
+    print(f"\n{report['pairs']} pairs in {report['wall_s']}s ({report['pairs_per_s']} pairs/s)")
+    for key in ('per_extractor', 'per_backend', 'per_source'):
+        print(f"\n{key[4:]:<22}{'count':>8}{'acc':>8}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for name, stats in report[key].items():
+            print(f"{name:<22}{stats['count']:>8}{stats['accuracy']:>8}{stats['p50_ms']:>10}"
+                  f"{stats['p95_ms']:>10}{stats['mean_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--backends', default='local,cache,llm',
+                        help='comma-separated extraction backends to enable, tried in that order')
+    parser.add_argument('--llm', choices=('local', 'gemini'), default='local')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds added to every local LLM call')
+    parser.add_argument('--llm-jitter', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', help='write the summary as JSON')
+    args = parser.parse_args(argv)
+
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    pairs = stream_pairs(load_samples(), args.pairs, seed=args.seed)
+
+    start = time.perf_counter()
+    results = run_batch(pairs, args.workers, args.chunk_size, args.llm, args.llm_latency, args.llm_jitter, backends)
+    report = summarize(results, time.perf_counter() - start)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark STT decode latency and memory on a recorded file.
+
+Each path runs in its own subprocess so resident memory is measured cleanly:
+
+    python benchmark_stt.py                       # all paths on test.m4a
+    python benchmark_stt.py --audio other.wav --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from model_registry import STT_BACKENDS, process_rss, memory_report
+
+LEGACY_PATH = 'legacy'
+
+
+def run_path(path, audio_file, runs):
+    """Measure one path inside the current process"""
+    import whisper
+
+    audio = whisper.load_audio(audio_file)
+    rss_start = process_rss()
+
+    if path == LEGACY_PATH:
+        # Previous main.py behaviour: a cached whisper model plus the copy that
+        # recognize_whisper loads for itself.
+        import speech_recognition as sr
+        whisper.cached_model = whisper.load_model("base")
+        recognizer = sr.Recognizer()
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        audio_data = sr.AudioData(pcm, 16000, 2)
+
+        def decode():
+            return recognizer.recognize_whisper(audio_data, model="base")
+    else:
+        from model_registry import get_stt_model, transcribe_array
+        get_stt_model(path)
+
+        def decode():
+            return transcribe_array(audio, path)
+
+    start = time.perf_counter()
+    text = decode()
+    first_decode = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        decode()
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'path': path,
+        'audio_seconds': round(len(audio) / 16000, 2),
+        'first_decode_s': round(first_decode, 3),
+        'median_decode_s': round(statistics.median(latencies), 3),
+        'min_decode_s': round(min(latencies), 3),
+        'real_time_factor': round(statistics.median(latencies) / max(len(audio) / 16000, 1e-6), 3),
+        'rss_start_mb': round(rss_start / 2**20, 1),
+        'rss_end_mb': round(process_rss() / 2**20, 1),
+        'models': memory_report()['models'],
+        'text': text
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--audio', default='test.m4a')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--paths', nargs='+', default=[LEGACY_PATH, *STT_BACKENDS])
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_path(args.single, args.audio, args.runs)))
+        return
+
+    results = []
+    for path in args.paths:
+        proc = subprocess.run(
+            [sys.executable, __file__, '--single', path, '--audio', args.audio, '--runs', str(args.runs)],
+            capture_output=True, text=True
+        )
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            print(f"{path}: failed\n{proc.stderr.strip()[-500:]}")
+            continue
+        results.append(json.loads(lines[-1]))
+
+    print(f"\n{'path':<16}{'first(s)':>10}{'median(s)':>11}{'RTF':>8}{'RSS(MB)':>10}")
+    for r in results:
+        print(f"{r['path']:<16}{r['first_decode_s']:>10}{r['median_decode_s']:>11}"
+              f"{r['real_time_factor']:>8}{r['rss_end_mb']:>10}")
+    for r in results:
+        print(f"\n[{r['path']}] {r['text']}")
+
+
+if __name__ == '__main__':
+    main()
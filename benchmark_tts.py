@@ -0,0 +1,106 @@
+"""Benchmark TTS backends on the full question bank.
+
+Reports real-time factor, time-to-first-audio and memory for every backend,
+each measured in its own subprocess:
+
+    python benchmark_tts.py
+    python benchmark_tts.py --backends tacotron2 glow-tts
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from flow import ConversationFlowManager
+from model_registry import process_rss, memory_report
+from tts import TTS_MODELS, initialize_tts
+
+
+def question_bank():
+    """Every question the agent can ask, with category intros, as spoken"""
+    from utils import format_speech_output
+    flow_manager = ConversationFlowManager(None, None)
+    texts = []
+    for category in flow_manager.categories_order:
+        flow_manager.current_category = category
+        intro = flow_manager._get_category_intro()
+        for index, spec in enumerate(flow_manager.insurance_qa[category].values()):
+            question = spec['question']
+            texts.append(format_speech_output(intro + question if index == 0 else question))
+    return texts
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_backend(backend, runs):
+    rss_start = process_rss()
+    start = time.perf_counter()
+    tts = initialize_tts(backend)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up kernels and caches before timing
+    tts.tts("Warm up.")
+
+    rtfs, ttfas = [], []
+    for _ in range(runs):
+        for text in question_bank():
+            start = time.perf_counter()
+            first_audio = None
+            samples = 0
+            for chunk in tts.tts_stream(text):
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                samples += len(chunk)
+            elapsed = time.perf_counter() - start
+            rtfs.append(elapsed / max(samples / tts.sample_rate, 1e-6))
+            ttfas.append(first_audio or elapsed)
+
+    return {
+        'backend': backend,
+        'utterances': len(rtfs),
+        'load_s': round(load_seconds, 2),
+        'rtf_p50': round(statistics.median(rtfs), 3),
+        'rtf_p95': round(percentile(rtfs, 95), 3),
+        'ttfa_p50_s': round(statistics.median(ttfas), 3),
+        'ttfa_p95_s': round(percentile(ttfas, 95), 3),
+        'rss_delta_mb': round((process_rss() - rss_start) / 2**20, 1),
+        'models': memory_report()['models']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(TTS_MODELS))
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_backend(args.single, args.runs)))
+        return
+
+    results = []
+    for backend in args.backends:
+        proc = subprocess.run(
+            [sys.executable, __file__, '--single', backend, '--runs', str(args.runs)],
+            capture_output=True, text=True
+        )
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            print(f"{backend}: failed\n{proc.stderr.strip()[-500:]}")
+            continue
+        results.append(json.loads(lines[-1]))
+
+    print(f"\n{'backend':<15}{'RTF p50':>9}{'RTF p95':>9}{'TTFA p50':>10}{'TTFA p95':>10}{'RSS(MB)':>9}")
+    for r in results:
+        print(f"{r['backend']:<15}{r['rtf_p50']:>9}{r['rtf_p95']:>9}{r['ttfa_p50_s']:>10}"
+              f"{r['ttfa_p95_s']:>10}{r['rss_delta_mb']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,516 @@
+"""Network call server: many concurrent verification calls over WebSockets.
+
+A telephony bridge (or the client below) opens one WebSocket per call. The
+first message is JSON and must carry the server's shared token
+(CALL_SERVER_TOKEN or --token):
+
+    {"type": "start", "token": "...", "sample_rate": 16000, "patient": {...}}
+
+after which the caller streams its audio as binary int16 mono PCM frames and
+may also send {"type": "text", "text": "..."} turns or {"type": "hangup"}.
+The server answers with JSON events (ready, greeting, turn, audio_end,
+complete) and the agent's speech as binary int16 PCM at the announced rate.
+A telephony bridge can instead start with "encoding": "mulaw" and
+"sample_rate": 8000; both directions are then 8 kHz mu-law, converted
+frame by frame (see telephony.py).
+
+Every call runs STT -> validation -> ConversationFlowManager -> TTS on a
+warm pooled session. Incoming audio is endpointed per call; buffered audio
+is capped by a per-connection memory budget, and once it is full the
+server stops reading that socket so TCP pushes back on the sender.
+Outgoing audio is sent in small frames and waits for the socket to drain.
+The server listens on localhost unless --host says otherwise, and saves
+call results only when --store is given.
+
+    CALL_SERVER_TOKEN=... python main.py serve --port 8765 --llm local
+    CALL_SERVER_TOKEN=... python call_server.py client --calls 4 --mode text
+    python call_server.py client --calls 4 --mode synth --encoding mulaw
+"""
+import os
+import hmac
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+import numpy as np
+import speech_recognition as sr
+
+from replay import ReplayPipeline, ScriptedRep, add_pipeline_arguments, load_samples, call_state
+from main import build_resume_greeting, resolve_input, generate_response
+from flow import new_patient_info_state
+from llm import start_deadline
+from stt import transcribe_audio, STT_SAMPLE_RATE
+from telephony import TelephonyIngress, TelephonyEgress, TELEPHONY_SAMPLE_RATE, mulaw_encode
+from utils import fake_patient, format_speech_output, get_verification_summary
+from results_store import get_store
+from session_log import open_session_log
+from tracing import tracer, percentile, start_session, start_turn, end_turn, set_field, increment
+
+CALL_SERVER_HOST = os.getenv('CALL_SERVER_HOST', '127.0.0.1')
+CALL_SERVER_TOKEN = os.getenv('CALL_SERVER_TOKEN')
+CALL_SERVER_PORT = int(os.getenv('CALL_SERVER_PORT', '8765'))
+CALL_SERVER_MAX_CALLS = int(os.getenv('CALL_SERVER_MAX_CALLS', '64'))
+CALL_MEMORY_BUDGET = int(os.getenv('CALL_MEMORY_BUDGET', str(4 * 1024 * 1024)))
+MAX_MESSAGE_BYTES = 256 * 1024
+MAX_QUEUED_MESSAGES = 16
+OUT_FRAME_MS = 100
+START_TIMEOUT = 10
+
+# Text turns skip STT and usually correction; a load test sets these so each
+# one still costs what a spoken turn would (0 leaves text turns free)
+TEXT_TURN_STT_RTF = float(os.getenv('TEXT_TURN_STT_RTF', '0'))
+TEXT_TURN_CORRECTION_MS = float(os.getenv('TEXT_TURN_CORRECTION_MS', '0'))
+SPEAKING_CHARS_PER_SECOND = 15
+
+# Energy endpointing on the incoming stream
+FRAME_MS = 20
+SPEECH_RMS = 500
+END_SILENCE_MS = 700
+PREROLL_MS = 200
+MAX_UTTERANCE_S = 30
+
+
+class Endpointer:
+    """Cuts a PCM stream into utterances: speech followed by END_SILENCE_MS of quiet"""
+    def __init__(self, sample_rate, max_bytes):
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * FRAME_MS // 1000 * 2
+        self.max_bytes = min(max_bytes, MAX_UTTERANCE_S * sample_rate * 2)
+        self.preroll_frames = PREROLL_MS // FRAME_MS
+        self.end_frames = END_SILENCE_MS // FRAME_MS
+        self.pending = bytearray()
+        self.utterance = bytearray()
+        self.preroll = []
+        self.speaking = False
+        self.silent_frames = 0
+
+    @property
+    def buffered(self):
+        return len(self.pending) + len(self.utterance) + len(self.preroll) * self.frame_bytes
+
+    def feed(self, data):
+        """Add incoming PCM; returns the completed utterances (usually none)"""
+        self.pending += data
+        utterances = []
+        while len(self.pending) >= self.frame_bytes:
+            frame = bytes(self.pending[:self.frame_bytes])
+            del self.pending[:self.frame_bytes]
+            samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+            loud = np.sqrt(np.mean(samples * samples)) >= SPEECH_RMS
+
+            if not self.speaking:
+                if loud:
+                    self.speaking = True
+                    self.silent_frames = 0
+                    for earlier in self.preroll:
+                        self.utterance += earlier
+                    self.preroll = []
+                    self.utterance += frame
+                else:
+                    self.preroll.append(frame)
+                    if len(self.preroll) > self.preroll_frames:
+                        self.preroll.pop(0)
+                continue
+
+            self.utterance += frame
+            self.silent_frames = 0 if loud else self.silent_frames + 1
+            if self.silent_frames >= self.end_frames or len(self.utterance) >= self.max_bytes:
+                if len(self.utterance) >= self.max_bytes:
+                    increment('call_server_forced_endpoints')
+                utterances.append(self.cut())
+        return utterances
+
+    def cut(self):
+        utterance = bytes(self.utterance)
+        self.utterance = bytearray()
+        self.speaking = False
+        self.silent_frames = 0
+        return utterance
+
+
+class CallServer:
+    def __init__(self, args):
+        self.args = args
+        self.pipeline = ReplayPipeline(args)
+        if self.pipeline.pool is None:
+            raise ValueError("the call server needs a session pool (--session-pool 1 or more)")
+        self.store = get_store(args.store) if args.store else None
+        self.token = args.token
+        self.max_calls = args.max_calls
+        self.budget = args.memory_budget
+        self.active = 0
+        self.tts_lock = self.pipeline.tts_lock
+
+    @property
+    def sample_rate(self):
+        return self.pipeline.clip_bank.sample_rate if self.pipeline.clip_bank else None
+
+    def acquire(self, patient):
+        # A pool miss builds a session here; only the greeting's clip bank call takes tts_lock
+        return self.pipeline.pool.acquire(patient)
+
+    def synthesize(self, text):
+        if self.pipeline.clip_bank is None or not text:
+            return None
+        with self.tts_lock:
+            return self.pipeline.clip_bank.synthesize(text)
+
+    async def handle(self, websocket, path=None):
+        if self.active >= self.max_calls:
+            increment('call_server_rejected')
+            await websocket.close(1013, 'server busy')
+            return
+        self.active += 1
+        try:
+            await CallConnection(self, websocket).run()
+        except Exception as e:
+            print(f"Error in call connection: {str(e)}")
+        finally:
+            self.active -= 1
+
+    async def serve(self, host, port):
+        import websockets
+        async with websockets.serve(self.handle, host, port, max_size=MAX_MESSAGE_BYTES,
+                                    max_queue=MAX_QUEUED_MESSAGES, write_limit=2 ** 16):
+            print(f"Call server on ws://{host}:{port} (max {self.max_calls} calls, "
+                  f"{self.budget // 1024} KB audio budget per call)")
+            await asyncio.Future()
+
+
+class CallConnection:
+    """One call: reads audio and text turns, runs them in order, streams the replies back"""
+    def __init__(self, server, websocket):
+        self.server = server
+        self.websocket = websocket
+        self.turns = asyncio.Queue()
+        self.queued_bytes = 0
+        self.space = asyncio.Condition()
+        self.endpointer = None
+        self.ingress = None
+        self.egress = None
+        self.session = None
+        self.done = False
+
+    async def send_event(self, kind, **data):
+        await self.websocket.send(json.dumps(dict(type=kind, **data), default=str))
+
+    async def send_audio(self, pcm):
+        """Stream PCM in OUT_FRAME_MS frames; stops early if the caller starts talking over it"""
+        if pcm is None:
+            return False
+        pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+        frame = self.server.sample_rate * OUT_FRAME_MS // 1000
+        if self.egress is not None:
+            self.egress.reset()
+        first = True
+        for start in range(0, len(pcm), frame):
+            # The caller talking over us: speech on the line or a turn already queued
+            if not first and ((self.endpointer is not None and self.endpointer.speaking) or not self.turns.empty()):
+                increment('call_server_barge_ins')
+                await self.send_event('audio_end', interrupted=True)
+                return True
+            # send() waits for the socket to drain, so a slow reader slows this call only
+            chunk = pcm[start:start + frame]
+            await self.websocket.send(self.egress.encode(chunk) if self.egress else chunk.tobytes())
+            if first:
+                end_turn()
+                first = False
+        await self.send_event('audio_end', interrupted=False)
+        return False
+
+    async def enqueue(self, kind, payload):
+        """Queue a turn, waiting (and so not reading the socket) while the call is over budget"""
+        size = len(payload) if kind == 'audio' else 0
+        async with self.space:
+            await self.space.wait_for(
+                lambda: self.queued_bytes + size + self.endpointer.buffered <= self.server.budget
+                or self.queued_bytes == 0
+            )
+            self.queued_bytes += size
+        await self.turns.put((kind, payload))
+
+    async def run(self):
+        start = json.loads(await asyncio.wait_for(self.websocket.recv(), START_TIMEOUT))
+        if start.get('type') != 'start':
+            await self.websocket.close(1002, 'expected a start message')
+            return
+        if not hmac.compare_digest(str(start.get('token', '')).encode(), self.server.token.encode()):
+            increment('call_server_unauthorized')
+            await self.websocket.close(1008, 'unauthorized')
+            return
+        patient = start.get('patient') or fake_patient()
+        sample_rate = int(start.get('sample_rate', 16000))
+        out_rate = self.server.sample_rate
+        if start.get('encoding') == 'mulaw':
+            # Telephony: decode and resample each frame as it arrives, endpoint and transcribe at 16 kHz
+            self.ingress = TelephonyIngress(sample_rate, STT_SAMPLE_RATE)
+            if out_rate:
+                self.egress = TelephonyEgress(out_rate, sample_rate)
+                out_rate = sample_rate
+            sample_rate = STT_SAMPLE_RATE
+        self.endpointer = Endpointer(sample_rate, self.server.budget)
+
+        # Everything per call lives in this task's context and is copied into the worker threads
+        new_patient_info_state()
+        session_id = start_session()
+        self.session = await asyncio.to_thread(self.server.acquire, patient)
+        verification, flow_manager = self.session.verification, self.session.flow_manager
+        session_log, resumed = None, False
+        if self.server.args.session_log:
+            # Reads the session directory; keep it off the event loop
+            session_log, resumed = await asyncio.to_thread(open_session_log, session_id, patient, verification,
+                                                           flow_manager, self.server.args.session_log)
+        greeting, greeting_audio = self.session.greeting, self.session.greeting_audio
+        if resumed:
+            greeting = format_speech_output(
+                build_resume_greeting(self.server.pipeline.pool.office_name, patient, flow_manager))
+            greeting_audio = await asyncio.to_thread(self.server.synthesize, greeting)
+
+        worker = asyncio.create_task(self.process_turns())
+        try:
+            await self.send_event('ready', session_id=session_id, sample_rate=out_rate,
+                                  encoding='mulaw' if self.egress else 'pcm16',
+                                  tts=self.server.sample_rate is not None, resumed=resumed)
+            await self.send_event('greeting', text=greeting, state=call_state(flow_manager))
+            await self.send_audio(greeting_audio)
+            await self.read_loop()
+        finally:
+            await self.turns.put((None, None))
+            try:
+                await worker
+            finally:
+                summary = get_verification_summary(verification)
+                if self.server.store is not None:
+                    self.server.store.save(summary, patient, session_id)
+                if session_log:
+                    session_log.close('complete' if summary['status'] == 'complete' else None)
+                self.server.pipeline.pool.release(self.session)
+
+    async def read_loop(self):
+        import websockets
+        try:
+            async for message in self.websocket:
+                if self.done:
+                    break
+                if isinstance(message, bytes):
+                    if self.ingress is not None:
+                        message = self.ingress.feed(message).tobytes()
+                    for utterance in self.endpointer.feed(message):
+                        await self.enqueue('audio', utterance)
+                    continue
+                event = json.loads(message)
+                if event.get('type') == 'text':
+                    await self.enqueue('text', event.get('text', ''))
+                elif event.get('type') == 'hangup':
+                    break
+        except websockets.ConnectionClosed:
+            pass
+
+    def run_turn(self, kind, payload):
+        """One turn in a worker thread: STT, validation, flow and TTS"""
+        verification, flow_manager = self.session.verification, self.session.flow_manager
+        start_turn()
+        start_deadline()
+        set_field(flow_manager.current_category, flow_manager.get_current_field())
+        if kind == 'audio':
+            text = transcribe_audio(sr.AudioData(payload, self.endpointer.sample_rate, 2))
+        else:
+            text = payload
+            # Stand-ins for transcribing the spoken line and for the correction lookup
+            time.sleep(len(text) / SPEAKING_CHARS_PER_SECOND * TEXT_TURN_STT_RTF + TEXT_TURN_CORRECTION_MS / 1000)
+        text, correction_result = resolve_input(
+            text, verification, flow_manager, self.server.pipeline.faiss_index, self.server.pipeline.correction_df
+        )
+        if correction_result:
+            # No confirmation round-trip over the wire; an unconfirmed correction is never applied
+            print(f"Keeping the caller's words over unconfirmed correction: {correction_result['corrected']}")
+        response = generate_response(text, verification, flow_manager)
+        return text, response, self.server.synthesize(response)
+
+    async def process_turns(self):
+        verification, flow_manager = self.session.verification, self.session.flow_manager
+        while True:
+            kind, payload = await self.turns.get()
+            if kind is None:
+                return
+            async with self.space:
+                if kind == 'audio':
+                    self.queued_bytes -= len(payload)
+                self.space.notify_all()
+            if self.done:
+                continue
+            try:
+                heard, response, pcm = await asyncio.to_thread(self.run_turn, kind, payload)
+                status = get_verification_summary(verification)['status']
+                await self.send_event('turn', heard=heard, response=response, status=status,
+                                      state=call_state(flow_manager))
+                if pcm is None:
+                    end_turn()
+                await self.send_audio(pcm)
+                if status == 'complete':
+                    self.done = True
+                    await self.send_event('complete', summary=get_verification_summary(verification))
+                    await self.websocket.close()
+            except Exception as e:
+                print(f"Error in call turn: {str(e)}")
+                end_turn()
+
+
+async def _next_event(websocket, kinds):
+    """The next JSON event of one of kinds; agent audio and other events in between are skipped"""
+    while True:
+        message = await websocket.recv()
+        if isinstance(message, bytes):
+            continue
+        event = json.loads(message)
+        if event['type'] in kinds:
+            return event
+
+
+async def run_client(uri, rep, mode='text', tts=None, max_turns=60, patient=None, latencies=None, encoding='pcm16',
+                     token=CALL_SERVER_TOKEN):
+    """Stand-in for the telephony bridge: a rep answering over one WebSocket.
+
+    rep.line_for(state) gives each line. A rep may also define pause(state)
+    (seconds to wait before answering) and interrupts() (answer without
+    waiting for the agent to finish speaking). In text mode lines go over as
+    text turns; in synth mode they are spoken with tts and streamed as PCM
+    followed by enough silence to end the turn; with encoding 'mulaw' the call
+    is 8 kHz mu-law like a phone line. Returns the call status and
+    the per-turn latency to the agent's reply; latencies are also appended
+    to the given list as they happen, so a cancelled call still counts.
+    """
+    import websockets
+    rate = tts.sample_rate if tts is not None else 16000
+    silence = np.zeros(rate * (END_SILENCE_MS + 200) // 1000, dtype=np.int16)
+    line_audio = None
+    if encoding == 'mulaw':
+        line_audio = TelephonyEgress(rate) if tts is not None else None
+        rate = TELEPHONY_SAMPLE_RATE
+        silence = mulaw_encode(silence[:rate * (END_SILENCE_MS + 200) // 1000])
+    else:
+        silence = silence.tobytes()
+    frame = rate * FRAME_MS // 1000 * (1 if encoding == 'mulaw' else 2)
+    pause = getattr(rep, 'pause', None)
+    interrupts = getattr(rep, 'interrupts', None)
+    latencies = [] if latencies is None else latencies
+    status = 'incomplete'
+
+    async with websockets.connect(uri, max_size=MAX_MESSAGE_BYTES) as websocket:
+        await websocket.send(json.dumps({'type': 'start', 'token': token, 'sample_rate': rate,
+                                         'encoding': encoding, 'patient': patient}))
+        ready = await _next_event(websocket, ('ready',))
+        state = (await _next_event(websocket, ('greeting',)))['state']
+        if ready['tts']:
+            await _next_event(websocket, ('audio_end',))
+
+        try:
+            for _ in range(max_turns):
+                line = rep.line_for(state)
+                if pause is not None:
+                    await asyncio.sleep(pause(state))
+                if mode == 'text':
+                    await websocket.send(json.dumps({'type': 'text', 'text': line}))
+                else:
+                    pcm = tts.pcm(line)
+                    audio = line_audio.encode(pcm) if line_audio else pcm.tobytes()
+                    for offset in range(0, len(audio), frame * 5):
+                        await websocket.send(audio[offset:offset + frame * 5])
+                    await websocket.send(silence)
+                sent = time.perf_counter()
+
+                event = await _next_event(websocket, ('turn', 'complete'))
+                latencies.append(time.perf_counter() - sent)
+                if event['type'] == 'turn':
+                    state = event['state']
+                    if event['status'] == 'complete':
+                        event = await _next_event(websocket, ('complete',))
+                if event['type'] == 'complete':
+                    status = 'complete'
+                    break
+                # An interrupting rep answers while the reply is still playing;
+                # a stale audio_end is skipped by the next wait for a turn
+                if ready['tts'] and event['response'] and not (interrupts is not None and interrupts()):
+                    await _next_event(websocket, ('audio_end',))
+            if status != 'complete':
+                await websocket.send(json.dumps({'type': 'hangup'}))
+        except websockets.ConnectionClosed:
+            pass
+    return status, latencies
+
+
+async def run_clients(uri, calls, mode, seed, max_turns, encoding='pcm16', token=CALL_SERVER_TOKEN):
+    samples = load_samples()
+    tts = None
+    if mode == 'synth':
+        from tts import initialize_tts
+        tts = initialize_tts()
+    results = await asyncio.gather(*[
+        run_client(uri, ScriptedRep(samples, seed=seed + index), mode, tts, max_turns, encoding=encoding, token=token)
+        for index in range(calls)
+    ], return_exceptions=True)
+
+    latencies = []
+    completed = 0
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error in client call: {str(result)}")
+            continue
+        status, call_latencies = result
+        completed += status == 'complete'
+        latencies.extend(call_latencies)
+    print(f"\n{completed}/{calls} calls complete, {len(latencies)} turns")
+    if latencies:
+        print(f"First reply p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.1f} ms, mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='main.py serve', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    if argv is None:
+        import sys
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'client':
+        parser.add_argument('--uri', default=f"ws://localhost:{CALL_SERVER_PORT}")
+        parser.add_argument('--calls', type=int, default=1, help='concurrent calls')
+        parser.add_argument('--mode', choices=('text', 'synth'), default='text')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--max-turns', type=int, default=60)
+        parser.add_argument('--encoding', choices=('pcm16', 'mulaw'), default='pcm16',
+                            help="'mulaw' calls in as 8 kHz telephony audio")
+        parser.add_argument('--token', default=CALL_SERVER_TOKEN, help='shared token (default CALL_SERVER_TOKEN)')
+        args = parser.parse_args(argv[1:])
+        asyncio.run(run_clients(args.uri, args.calls, args.mode, args.seed, args.max_turns, args.encoding,
+                                args.token))
+        return
+
+    parser.add_argument('--host', default=CALL_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=CALL_SERVER_PORT)
+    parser.add_argument('--max-calls', type=int, default=CALL_SERVER_MAX_CALLS, help='concurrent calls accepted')
+    parser.add_argument('--memory-budget', type=int, default=CALL_MEMORY_BUDGET,
+                        help='bytes of buffered caller audio per call')
+    parser.add_argument('--token', default=CALL_SERVER_TOKEN,
+                        help='shared token every start message must carry (default CALL_SERVER_TOKEN)')
+    parser.add_argument('--store', default='', help='save call results to this store (.db SQLite or .jsonl)')
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.token:
+        parser.error("set CALL_SERVER_TOKEN or --token; callers must present it in their start message")
+
+    server = CallServer(args)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server.store is not None:
+            server.store.close()
+        tracer.write_snapshot()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""Simulate verifying a whole patient roster across a pool of worker processes.
+
+Models (STT, TTS, the correction index) are loaded once in the parent; the
+workers fork afterwards and share the weights copy-on-write. Each patient
+is one call through the replay pipeline; calls that fail or end incomplete
+are retried.
+
+    python main.py campaign roster.csv --workers 4 --mode text --llm local
+    python main.py campaign roster.json --workers 8 --retries 2 --status campaign_status.csv
+
+No real call is placed. Calls are answered by scripted reps, so their
+results are made up: a call that fills every field is reported as
+'simulated', never 'complete', and saved to its own store (CAMPAIGN_STORE)
+tagged source='campaign', never mixed into the live results. Only a patient
+whose every field is still fresh from live verifications (--prior) is
+reported 'complete'.
+
+Roster columns: first_name, last_name, date_of_birth (YYYY-MM-DD or M..D..YYYY),
+member_number, and optionally patient_id, group_number, insurance_provider.
+"""
+import gc
+import os
+import csv
+import sys
+import json
+import time
+import zlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from replay import ReplayPipeline, ScriptedRep, add_pipeline_arguments, load_samples
+from results_store import RESULTS_STORE, get_store
+from utils import format_date
+
+CAMPAIGN_STORE = os.getenv('CAMPAIGN_STORE', 'campaign_results.db')
+REQUIRED_FIELDS = ('first_name', 'last_name', 'date_of_birth', 'member_number')
+
+# Set in the parent before the pool forks; workers inherit them
+_pipeline = None
+_samples = None
+_store_path = None
+
+
+def campaign_status(call):
+    """A call's status for the campaign's reports; made-up answers never count as complete"""
+    if call['status'] == 'complete' and not call['skipped']:
+        return 'simulated'
+    return call['status']
+
+
+def load_roster(path):
+    """Patients from a CSV file or a JSON list (or {"patients": [...]})"""
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows.get('patients', [])
+    else:
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    patients = []
+    for line, row in enumerate(rows, start=1):
+        row = {key.strip(): str(value).strip() for key, value in row.items() if key and value not in (None, '')}
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            print(f"Skipping roster entry {line}: missing {', '.join(missing)}")
+            continue
+        if '-' in row['date_of_birth']:
+            row['date_of_birth'] = format_date(row['date_of_birth'])
+        row.setdefault('patient_id', row['member_number'])
+        row.setdefault('group_number', '')
+        row.setdefault('insurance_provider', '')
+        patients.append(row)
+    return patients
+
+
+def _init_worker():
+    # One math thread per worker; the pool provides the parallelism
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(1)
+
+
+def _run_patient(call_index, patient, attempt, seed):
+    """Worker: one verification call for one patient"""
+    start = time.perf_counter()
+    try:
+        rep = ScriptedRep(_samples, seed=seed + zlib.crc32(f"{patient['patient_id']}:{attempt}".encode()))
+        call = _pipeline.run_call(call_index, rep, patient=patient)
+        status = campaign_status(call)
+        if _store_path:
+            store = get_store(_store_path)
+            store.save({'status': status, 'missing': call['missing'], 'collected': call['collected'],
+                        'prefilled': call['prefilled']},
+                       patient, f"campaign-{patient['patient_id']}-{attempt}", source='campaign')
+            # Workers exit without running atexit hooks; make sure the row is on disk
+            store.flush()
+        return {
+            'status': status,
+            'missing': call['missing'],
+            'collected': call['collected'],
+            'turns': len(call['turns']),
+            'skipped': call['skipped'],
+            'wall_s': call['wall_s'],
+            'error': None,
+            'pid': os.getpid()
+        }
+    except Exception as e:
+        print(f"Error verifying patient {patient['patient_id']}: {str(e)}")
+        return {'status': 'error', 'missing': None, 'collected': None, 'turns': 0, 'skipped': False,
+                'wall_s': time.perf_counter() - start, 'error': str(e), 'pid': os.getpid()}
+
+
+def run_campaign(patients, workers, retries, seed=0):
+    """Schedule every patient on the pool, resubmitting failed calls up to retries times"""
+    context = multiprocessing.get_context('fork')
+    # Keep the preloaded heap out of the collector so it is not touched (and copied) after fork
+    gc.freeze()
+    statuses = {}
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+        pending = {}
+        for index, patient in enumerate(patients):
+            future = pool.submit(_run_patient, index, patient, 1, seed)
+            pending[future] = (index, patient, 1)
+
+        call_index = len(patients)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, patient, attempt = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself died; treat it like a failed call
+                    result = {'status': 'error', 'missing': None, 'collected': None, 'turns': 0, 'skipped': False,
+                              'wall_s': 0.0, 'error': str(e), 'pid': None}
+                result['attempts'] = attempt
+                statuses[index] = result
+                print(f"Patient {patient['patient_id']}: {result['status']} (attempt {attempt})")
+
+                if result['status'] not in ('complete', 'simulated') and attempt <= retries:
+                    retry = pool.submit(_run_patient, call_index, patient, attempt + 1, seed)
+                    pending[retry] = (index, patient, attempt + 1)
+                    call_index += 1
+    gc.unfreeze()
+    return [dict(patient_id=patients[i]['patient_id'],
+                 name=f"{patients[i]['first_name']} {patients[i]['last_name']}",
+                 **statuses[i]) for i in range(len(patients))]
+
+
+def summarize(results, wall):
+    completed = [r for r in results if r['status'] in ('complete', 'simulated')]
+    return {
+        'mode': 'simulation',
+        'patients': len(results),
+        'simulated': sum(1 for r in results if r['status'] == 'simulated'),
+        'completed': len(completed),
+        'failed': len(results) - len(completed),
+        'skipped': sum(1 for r in results if r['skipped']),
+        'retried': sum(1 for r in results if r['attempts'] > 1),
+        'wall_s': round(wall, 2),
+        'completed_per_min': round(len(completed) / wall * 60, 1) if wall else None,
+        'workers_used': len({r['pid'] for r in results if r['pid']})
+    }
+
+
+def write_status(results, path):
+    """Per-patient status as CSV"""
+    fields = ['patient_id', 'name', 'status', 'skipped', 'attempts', 'turns', 'wall_s', 'missing', 'error']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for result in results:
+            row = dict(result)
+            row['wall_s'] = round(row['wall_s'], 2)
+            row['missing'] = ';'.join(row['missing'] or [])
+            writer.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='main.py campaign', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('roster', help='patient roster (.csv or .json)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--retries', type=int, default=1, help='extra attempts for failed or incomplete calls')
+    parser.add_argument('--status', default='campaign_status.csv',
+                        help="per-patient status CSV; filled records read 'simulated'")
+    parser.add_argument('--report', help='write the summary and per-patient results as JSON')
+    parser.add_argument('--store', default=CAMPAIGN_STORE,
+                        help="store for the synthetic results (.db SQLite or .jsonl), '' to skip")
+    parser.add_argument('--prior', action='store_true',
+                        help='skip fields still fresh from live verifications in RESULTS_STORE')
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.prior and args.prior_store is None:
+        args.prior_store = RESULTS_STORE
+
+    if args.cassette and args.cassette_mode == 'record' and args.workers > 1:
+        parser.error("record a cassette with --workers 1; workers cannot share one recording file")
+
+    patients = load_roster(args.roster)
+    if not patients:
+        print("No patients to verify")
+        return
+
+    global _pipeline, _samples, _store_path
+    _store_path = args.store
+    print(f"Preloading models to simulate {len(patients)} patients on {args.workers} workers")
+    _pipeline = ReplayPipeline(args)
+    _samples = load_samples()
+
+    start = time.perf_counter()
+    results = run_campaign(patients, args.workers, args.retries, args.seed)
+    report = summarize(results, time.perf_counter() - start)
+
+    print(f"\nSimulation against scripted reps, no real calls placed: {report['completed']}/{report['patients']} "
+          f"patients finished in {report['wall_s']}s ({report['simulated']} simulated, "
+          f"{report['skipped']} skipped as fresh from live verifications; {report['completed_per_min']} per minute, "
+          f"{report['retried']} retried, {report['workers_used']} workers)")
+    for result in results:
+        if result['status'] not in ('complete', 'simulated'):
+            print(f"  {result['patient_id']} {result['name']}: {result['status']} "
+                  f"after {result['attempts']} attempts {result['error'] or result['missing']}")
+
+    write_status(results, args.status)
+    print(f"Per-patient status saved to {args.status}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'summary': report, 'patients': results}, f, indent=2, default=str)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from tracing import increment
+
+# Record/replay of LLM traffic. In record mode every exchange is appended to
+# a compact JSONL file (gzip when the path ends in .gz) keyed by prompt
+# template and a hash of the full prompt; replay mode serves the responses
+# back in recorded order, optionally with the recorded latency, so
+# conversations and benchmarks repeat offline and identically.
+#   LLM_CASSETTE=llm.cassette.jsonl.gz LLM_CASSETTE_MODE=record python main.py
+#   LLM_CASSETTE=llm.cassette.jsonl.gz LLM_CASSETTE_MODE=replay python main.py replay --llm gemini
+LLM_CASSETTE = os.getenv('LLM_CASSETTE')
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'replay')
+LLM_CASSETTE_TIMING = os.getenv('LLM_CASSETTE_TIMING', '0') == '1'
+TEMPLATE_CHARS = 80
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def prompt_template(prompt):
+    """Template id of a prompt: its .template attribute, else its first non-empty line"""
+    template = getattr(prompt, 'template', None)
+    if template:
+        return template
+    for line in str(prompt).splitlines():
+        if line.strip():
+            return line.strip()[:TEMPLATE_CHARS]
+    return ''
+
+
+def prompt_key(prompt):
+    """Hash of the prompt with whitespace collapsed, so re-indenting a template keeps its recordings"""
+    normalized = ' '.join(str(prompt).split())
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Cassette:
+    def __init__(self, path, mode=LLM_CASSETTE_MODE, timing=LLM_CASSETTE_TIMING):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.entries = defaultdict(list)
+        self.cursors = defaultdict(int)
+        self._lock = threading.Lock()
+        self._file = None
+        if mode == 'replay':
+            self.load()
+
+    def load(self):
+        with _open(self.path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[(entry['t'], entry['k'])].append(entry)
+        print(f"Cassette {self.path}: {sum(len(v) for v in self.entries.values())} exchanges, "
+              f"{len({t for t, _ in self.entries})} templates")
+
+    def _append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                # Text gzip in append mode adds a new member; readers see one stream
+                self._file = _open(self.path, 'a')
+            self._file.write(line)
+            self._file.flush()
+
+    def record(self, prompt, send):
+        """Run send(), append the exchange (or its error) and return the response"""
+        start = time.perf_counter()
+        entry = {'t': prompt_template(prompt), 'k': prompt_key(prompt)}
+        try:
+            response = send()
+        except Exception as e:
+            entry.update(e=type(e).__name__, ms=round((time.perf_counter() - start) * 1000, 1))
+            self._append(entry)
+            raise
+        entry.update(r=response.text, ms=round((time.perf_counter() - start) * 1000, 1))
+        self._append(entry)
+        return response
+
+    def play(self, prompt):
+        """The next recorded exchange for this prompt; repeats the last one once exhausted"""
+        key = (prompt_template(prompt), prompt_key(prompt))
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                increment('cassette_misses')
+                raise CassetteMiss(f"No recording for template '{key[0]}' ({key[1]})")
+            index = self.cursors[key]
+            self.cursors[key] = index + 1
+        entry = entries[min(index, len(entries) - 1)]
+        increment('cassette_hits')
+        if self.timing:
+            time.sleep(entry.get('ms', 0) / 1000)
+        if 'e' in entry:
+            if entry['e'] == 'DeadlineExceeded':
+                from llm import DeadlineExceeded
+                raise DeadlineExceeded("Recorded deadline miss")
+            raise RuntimeError(f"Recorded LLM error: {entry['e']}")
+        return CassetteResponse(entry['r'])
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CassetteResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class CassetteChat:
+    """Chat session proxy recording to, or replaying from, a cassette"""
+    def __init__(self, cassette, chat=None, fallback=None):
+        self.cassette = cassette
+        self._chat = chat
+        self._fallback = fallback
+        self.history = []
+
+    def send_message(self, content, *args, **kwargs):
+        prompt = content.get('text', '') if isinstance(content, dict) else content
+        if self.cassette.mode == 'record':
+            return self.cassette.record(prompt, lambda: self._chat.send_message(content, *args, **kwargs))
+        try:
+            return self.cassette.play(prompt)
+        except CassetteMiss:
+            if self._fallback is None:
+                raise
+            return self._fallback.send_message(content, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path=None, mode=None, timing=None):
+    """Process-wide cassette for path, so every chat session shares one file"""
+    path = path or LLM_CASSETTE
+    if not path:
+        return None
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = Cassette(path, mode or LLM_CASSETTE_MODE,
+                                LLM_CASSETTE_TIMING if timing is None else timing)
+            _cassettes[path] = cassette
+        return cassette
+
+
+def close_cassettes():
+    with _cassettes_lock:
+        for cassette in _cassettes.values():
+            cassette.close()
@@ -0,0 +1,230 @@
+import os
+import re
+from collections import OrderedDict
+import numpy as np
+from tracing import traced
+
+# Numbers in spoken output are stitched from prerendered clips; only the
+# carrier sentence around them goes through neural synthesis.
+CROSSFADE_MS = 10
+DIGIT_GAP_MS = 60
+SEGMENT_GAP_MS = 90
+SILENCE_THRESHOLD = 0.02
+CARRIER_CACHE_SIZE = 256
+DEFAULT_CACHE_DIR = 'clip_cache'
+
+_DIGIT_WORDS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+_TEEN_WORDS = ['ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen',
+               'seventeen', 'eighteen', 'nineteen']
+_TENS_WORDS = ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety']
+_MONTH_WORDS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+                'September', 'October', 'November', 'December']
+_ORDINAL_WORDS = ['first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth',
+                  'ninth', 'tenth', 'eleventh', 'twelfth', 'thirteenth', 'fourteenth', 'fifteenth',
+                  'sixteenth', 'seventeenth', 'eighteenth', 'nineteenth', 'twentieth']
+
+# Spans produced by format_speech_output: "M..D..YYYY" dates, "$ 1 5 0 0",
+# "8 0 percent" and digit-by-digit IDs such as "1 2 3 4 5".
+NUMERIC_SPAN = re.compile(
+    r'(?P<date>\b(?P<month>\d{1,2})\.\.(?P<day>\d{1,2})\.\.(?P<year>\d{4})\b)'
+    r'|(?P<amount>\$ (?P<amount_digits>\d(?: \d)*)\b)'
+    r'|(?P<percent>\b(?P<percent_digits>\d(?: \d)*) percent\b)'
+    r'|(?P<digits>\b\d(?: \d)+\b)'
+)
+
+
+def _number_words(value):
+    """Spoken form of 0-99"""
+    if value < 10:
+        return _DIGIT_WORDS[value]
+    if value < 20:
+        return _TEEN_WORDS[value - 10]
+    tens, ones = divmod(value, 10)
+    return _TENS_WORDS[tens] + (f" {_DIGIT_WORDS[ones]}" if ones else '')
+
+
+def _ordinal_words(day):
+    if day <= 20:
+        return _ORDINAL_WORDS[day - 1]
+    tens, ones = divmod(day, 10)
+    if not ones:
+        return _TENS_WORDS[tens][:-1] + 'ieth'
+    return f"{_TENS_WORDS[tens]} {_ORDINAL_WORDS[ones - 1]}"
+
+
+def clip_text(key):
+    """Text rendered for a clip key"""
+    kind, _, value = key.partition(':')
+    if kind == 'digit':
+        return _DIGIT_WORDS[int(value)]
+    if kind == 'number':
+        return _number_words(int(value))
+    if kind == 'month':
+        return _MONTH_WORDS[int(value) - 1]
+    if kind == 'day':
+        return _ordinal_words(int(value))
+    return kind
+
+
+def year_keys(year):
+    """Clip keys for a four digit year, read the way people say them"""
+    high, low = divmod(year, 100)
+    if 2000 <= year <= 2009:
+        return ['number:2', 'thousand'] + ([f'digit:{low}'] if low else [])
+    if low == 0:
+        return [f'number:{high}', 'hundred']
+    if low < 10:
+        return [f'number:{high}', 'oh', f'digit:{low}']
+    return [f'number:{high}', f'number:{low}']
+
+
+def span_keys(match):
+    """Clip keys for a NUMERIC_SPAN match"""
+    if match.group('date'):
+        month, day, year = int(match.group('month')), int(match.group('day')), int(match.group('year'))
+        if not (1 <= month <= 12 and 1 <= day <= 31):
+            return None
+        return [f'month:{month}', f'day:{day}'] + year_keys(year)
+    if match.group('amount'):
+        return [f'digit:{d}' for d in match.group('amount_digits').split()] + ['dollars']
+    if match.group('percent'):
+        return [f'digit:{d}' for d in match.group('percent_digits').split()] + ['percent']
+    return [f'digit:{d}' for d in match.group('digits').split()]
+
+
+def default_clip_keys():
+    """Clips worth prerendering at startup: digits, units and date fragments"""
+    keys = [f'digit:{d}' for d in range(10)] + ['dollars', 'percent', 'thousand', 'hundred', 'oh']
+    keys += [f'month:{m}' for m in range(1, 13)] + [f'day:{d}' for d in range(1, 32)]
+    keys += [f'number:{n}' for n in range(10, 100)]
+    return keys
+
+
+def trim_silence(pcm, threshold=SILENCE_THRESHOLD):
+    """Cut leading and trailing near-silence so clips butt together tightly.
+
+    Returns a view into pcm, not a copy.
+    """
+    if not len(pcm):
+        return pcm
+    top = max(int(pcm.max()), -int(pcm.min()), 1)
+    loud = np.flatnonzero(np.abs(pcm) > threshold * top)
+    if not len(loud):
+        return pcm[:0]
+    return pcm[loud[0]:loud[-1] + 1]
+
+
+def stitch(segments, sample_rate, crossfade_ms=CROSSFADE_MS, gap_ms=0):
+    """Join int16 PCM segments without clicks at the joins.
+
+    With no gap, neighbouring segments overlap by crossfade_ms and are
+    crossfaded across the join. With a gap, segments do not overlap: each one
+    fades out over its last crossfade_ms, gap_ms of silence follows, and the
+    next fades in over its first crossfade_ms. Segments are copied once into a
+    preallocated int16 buffer; only the fade windows are mixed in float32.
+    """
+    segments = [s for s in segments if len(s)]
+    if not segments:
+        return np.zeros(0, dtype=np.int16)
+    if len(segments) == 1:
+        return segments[0]
+
+    gap = int(sample_rate * gap_ms / 1000)
+    fade = int(sample_rate * crossfade_ms / 1000)
+    fade = min([fade] + [len(s) for s in segments])
+    overlap = fade if gap == 0 else 0
+    total = sum(len(s) for s in segments) + (gap - overlap) * (len(segments) - 1)
+    out = np.zeros(total, dtype=np.int16)
+    ramp_in = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+    ramp_out = ramp_in[::-1]
+
+    pos = 0
+    last = len(segments) - 1
+    for index, segment in enumerate(segments):
+        end = pos + len(segment)
+        out[pos:end] = segment
+        if fade and index and overlap:
+            # Crossfade: the previous segment's tail is still in out[pos:pos + fade]
+            out[pos:pos + fade] = previous_tail * ramp_out + segment[:fade] * ramp_in
+        elif fade and index:
+            out[pos:pos + fade] = segment[:fade] * ramp_in
+        if fade and index < last and not overlap:
+            out[end - fade:end] = out[end - fade:end] * ramp_out
+        previous_tail = segment[len(segment) - fade:].astype(np.float32)
+        pos = end + gap - overlap
+    return out
+
+
+class ClipBank:
+    def __init__(self, tts, cache_dir=DEFAULT_CACHE_DIR):
+        self.tts = tts
+        self.sample_rate = tts.sample_rate
+        self.clips = {}
+        self.carriers = OrderedDict()
+        self.cache_dir = os.path.join(cache_dir, getattr(tts, 'name', None) or 'default') if cache_dir else None
+
+    def _clip_path(self, key):
+        return os.path.join(self.cache_dir, key.replace(':', '_') + '.npy')
+
+    def clip(self, key):
+        """Return the clip for key, rendering and caching it on first use"""
+        wav = self.clips.get(key)
+        if wav is not None:
+            return wav
+
+        path = self._clip_path(key) if self.cache_dir else None
+        if path and os.path.exists(path):
+            wav = np.load(path)
+        if wav is None or wav.dtype != np.int16:
+            wav = np.ascontiguousarray(trim_silence(self.tts.pcm(clip_text(key))))
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.save(path, wav)
+        self.clips[key] = wav
+        return wav
+
+    def prerender(self, keys=None):
+        """Render (or load from disk) every clip up front"""
+        keys = keys or default_clip_keys()
+        for key in keys:
+            self.clip(key)
+        print(f"Clip bank ready: {len(self.clips)} clips")
+
+    def carrier(self, text):
+        """Neural synthesis for the words around numbers, with an LRU cache of PCM"""
+        wav = self.carriers.get(text)
+        if wav is not None:
+            self.carriers.move_to_end(text)
+            return wav
+
+        wav = trim_silence(self.tts.pcm(text))
+        self.carriers[text] = wav
+        if len(self.carriers) > CARRIER_CACHE_SIZE:
+            self.carriers.popitem(last=False)
+        return wav
+
+    def render_span(self, keys):
+        return stitch([self.clip(key) for key in keys], self.sample_rate, gap_ms=DIGIT_GAP_MS)
+
+    @traced('tts')
+    def synthesize(self, text):
+        """Synthesize formatted speech text as int16 PCM, using clips for numeric spans"""
+        segments = []
+        pos = 0
+        for match in NUMERIC_SPAN.finditer(text):
+            keys = span_keys(match)
+            if not keys:
+                continue
+            carrier = text[pos:match.start()].strip(' ,')
+            if re.search(r'\w', carrier):
+                segments.append(self.carrier(carrier))
+            segments.append(self.render_span(keys))
+            pos = match.end()
+
+        if not segments:
+            return self.tts.pcm(text)
+
+        tail = text[pos:].strip(' ,')
+        if re.search(r'\w', tail):
+            segments.append(self.carrier(tail))
+        return stitch(segments, self.sample_rate, gap_ms=SEGMENT_GAP_MS)
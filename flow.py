@@ -1,4 +1,53 @@
-def verify_patient(patient_data, query):
+import contextvars
+from types import SimpleNamespace
+from tracing import traced, set_field, increment
+from llm import DeadlineExceeded
+from local_llm import HELP_PHRASES
+from schema import INSURANCE_QA, CATEGORIES, CATEGORY_SPECS
+
+
+# verify_patient keeps what it has been asked as attributes (asked_fields,
+# provided_fields, verification_asked). They live in a per-session namespace
+# held in a context variable, so concurrent calls in one process each see
+# their own; without a session namespace every caller shares the default.
+_patient_info = contextvars.ContextVar('patient_info', default=None)
+_default_patient_info = SimpleNamespace()
+
+
+def _patient_info_state():
+    state = _patient_info.get()
+    return state if state is not None else _default_patient_info
+
+
+def new_patient_info_state():
+    """Give the current context (one call) its own verify_patient state"""
+    state = SimpleNamespace()
+    _patient_info.set(state)
+    return state
+
+
+class _PatientInfoResponder:
+    """Callable standing in for the verify_patient function, with attributes in the session's state"""
+    def __init__(self, func):
+        object.__setattr__(self, '_func', func)
+
+    def __call__(self, patient_data, query):
+        return self._func(patient_data, query)
+
+    def __getattr__(self, name):
+        try:
+            return getattr(_patient_info_state(), name)
+        except AttributeError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        setattr(_patient_info_state(), name, value)
+
+    def __delattr__(self, name):
+        delattr(_patient_info_state(), name)
+
+
+def _verify_patient(patient_data, query):
     if not hasattr(verify_patient, 'asked_fields'):
         verify_patient.asked_fields = set()
     if not hasattr(verify_patient, 'provided_fields'):
@@ -33,6 +82,16 @@ def verify_patient(patient_data, query):
     return "What information would you like about the patient?"
 
 
+verify_patient = _PatientInfoResponder(_verify_patient)
+
+
+def reset_patient_info_state():
+    """Forget what verify_patient has been asked, so a new call starts fresh"""
+    for attr in ('asked_fields', 'provided_fields', 'verification_asked'):
+        if hasattr(verify_patient, attr):
+            delattr(verify_patient, attr)
+
+
 class ConversationFlowManager:
     def __init__(self, verification, patient):
         self.verification = verification
@@ -40,70 +99,21 @@ class ConversationFlowManager:
         self.is_patient_info_phase = True
         self.verification_started = False
         self.current_category = 'eligibility'
+        self.session_log = None
+        self.speculation = None  # set per turn when extraction started on a partial transcript
         
-        self.insurance_qa = {
-            'eligibility': {
-                'status': {
-                    'question': "What is the patient's current eligibility status?"
-                },
-                'effective_date': {
-                    'question': "What is the effective date of coverage?"
-                },
-                'plan_type': {
-                    'question': "What type of plan does the patient have?"
-                }
-            },
-            'benefits': {
-                'annual_maximum': {
-                    'question': "What is the annual maximum benefit?"
-                },
-                'remaining_maximum': {
-                    'question': "What is the remaining benefit amount?"
-                },
-                'deductible': {
-                    'question': "What is the deductible amount?"
-                },
-                'deductible_met': {
-                    'question': "How much of the deductible has been met? Please provide dollar amount."
-                },
-                'benefit_period': {
-                    'question': "What is the benefit period?"
-                }
-            },
-            'coverage': {
-                'preventive': {
-                    'question': "What is the coverage percentage for preventive services?"
-                },
-                'basic': {
-                    'question': "What is the coverage percentage for basic services?"
-                },
-                'major': {
-                    'question': "What is the coverage percentage for major services?"
-                },
-                'periodontics': {
-                    'question': "What is the coverage percentage for periodontal services?"
-                },
-                'endodontics': {
-                    'question': "What is the coverage percentage for endodontic services?"
-                }
-            },
-            'limitations': {
-                'waiting_period': {
-                    'question': "Are there any waiting periods?"
-                },
-                'frequency': {
-                    'question': "What are the frequency limitations?"
-                },
-                'missing_tooth': {
-                    'question': "Is there a missing tooth clause?"
-                },
-                'pre_authorization': {
-                    'question': "Are there any pre-authorization requirements?"
-                }
-            }
-        }
-        
-        self.categories_order = ['eligibility', 'benefits', 'coverage', 'limitations']
+        # Questions and field order come from the shared schema
+        self.insurance_qa = INSURANCE_QA
+        self.categories_order = list(CATEGORIES)
+
+    def reset(self, patient):
+        """Back to the start of a call for a new patient"""
+        self.patient = patient
+        self.is_patient_info_phase = True
+        self.verification_started = False
+        self.current_category = 'eligibility'
+        self.session_log = None
+        self.speculation = None
 
     def check_transition_state(self, text: str) -> bool:
         """Use LLM to determine conversation state and readiness to transition"""
@@ -171,10 +181,12 @@ class ConversationFlowManager:
             print(f"Error in transition check: {str(e)}")
             return False
             
+    @traced('process_response')
     def process_response(self, text, verification):
         print(f"\n=== DEBUG - Process Response Start ===")
         print(f"Input text: '{text}'")
         print(f"Current phase: {'Patient Info' if self.is_patient_info_phase else 'Insurance Verification'}")
+        speculation, self.speculation = self.speculation, None
 
         if self.is_patient_info_phase:
             if hasattr(verify_patient, 'verification_asked'):
@@ -210,7 +222,11 @@ class ConversationFlowManager:
                 Return only 'True' or 'False'.
                 Text: {text}"""
                 
-                is_help_phrase = verification.chat.send_message({"text": help_prompt}).text.strip().lower() == 'true'
+                try:
+                    is_help_phrase = verification.chat.send_message({"text": help_prompt}).text.strip().lower() == 'true'
+                except DeadlineExceeded:
+                    increment('llm_fallbacks', check='help_phrase')
+                    is_help_phrase = bool(HELP_PHRASES.search(text))
                 print(f"Is help phrase? {is_help_phrase}")
 
                 if is_help_phrase:
@@ -224,19 +240,20 @@ class ConversationFlowManager:
         # Rest of insurance verification phase stays the same
         print("\n=== DEBUG - Insurance Verification Phase ===")
         print(f"Current category: {self.current_category}")
-        current_fields = self.insurance_qa[self.current_category].keys()
+        record = verification.record
         
-        for field in current_fields:
-            if verification.verification_data[self.current_category][field] is None:
-                question = self.insurance_qa[self.current_category][field]['question']
-                extract_func = verification.extraction_functions[self.current_category][field]
-                
-                value = extract_func(text, question)
+        for spec in CATEGORY_SPECS[self.current_category]:
+            if record.get(spec) is None:
+                set_field(self.current_category, spec.name)
+                value = speculation.result(spec, text) if speculation is not None else None
+                if value is None:
+                    extract_func = verification.extractor(spec)
+                    value = extract_func(text, spec.question)
                 
                 if value is not None:
-                    verification.verification_data[self.current_category][field] = value
+                    record.set(spec, value)
                     next_question = self.get_next_question()
-                    print(f"Extracted {field}: {value}")
+                    print(f"Extracted {spec.name}: {value}")
                     if next_question:
                         return next_question, False
                     else:
@@ -248,29 +265,46 @@ class ConversationFlowManager:
 
     def get_next_question(self):
         """Get next verification question based on current state"""
-        if not self.verification_started:
-            self.verification_started = True
-            # First question of verification
-            return self.insurance_qa['eligibility']['status']['question']
+        first_question = not self.verification_started
+        self.verification_started = True
 
-        current_fields = self.insurance_qa[self.current_category].keys()
-        
-        # Look for next empty field in current category
-        for field in current_fields:
-            if self.verification.verification_data[self.current_category][field] is None:
-                return self.insurance_qa[self.current_category][field]['question']
-
-        # All fields in current category complete, move to next category
-        current_index = self.categories_order.index(self.current_category)
-        if current_index < len(self.categories_order) - 1:
-            next_category = self.categories_order[current_index + 1]
-            self.current_category = next_category
-            return (
-                self._get_category_intro() +
-                self.insurance_qa[next_category][list(self.insurance_qa[next_category].keys())[0]]['question']
-            )
-
-        return None  # All categories complete
+        # The record keeps the first open field; fields prefilled from a
+        # prior verification are already filled and never come up
+        spec = self.verification.record.next_open()
+        if spec is None:
+            return None  # All categories complete
+        new_category = spec.category != self.current_category and not first_question
+        self.current_category = spec.category
+        if new_category:
+            return self._get_category_intro() + spec.question
+        return spec.question
+
+    def get_current_field(self):
+        """Get the first unanswered field of the current category, or None"""
+        if self.is_patient_info_phase:
+            return None
+        spec = self.current_spec()
+        return spec.name if spec is not None else None
+
+    def current_spec(self):
+        """Schema entry of the open question in the current category, or None"""
+        spec = self.verification.record.next_open()
+        if spec is not None and spec.category == self.current_category:
+            return spec
+        # The cursor is only elsewhere when the category was set by hand (e.g. a resumed call)
+        for spec in CATEGORY_SPECS[self.current_category]:
+            if self.verification.record.get(spec) is None:
+                return spec
+        return None
+
+    def get_expected_answer_type(self):
+        """Get the answer type the rep is expected to give for the open question"""
+        if self.is_patient_info_phase:
+            # Only the consent question has a predictable answer shape
+            return 'yes_no' if hasattr(verify_patient, 'verification_asked') else None
+
+        spec = self.current_spec()
+        return spec.answer_type if spec is not None else None
 
     def _get_category_intro(self):
         """Get introduction message for new category"""
@@ -7,7 +7,8 @@ insurance_qa = {
                 "The patient's coverage is active and verified.",
                 "Yes, the patient is eligible and the coverage is in force.",
                 "The patient is eligible with active coverage status."
-            ]
+            ],
+            'expected_answers': ["Active", "Active", "Active", "Active"]
         },
         'effective_date': {
             'question': "What is their effective date of coverage?",
@@ -16,7 +17,8 @@ insurance_qa = {
                 "Their coverage began on March 15th, 2024.",
                 "The effective date shows as September 1st, 2023.",
                 "Coverage has been effective since July 1st, 2023."
-            ]
+            ],
+            'expected_answers': ["01/01/2024", "03/15/2024", "09/01/2023", "07/01/2023"]
         },
         'plan_type': {
             'question': "What type of plan do they have?",
@@ -25,7 +27,8 @@ insurance_qa = {
                 "They have a DHMO plan.",
                 "It's an indemnity plan.",
                 "The patient has a PPO Plus plan."
-            ]
+            ],
+            'expected_answers': ["PPO", "DHMO", "Indemnity", "PPO Plus"]
         },
         'group_number': {
             'question': "Could you verify their group number?",
@@ -34,7 +37,8 @@ insurance_qa = {
                 "I'm showing group number 789012.",
                 "Yes, the group number is 345678.",
                 "The verified group number is 901234."
-            ]
+            ],
+            'expected_answers': ["123456", "789012", "345678", "901234"]
         }
     },
     'benefits': {
@@ -45,7 +49,8 @@ insurance_qa = {
                 "They have a $2,000 annual maximum.",
                 "The yearly maximum benefit is $1,000.",
                 "Their annual maximum benefit is $2,500."
-            ]
+            ],
+            'expected_answers': [1500, 2000, 1000, 2500]
         },
         'remaining_maximum': {
             'question': "What is their remaining benefit amount?",
@@ -54,7 +59,8 @@ insurance_qa = {
                 "The remaining benefit is $800.",
                 "There is $1,850 left in benefits for this year.",
                 "The patient has $950 remaining in benefits."
-            ]
+            ],
+            'expected_answers': [1200, 800, 1850, 950]
         },
         'deductible': {
             'question': "What is their deductible amount?",
@@ -63,7 +69,8 @@ insurance_qa = {
                 "There's a $100 deductible.",
                 "The deductible is $75 individual.",
                 "They have a $150 calendar year deductible."
-            ]
+            ],
+            'expected_answers': [50, 100, 75, 150]
         },
         'deductible_met': {
             'question': "How much of the deductible has been met, please provide dollar amount?",
@@ -72,7 +79,8 @@ insurance_qa = {
                 "$25 of the deductible has been met.",
                 "They haven't met any of the deductible yet.",
                 "The deductible is met with $50 satisfied."
-            ]
+            ],
+            'expected_answers': [None, 25, 0, 50]
         },
         'benefit_period': {
             'question': "What is their benefit period?",
@@ -81,7 +89,8 @@ insurance_qa = {
                 "Benefits run on a fiscal year, July through June.",
                 "It's a calendar year benefit period.",
                 "The benefit period follows the calendar year."
-            ]
+            ],
+            'expected_answers': ["Calendar Year", "Fiscal Year", "Calendar Year", "Calendar Year"]
         }
     },
     'coverage': {
@@ -92,7 +101,8 @@ insurance_qa = {
                 "They have 100% coverage for preventive care.",
                 "Preventive is covered at 80%.",
                 "The plan covers preventive services at 90%."
-            ]
+            ],
+            'expected_answers': [100, 100, 80, 90]
         },
         'basic': {
             'question': "What about basic services?",
@@ -101,7 +111,8 @@ insurance_qa = {
                 "They have 70% coverage for basic procedures.",
                 "Basic services are at 80% after deductible.",
                 "The plan pays 75% for basic services."
-            ]
+            ],
+            'expected_answers': [80, 70, 80, 75]
         },
         'major': {
             'question': "What is the coverage for major services?",
@@ -110,7 +121,8 @@ insurance_qa = {
                 "Major procedures are at 60% coverage.",
                 "They have 50% coverage for major services.",
                 "The plan covers 40% for major procedures."
-            ]
+            ],
+            'expected_answers': [50, 60, 50, 40]
         },
         'periodontics': {
             'question': "What's the coverage for periodontal services?",
@@ -119,7 +131,8 @@ insurance_qa = {
                 "Periodontics falls under major at 50%.",
                 "They have 70% coverage for periodontal procedures.",
                 "Periodontal treatments are covered at 60%."
-            ]
+            ],
+            'expected_answers': [80, 50, 70, 60]
         },
         'endodontics': {
             'question': "And for endodontic services?",
@@ -128,7 +141,8 @@ insurance_qa = {
                 "Root canals and other endodontic services are at 50%.",
                 "Endodontics is covered at 70%.",
                 "They have 80% coverage for endodontic treatments."
-            ]
+            ],
+            'expected_answers': [80, 50, 70, 80]
         }
     },
     'limitations': {
@@ -139,7 +153,8 @@ insurance_qa = {
                 "Yes, there's a 6-month waiting period for major services.",
                 "Basic services have a 3-month waiting period, major has 12 months.",
                 "The plan has a 12-month waiting period for orthodontics."
-            ]
+            ],
+            'expected_answers': ["No waiting period", "6 months", None, "12 months"]
         },
         'frequency': {
             'question': "What are the frequency limitations?",
@@ -148,7 +163,8 @@ insurance_qa = {
                 "Exams and cleanings twice per year, x-rays once every 3 years.",
                 "Two cleanings per year with 6 months separation required.",
                 "Comprehensive exams once every 3 years, routine exams twice per year."
-            ]
+            ],
+            'expected_answers': [{"Cleanings": "twice per calendar year"}, {"Exams": "twice per year", "Cleanings": "twice per year", "X-rays": "once every 3 years"}, {"Cleanings": "twice per year, 6 months separation"}, {"Comprehensive exams": "once every 3 years", "Routine exams": "twice per year"}]
         },
         'missing_tooth': {
             'question': "Is there a missing tooth clause?",
@@ -157,7 +173,8 @@ insurance_qa = {
                 "No missing tooth clause on this plan.",
                 "Missing teeth are not covered if extracted prior to coverage.",
                 "The plan has a 12-month missing tooth provision."
-            ]
+            ],
+            'expected_answers': [True, False, True, True]
         },
         'pre_authorization': {
             'question': "Are there any pre-authorization requirements?",
@@ -166,7 +183,8 @@ insurance_qa = {
                 "No pre-authorization required for any services.",
                 "Major services require pre-authorization.",
                 "Pre-authorization needed for procedures exceeding $500."
-            ]
+            ],
+            'expected_answers': [True, False, True, True]
         }
     }
 }
@@ -1,18 +1,48 @@
 import os
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
 from dotenv import load_dotenv
-import google.generativeai as genai
+from tracing import TracedChat, tracer, record, increment
 
-def initialize_llm():
-    load_dotenv()
-    genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-    generation_config = {
+load_dotenv()
+
+# LLM client layer. Every backend goes through the same process-wide limits:
+# a concurrency semaphore, an optional token bucket and retries with
+# jittered exponential backoff.
+#   LLM_BACKEND=sdk    google.generativeai chat session (default)
+#   LLM_BACKEND=rest   generateContent over pooled HTTP connections; point
+#                      LLM_BASE_URL at llm_server.py to load-test offline
+#   LLM_BACKEND=local  in-process LocalChat, no network at all
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'sdk')
+LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'https://generativelanguage.googleapis.com').rstrip('/')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-1.5-flash-8b')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', '0'))  # requests per second, 0 disables
+LLM_BURST = int(os.getenv('LLM_BURST', str(max(1, LLM_MAX_CONCURRENCY))))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.25'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '4.0'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '10'))
+# Budget shared by all LLM calls of one turn (0 disables), and the hedge
+# threshold: a duplicate request goes out once the primary has taken longer
+# than the observed p95 of single calls (LLM_HEDGE_DELAY until enough samples)
+LLM_TURN_DEADLINE = float(os.getenv('LLM_TURN_DEADLINE', '2.5'))
+LLM_HEDGE_QUANTILE = float(os.getenv('LLM_HEDGE_QUANTILE', '0.95'))
+LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', '0.8'))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+generation_config = {
     'temperature': 0.1,      # Lower value for more deterministic responses
     'top_p': 0.5,           # More focused sampling
     'top_k': 10,            # Limit token selection
     'max_output_tokens': 100 # Control response length
-    }
+}
 
-    safety_settings = [
+safety_settings = [
     {
         "category": "HARM_CATEGORY_HARASSMENT",
         "threshold": "BLOCK_NONE"
@@ -21,12 +51,365 @@ def initialize_llm():
         "category": "HARM_CATEGORY_HATE_SPEECH",
         "threshold": "BLOCK_NONE"
     }
-    ]
+]
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# google.api_core exception names worth retrying, matched by name so the
+# SDK stays an optional import
+RETRYABLE_SDK_ERRORS = {'ResourceExhausted', 'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+                        'TooManyRequests', 'GatewayTimeout'}
+
+
+class RetryableError(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    """The turn's LLM budget ran out before a response arrived"""
+
+
+_deadline = contextvars.ContextVar('llm_deadline', default=None)
+
+
+def start_deadline(budget=None):
+    """Give the LLM calls of the current turn budget seconds in total"""
+    budget = LLM_TURN_DEADLINE if budget is None else budget
+    _deadline.set(time.monotonic() + budget if budget > 0 else None)
+
+
+def clear_deadline():
+    _deadline.set(None)
+
+
+def remaining_budget():
+    """Seconds left in the turn's budget, or None when no deadline is set"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_expired():
+    remaining = remaining_budget()
+    return remaining is not None and remaining <= 0
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, at most burst saved up"""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_bucket = TokenBucket(LLM_RATE_LIMIT, LLM_BURST) if LLM_RATE_LIMIT > 0 else None
+
+
+def _is_retryable(error):
+    return isinstance(error, RetryableError) or type(error).__name__ in RETRYABLE_SDK_ERRORS
+
+
+def backoff_delay(attempt, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_MAX):
+    """Full-jitter exponential backoff for the given retry attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_limits(send, max_retries=LLM_MAX_RETRIES):
+    """Run send() under the process-wide rate and concurrency limits, retrying transient errors"""
+    for attempt in range(max_retries + 1):
+        if _bucket is not None:
+            waited = _bucket.acquire()
+            if waited:
+                record('llm_throttle', waited)
+        queued = time.perf_counter()
+        with _semaphore:
+            if time.perf_counter() - queued > 0.001:
+                record('llm_queue', time.perf_counter() - queued)
+            try:
+                return send()
+            except Exception as e:
+                if attempt == max_retries or not _is_retryable(e):
+                    increment('llm_errors', kind=type(e).__name__)
+                    raise
+                error = e
+        delay = backoff_delay(attempt)
+        increment('llm_retries')
+        print(f"LLM call failed ({type(error).__name__}: {str(error)}), retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+
+class LimitedChat:
+    """Chat session proxy applying call_with_limits to every send_message"""
+    def __init__(self, chat):
+        self._chat = chat
+
+    def send_message(self, content, *args, **kwargs):
+        return call_with_limits(lambda: self._chat.send_message(content, *args, **kwargs))
+
+    def generate(self, content, history=()):
+        return call_with_limits(lambda: self._chat.generate(content, history))
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+_hedge_pool = None
+_hedge_pool_pid = None
+_hedge_pool_lock = threading.Lock()
+
+
+def get_hedge_pool():
+    """Process-wide pool for LLM requests, created on first use so forked workers get their own"""
+    global _hedge_pool, _hedge_pool_pid
+    with _hedge_pool_lock:
+        if _hedge_pool is None or _hedge_pool_pid != os.getpid():
+            _hedge_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY * 2, thread_name_prefix='llm')
+            _hedge_pool_pid = os.getpid()
+        return _hedge_pool
+
+
+def hedge_delay():
+    """Seconds to wait on a call before hedging: the observed tail latency of single calls"""
+    quantiles = tracer.quantiles('llm_call')
+    if tracer.stage_count('llm_call') < LLM_HEDGE_MIN_SAMPLES or not quantiles:
+        return LLM_HEDGE_DELAY
+    return quantiles.get(LLM_HEDGE_QUANTILE, LLM_HEDGE_DELAY)
+
+
+class HedgedChat:
+    """Chat session proxy enforcing the turn deadline and hedging slow calls.
+
+    The primary goes out as a stateless generate(content, history) with a
+    snapshot of the history, and only the exchange the caller receives is
+    recorded, so a primary abandoned at the deadline or beaten by the hedge
+    never touches the history the next call is using. The hedge is a
+    history-free hedge(content) call.
+    """
+    def __init__(self, chat, hedge=None):
+        self._chat = chat
+        self._hedge = hedge
+        self._lock = threading.Lock()
+
+    def _submit(self, send, content, role):
+        context = contextvars.copy_context()
+
+        def run():
+            with tracer.span('llm_call', role=role):
+                return send(content)
+        return get_hedge_pool().submit(context.run, run)
+
+    def send_message(self, content, history=True):
+        """history=False sends the prompt on its own and leaves the conversation history out of it"""
+        increment('llm_calls')
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            increment('llm_timeouts')
+            raise DeadlineExceeded("No LLM budget left this turn")
+
+        with self._lock:
+            turns = list(self._chat.history) if history else []
+        primary = self._submit(lambda c: self._chat.generate(c, turns), content, 'primary')
+        pending = {primary}
+        # Never wait past half the remaining budget, so the hedge still has time to land
+        delay = hedge_delay() if budget is None else min(hedge_delay(), budget / 2)
+        if self._hedge is not None:
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                increment('llm_hedges')
+                pending.add(self._submit(self._hedge, content, 'hedge'))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining_budget(), return_when=FIRST_COMPLETED)
+            if not done:
+                increment('llm_timeouts')
+                raise DeadlineExceeded("LLM response missed the turn deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        increment('llm_hedge_wins')
+                    response = future.result()
+                    if history:
+                        with self._lock:
+                            self._chat.record(content, response)
+                    return response
+                error = future.exception()
+        raise error
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+_sdk_lock = threading.Lock()
+_sdk_model = None
+
+
+def _get_sdk_model():
+    """Configure the SDK and build the model once per process"""
+    global _sdk_model
+    with _sdk_lock:
+        if _sdk_model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+            _sdk_model = genai.GenerativeModel(
+                model_name=LLM_MODEL,
+                generation_config=generation_config,
+                safety_settings=safety_settings
+            )
+        return _sdk_model
+
+
+_http_lock = threading.Lock()
+_http_session = None
+
+
+def get_http_session():
+    """Process-wide requests.Session with a connection pool sized to the concurrency limit"""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_MAX_CONCURRENCY)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+        return _http_session
+
+
+class SdkChat:
+    """Chat over the SDK model keeping its own history, so every request can be sent statelessly"""
+    def __init__(self, model=None):
+        self.model = model or _get_sdk_model()
+        self.history = []
+
+    def generate(self, content, history=()):
+        """One request with history as the earlier turns; self.history is untouched"""
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        return self.model.generate_content(list(history) + [{'role': 'user', 'parts': [text]}])
+
+    def record(self, content, response):
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        self.history = self.history + [{'role': 'user', 'parts': [text]}, {'role': 'model', 'parts': [response.text]}]
+
+    def send_message(self, content, *args, **kwargs):
+        response = self.generate(content, self.history)
+        self.record(content, response)
+        return response
+
+
+class RestChat:
+    """Multi-turn chat over the generateContent REST endpoint, mirroring the SDK's ChatSession"""
+    def __init__(self, base_url=LLM_BASE_URL, model=LLM_MODEL, api_key=None, timeout=LLM_TIMEOUT):
+        self.url = f"{base_url.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
+        self.timeout = timeout
+        self.history = []
+
+    def _payload(self, text, history=()):
+        contents = [{'role': message.role, 'parts': [{'text': part.text} for part in message.parts]}
+                    for message in history]
+        contents.append({'role': 'user', 'parts': [{'text': text}]})
+        return {
+            'contents': contents,
+            'generationConfig': {
+                'temperature': generation_config['temperature'],
+                'topP': generation_config['top_p'],
+                'topK': generation_config['top_k'],
+                'maxOutputTokens': generation_config['max_output_tokens']
+            },
+            'safetySettings': safety_settings
+        }
+
+    def _post(self, payload):
+        import requests
+        try:
+            response = get_http_session().post(
+                self.url, json=payload, params={'key': self.api_key} if self.api_key else None,
+                timeout=self.timeout
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(str(e))
+        if response.status_code in RETRYABLE_STATUS:
+            raise RetryableError(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        return response.json()
+
+    def _generate(self, payload):
+        body = self._post(payload)
+        parts = body['candidates'][0]['content']['parts']
+        return ''.join(part.get('text', '') for part in parts)
+
+    def generate(self, content, history=()):
+        """One request with history as the earlier turns (none by default); self.history is untouched"""
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        return SimpleNamespace(text=self._generate(self._payload(text, history)))
+
+    def record(self, content, response):
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        self.history = self.history + [SimpleNamespace(role='user', parts=[SimpleNamespace(text=text)]),
+                                       SimpleNamespace(role='model', parts=[SimpleNamespace(text=response.text)])]
+
+    def send_message(self, content, *args, **kwargs):
+        response = self.generate(content, self.history)
+        self.record(content, response)
+        return response
+
+
+def wrap_chat(chat, hedge=None, cassette=None):
+    """Apply tracing, the turn deadline, hedging and the process-wide limits to a raw chat.
+
+    With a cassette in record mode the exchanges as the caller saw them are
+    logged; in replay mode the recordings answer and chat is never called.
+    """
+    limited_hedge = (lambda content: call_with_limits(lambda: hedge(content))) if hedge else None
+    wrapped = HedgedChat(LimitedChat(chat), limited_hedge) if chat is not None else None
+    if cassette is not None:
+        from cassette import CassetteChat
+        wrapped = CassetteChat(cassette, wrapped)
+    return TracedChat(wrapped)
+
+
+def reset_chat(chat):
+    """Drop the conversation history of a wrapped chat so it can serve a new call"""
+    inner = chat
+    while vars(inner).get('_chat') is not None:
+        inner = vars(inner)['_chat']
+    if hasattr(inner, 'history'):
+        inner.history = []
+
 
-    model = genai.GenerativeModel(
-        model_name='gemini-1.5-flash-8b',
-        generation_config=generation_config,
-        safety_settings=safety_settings
-    )
+def initialize_llm(backend=None, cassette=None):
+    from cassette import get_cassette
+    cassette = cassette or get_cassette()
+    if cassette is not None and cassette.mode == 'replay':
+        return wrap_chat(None, cassette=cassette)
 
-    return model.start_chat()
\ No newline at end of file
+    backend = backend or LLM_BACKEND
+    if backend == 'rest':
+        chat = RestChat()
+        hedge = chat.generate
+    elif backend == 'local':
+        from local_llm import LocalChat
+        chat = LocalChat()
+        hedge = LocalChat().generate
+    else:
+        chat = SdkChat()
+        hedge = chat.generate
+    return wrap_chat(chat, hedge, cassette)
@@ -0,0 +1,132 @@
+"""Local stand-in for the Gemini generateContent endpoint.
+
+Answers with LocalChat after a delay drawn from a configurable latency
+distribution, optionally failing a fraction of requests with 429/503 so the
+client's retry path gets exercised. Point the agent at it with
+
+    python llm_server.py --port 8765 --latency lognormal:-1.2,0.5 --error-rate 0.02
+    LLM_BACKEND=rest LLM_BASE_URL=http://127.0.0.1:8765 python main.py replay --llm gemini
+
+Latency specs: fixed:S, uniform:LOW,HIGH, normal:MEAN,STD, lognormal:MU,SIGMA, exp:MEAN
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from local_llm import LocalChat
+
+
+def parse_latency(spec):
+    """Turn a latency spec such as 'uniform:0.2,0.6' into a sampler returning seconds"""
+    kind, _, params = (spec or 'fixed:0').partition(':')
+    values = [float(v) for v in params.split(',') if v] or [0.0]
+    samplers = {
+        'fixed': lambda rng: values[0],
+        'uniform': lambda rng: rng.uniform(values[0], values[1]),
+        'normal': lambda rng: rng.gauss(values[0], values[1]),
+        'lognormal': lambda rng: rng.lognormvariate(values[0], values[1]),
+        'exp': lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    sampler = samplers[kind]
+    return lambda rng: max(0.0, sampler(rng))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON'}})
+            return
+        if not self.path.split('?')[0].endswith(':generateContent'):
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+
+        server = self.server
+        with server.lock:
+            delay = server.latency(server.rng)
+            fail = server.rng.random() < server.error_rate
+            status = server.rng.choice((429, 503))
+            server.requests += 1
+        time.sleep(delay)
+        if fail:
+            self._send_json(status, {'error': {'code': status, 'message': 'Injected failure'}})
+            return
+
+        contents = payload.get('contents') or [{}]
+        prompt = ''.join(part.get('text', '') for part in contents[-1].get('parts', []))
+        text = server.chat.answer(prompt)
+        self._send_json(200, {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}]
+        })
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency='fixed:0', error_rate=0.0, seed=None, verbose=False):
+        super().__init__(address, StandInHandler)
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.chat = LocalChat()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.verbose = verbose
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(port=0, latency='fixed:0', error_rate=0.0, seed=None):
+    """Serve in a background thread; returns the server (see .base_url, .shutdown())"""
+    server = StandInServer(('127.0.0.1', port), latency, error_rate, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0', help='latency distribution spec')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered 429/503')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    server = StandInServer((args.host, args.port), args.latency, args.error_rate, args.seed, args.verbose)
+    print(f"LLM stand-in listening on {server.base_url} (latency {args.latency}, errors {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.requests} requests")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""Capacity test: how many concurrent verification calls one machine sustains.
+
+Starts the call server with local stand-ins for the LLM (local_llm.LocalChat
+with configurable latency) and the voice (the 'tone' TTS backend). Reps send
+text turns, so Whisper and the correction lookup are stood in for too: each
+turn waits --stt-rtf times the line's speaking time plus --correction-ms,
+inside the server's turn clock. The capacity found is only as good as those
+three stand-ins; measure them on the target machine. The script then ramps
+the number of simultaneous simulated insurance reps. Each rep answers from
+the sample_answers in insurance_qa_sample.json with randomized phrasing,
+think time, interruptions and volunteered extra fields, and starts a new call
+as soon as one ends. Every step reports throughput, turn latency percentiles
+and the server's CPU and memory, and the ramp stops once the latency SLO is
+missed or throughput stops growing.
+
+    python load_sim.py --ramp 1,2,4,8,16,32 --step-seconds 60
+    python load_sim.py --llm-latency 0.4 --llm-jitter 0.2 --stt-rtf 0.3 --time-scale 0.25 --report load.json
+    CALL_SERVER_TOKEN=... python load_sim.py --uri ws://10.0.0.5:8765 --server-pid 4242 --ramp 8,16,32
+"""
+import os
+import sys
+import json
+import time
+import secrets
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import psutil
+
+from call_server import CALL_SERVER_TOKEN, run_client
+from replay import ScriptedRep, load_samples
+from batch_extract import PREFIXES, SUFFIXES, _generated
+from schema import CATEGORY_SPECS
+from tracing import percentile
+
+THINK_TIME_S = 0.8
+SPEAKING_CHARS_PER_SECOND = 15
+SAMPLE_INTERVAL = 0.5
+
+
+class SimulatedRep(ScriptedRep):
+    """A less predictable rep: varied phrasing, think time, barge-ins and answers nobody asked for yet"""
+    def __init__(self, samples, seed=None, time_scale=1.0, interrupt_rate=0.1, volunteer_rate=0.15,
+                 synthetic_rate=0.3):
+        super().__init__(samples, seed)
+        self.time_scale = time_scale
+        self.interrupt_rate = interrupt_rate
+        self.volunteer_rate = volunteer_rate
+        self.synthetic_rate = synthetic_rate
+        self.last_line = ''
+
+    def answer(self, category, field):
+        entry = self.samples.get(category, {}).get(field)
+        if not entry or not entry.get('sample_answers'):
+            return None
+        generated = None
+        if self.random.random() < self.synthetic_rate:
+            generated = _generated(self.random, category, field, entry['question'])
+        answer = generated[3] if generated else self.random.choice(entry['sample_answers'])
+        return f"{self.random.choice(PREFIXES)}{answer}{self.random.choice(SUFFIXES)}"
+
+    def line_for(self, state):
+        if state['is_patient_info_phase'] or not state['field']:
+            self.last_line = super().line_for(state)
+            return self.last_line
+
+        category, field = state['current_category'], state['field']
+        line = self.answer(category, field) or "I'm not sure, let me check."
+        if self.random.random() < self.volunteer_rate:
+            # Run ahead to the next field of the same category
+            names = [spec.name for spec in CATEGORY_SPECS[category]]
+            if field in names and names.index(field) + 1 < len(names):
+                extra = self.answer(category, names[names.index(field) + 1])
+                if extra:
+                    line = f"{line} Also, {extra[0].lower()}{extra[1:]}"
+        self.last_line = line
+        return line
+
+    def pause(self, state):
+        """Think time plus the time it takes to say the line"""
+        think = self.random.lognormvariate(0, 0.5) * THINK_TIME_S
+        return (think + len(self.last_line) / SPEAKING_CHARS_PER_SECOND) * self.time_scale
+
+    def interrupts(self):
+        return self.random.random() < self.interrupt_rate
+
+
+class ResourceMonitor:
+    """Samples CPU and RSS of a process tree while a ramp step runs"""
+    def __init__(self, pid):
+        self.process = psutil.Process(pid) if pid else None
+        self.samples = []
+
+    def _tree(self):
+        processes = [self.process]
+        try:
+            processes += self.process.children(recursive=True)
+        except psutil.Error:
+            pass
+        return processes
+
+    async def run(self):
+        if self.process is None:
+            return
+        tree = self._tree()
+        for process in tree:
+            process.cpu_percent(None)
+        psutil.cpu_percent(None)
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            cpu, rss = 0.0, 0
+            for process in tree:
+                try:
+                    cpu += process.cpu_percent(None)
+                    rss += process.memory_info().rss
+                except psutil.Error:
+                    continue
+            self.samples.append((cpu, rss, psutil.cpu_percent(None)))
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        return {
+            'server_cpu_cores': round(sum(s[0] for s in self.samples) / len(self.samples) / 100, 2),
+            'server_rss_mb': round(max(s[1] for s in self.samples) / 1e6, 1),
+            'system_cpu_pct': round(sum(s[2] for s in self.samples) / len(self.samples), 1)
+        }
+
+
+async def run_step(uri, concurrency, duration, samples, args, seed):
+    """Keep concurrency calls going for duration seconds"""
+    monitor = ResourceMonitor(args.server_pid)
+    monitor_task = asyncio.create_task(monitor.run())
+    latencies, calls, errors = [], [], []
+    deadline = time.perf_counter() + duration
+
+    async def caller(index):
+        call = 0
+        while time.perf_counter() < deadline:
+            rep = SimulatedRep(samples, seed=seed + index * 1000 + call, time_scale=args.time_scale,
+                               interrupt_rate=args.interrupt_rate, volunteer_rate=args.volunteer_rate)
+            call += 1
+            start = time.perf_counter()
+            try:
+                status, _ = await run_client(uri, rep, max_turns=args.max_turns, latencies=latencies,
+                                             token=args.token)
+            except Exception as e:
+                errors.append(str(e))
+                await asyncio.sleep(0.1)
+                continue
+            calls.append((status, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(caller(index)) for index in range(concurrency)]
+    # Calls still running at the deadline get a grace period, then are cut off
+    done, pending = await asyncio.wait(tasks, timeout=duration + args.grace)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    wall = time.perf_counter() - start
+    monitor_task.cancel()
+
+    completed = [call for call in calls if call[0] == 'complete']
+    step = {
+        'concurrency': concurrency,
+        'calls': len(calls),
+        'completed': len(completed),
+        'cut_off': len(pending),
+        'errors': len(errors),
+        'calls_per_min': round(len(completed) / wall * 60, 1),
+        'turns_per_s': round(len(latencies) / wall, 1),
+        'mean_call_s': round(sum(c[1] for c in completed) / len(completed), 2) if completed else None
+    }
+    if latencies:
+        step.update({f"turn_p{pct}_ms": round(percentile(latencies, pct) * 1000, 1) for pct in (50, 95, 99)})
+    step.update(monitor.summary())
+    if errors:
+        print(f"  {len(errors)} client errors, e.g. {errors[0]}")
+    return step
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, max_concurrency):
+    """The call server with the local LLM and tone voice, in a subprocess"""
+    port = free_port()
+    command = [
+        sys.executable, 'call_server.py', '--host', '127.0.0.1', '--port', str(port),
+        '--mode', 'text', '--llm', 'local', '--llm-latency', str(args.llm_latency),
+        '--llm-jitter', str(args.llm_jitter), '--tts-backend', 'tone', '--no-correction',
+        '--store', '', '--session-pool', str(max_concurrency), '--max-calls', str(max_concurrency * 2)
+    ]
+    # The token goes through the environment, not the command line other users can list
+    env = dict(os.environ, TONE_TTS_RTF=str(args.tts_rtf), TEXT_TURN_STT_RTF=str(args.stt_rtf),
+               TEXT_TURN_CORRECTION_MS=str(args.correction_ms), CALL_SERVER_TOKEN=args.token)
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL if not args.verbose else None,
+                              stderr=subprocess.STDOUT)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Call server exited with {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return server, f"ws://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Call server did not start")
+
+
+def saturated(step, previous, slo_ms):
+    """True once the step misses the latency SLO or adds under 10% throughput"""
+    if step.get('turn_p95_ms') is None or step['turn_p95_ms'] > slo_ms or step['errors']:
+        return True
+    return previous is not None and step['calls_per_min'] < previous['calls_per_min'] * 1.1
+
+
+def print_step(step):
+    print(f"{step['concurrency']:>5}{step['completed']:>7}{step['calls_per_min']:>9}{step['turns_per_s']:>9}"
+          f"{step.get('turn_p50_ms', '-'):>9}{step.get('turn_p95_ms', '-'):>9}{step.get('turn_p99_ms', '-'):>9}"
+          f"{step.get('server_cpu_cores', '-'):>7}{step.get('server_rss_mb', '-'):>9}{step.get('system_cpu_pct', '-'):>7}")
+
+
+async def ramp(uri, levels, samples, args):
+    print(f"\n{'N':>5}{'calls':>7}{'/min':>9}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'cores':>7}{'RSS MB':>9}{'sys %':>7}")
+    steps = []
+    capacity = None
+    for concurrency in levels:
+        step = await run_step(uri, concurrency, args.step_seconds, samples, args, args.seed)
+        print_step(step)
+        if saturated(step, steps[-1] if steps else None, args.slo_ms):
+            step['saturated'] = True
+            steps.append(step)
+            if not args.full_ramp:
+                break
+            continue
+        capacity = concurrency
+        steps.append(step)
+    return steps, capacity
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ramp', default='1,2,4,8,16,32', help='concurrent calls per step')
+    parser.add_argument('--step-seconds', type=float, default=60)
+    parser.add_argument('--grace', type=float, default=30, help='seconds to let calls finish after a step')
+    parser.add_argument('--slo-ms', type=float, default=1500, help='p95 turn latency the machine must hold')
+    parser.add_argument('--full-ramp', action='store_true', help='keep ramping past saturation')
+    parser.add_argument('--uri', help='an already running call server, started with TEXT_TURN_STT_RTF and '
+                                      'TEXT_TURN_CORRECTION_MS set; otherwise one is started')
+    parser.add_argument('--server-pid', type=int, help='pid of the server at --uri, for CPU and memory')
+    parser.add_argument('--token', default=CALL_SERVER_TOKEN, help='token of the server at --uri')
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--llm-jitter', type=float, default=0.1)
+    parser.add_argument('--tts-rtf', type=float, default=0.05, help='tone voice cost as a fraction of real time')
+    parser.add_argument('--stt-rtf', type=float, default=0.15,
+                        help='STT stand-in cost per text turn as a fraction of its speaking time')
+    parser.add_argument('--correction-ms', type=float, default=40, help='correction stand-in cost per text turn')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='scale rep think and speaking time')
+    parser.add_argument('--interrupt-rate', type=float, default=0.1)
+    parser.add_argument('--volunteer-rate', type=float, default=0.15)
+    parser.add_argument('--max-turns', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', help='write every step as JSON')
+    parser.add_argument('--verbose', action='store_true', help='show the server output')
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.ramp.split(',') if level.strip()]
+    samples = load_samples()
+    server = None
+    uri = args.uri
+    if uri is None:
+        args.token = secrets.token_urlsafe(32)
+        server, uri = start_server(args, max(levels))
+        args.server_pid = server.pid
+        print(f"Call server started on {uri} (pid {server.pid})")
+
+    try:
+        steps, capacity = asyncio.run(ramp(uri, levels, samples, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if capacity is None:
+        print(f"\nSaturated at the first step; p95 SLO {args.slo_ms:.0f} ms not met")
+    else:
+        print(f"\nSustained {capacity} concurrent calls within the {args.slo_ms:.0f} ms p95 SLO "
+              f"(text turns with STT at {args.stt_rtf}x speaking time and {args.correction_ms:.0f} ms correction "
+              f"stand-ins)")
+    if args.report:
+        with open(args.report, 'w') as f:
+            settings = {key: value for key, value in vars(args).items() if key != 'token'}
+            json.dump({'capacity': capacity, 'steps': steps, 'settings': settings}, f, indent=2)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+# Deterministic parsers for the common shapes of insurance rep answers. Each
+# returns None whenever the answer is ambiguous so the caller can fall back
+# to the LLM.
+
+_UNITS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70,
+    'eighty': 80, 'ninety': 90
+}
+_SCALES = {'hundred': 100, 'thousand': 1000}
+_NUMBER_WORD = r'(?:' + '|'.join(list(_UNITS) + list(_SCALES)) + r')'
+_NUMBER_PHRASE = re.compile(rf'\b{_NUMBER_WORD}(?:[\s-]+(?:and\s+)?{_NUMBER_WORD})*\b', re.IGNORECASE)
+
+_MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4,
+    'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9,
+    'sep': 9, 'sept': 9, 'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
+}
+
+_PLAN_TYPES = [('ppo plus', 'PPO Plus'), ('dhmo', 'DHMO'), ('hmo', 'HMO'), ('ppo', 'PPO'),
+               ('epo', 'EPO'), ('pos', 'POS'), ('indemnity', 'Indemnity')]
+
+
+def words_to_number(text):
+    """Convert an English number phrase such as 'one hundred fifty' to an int"""
+    total, current = 0, 0
+    for word in re.split(r'[\s-]+', text.lower()):
+        if word == 'and' or not word:
+            continue
+        if word in _UNITS:
+            current += _UNITS[word]
+        elif word == 'hundred':
+            current = max(current, 1) * 100
+        elif word == 'thousand':
+            total += max(current, 1) * 1000
+            current = 0
+        else:
+            return None
+    return total + current
+
+
+def _single(values):
+    """The only distinct value, or None when there are zero or several"""
+    distinct = set(values)
+    return distinct.pop() if len(distinct) == 1 else None
+
+
+def parse_amount(response: str) -> Optional[float]:
+    text = response.lower()
+    if re.search(r"\b(haven't|hasn't|has not|have not|not) met any\b|\bnothing (has been )?met\b|\bnone of the\b", text):
+        return 0.0
+
+    values = []
+    for match in re.finditer(r'\$\s?(\d[\d,]*(?:\.\d+)?)\s*(k\b)?', text):
+        values.append(float(match.group(1).replace(',', '')) * (1000 if match.group(2) else 1))
+    for match in re.finditer(r'\b(\d[\d,]*(?:\.\d+)?)\s*(k\b|dollars?\b|bucks\b)', text):
+        if text[max(0, match.start() - 1):match.start()] == '$':
+            continue
+        scale = 1000 if match.group(2) == 'k' else 1
+        values.append(float(match.group(1).replace(',', '')) * scale)
+    for match in re.finditer(rf'({_NUMBER_PHRASE.pattern})\s+dollars?\b', text, re.IGNORECASE):
+        number = words_to_number(match.group(1))
+        if number is not None:
+            values.append(float(number))
+    return _single(values)
+
+
+def parse_percentage(response: str) -> Optional[int]:
+    text = response.lower()
+    values = [int(m.group(1)) for m in re.finditer(r'(\d{1,3})\s*(?:%|percent\b)', text)]
+    for match in re.finditer(rf'({_NUMBER_PHRASE.pattern})\s+percent\b', text, re.IGNORECASE):
+        number = words_to_number(match.group(1))
+        if number is not None:
+            values.append(number)
+    if re.search(r'\bfull coverage\b|\bcovered in full\b|\bfully covered\b', text):
+        values.append(100)
+    if re.search(r'\bhalf coverage\b|\bcovered at half\b', text):
+        values.append(50)
+    value = _single(values)
+    return value if value is not None and 0 <= value <= 100 else None
+
+
+def parse_date(response: str, today=None) -> Optional[str]:
+    today = today or datetime.now()
+    text = response.lower()
+    values = []
+    for match in re.finditer(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b', text):
+        month, day, year = (int(g) for g in match.groups())
+        values.append((month, day, year + 2000 if year < 100 else year))
+    month_names = '|'.join(sorted(_MONTHS, key=len, reverse=True))
+    for match in re.finditer(rf'\b({month_names})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s+(\d{{4}}))?\b', text):
+        month = _MONTHS[match.group(1)]
+        year = int(match.group(3)) if match.group(3) else today.year
+        values.append((month, int(match.group(2)), year))
+    if not values and re.search(r'\b(start|beginning) of (the|this) year\b', text):
+        values.append((1, 1, today.year))
+
+    value = _single(values)
+    if value is None:
+        return None
+    month, day, year = value
+    try:
+        datetime(year, month, day)
+    except ValueError:
+        return None
+    return f"{month:02d}/{day:02d}/{year}"
+
+
+def parse_status(response: str) -> Optional[str]:
+    text = response.lower()
+    inactive = (r"\b(inactive|ineligible|terminated|not (currently )?(active|eligible|covered)|"
+                r"no longer( (active|eligible|covered))?)\b")
+    values = ['Inactive' for _ in re.finditer(inactive, text)]
+    # "The patient is active, the spouse terminated" names both
+    values += ['Active' for _ in re.finditer(r'\b(active|eligible|in force|covered)\b', re.sub(inactive, ' ', text))]
+    return _single(values)
+
+
+def parse_plan_type(response: str) -> Optional[str]:
+    text = response.lower()
+    for pattern, name in _PLAN_TYPES:
+        if re.search(rf'\b{pattern}\b', text):
+            return name
+    return None
+
+
+def parse_group_number(response: str) -> Optional[str]:
+    match = re.search(r'group\s*(?:number|#|no\.?)?\s*(?:is\s*)?(\d[\d-]{2,})', response, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def parse_period(response: str) -> Optional[str]:
+    text = response.lower()
+    values = []
+    for kind in ('calendar', 'fiscal', 'contract', 'plan', 'benefit'):
+        if re.search(rf'\b{kind} year\b', text):
+            values.append(f"{kind.title()} Year")
+    for match in re.finditer(r'\b(\d+)[\s-]?(month|year)s?\b', text):
+        values.append(f"{match.group(1)} {match.group(2)}s")
+    if re.search(r"\bno waiting period|\bthere's no waiting|\bnot any waiting\b", text):
+        values.append('No waiting period')
+    return _single(values)
+
+
+def parse_boolean(response: str) -> Optional[bool]:
+    text = response.lower().strip()
+    # Whether these mean yes or no depends on how the question was phrased
+    if re.search(r"\b(no problem|not at all|don't mind|do not mind|not a problem)\b", text):
+        return None
+    values = []
+    first_word = re.sub(r'[^\w]', '', text.split()[0]) if text.split() else ''
+    if first_word in ('yes', 'yeah', 'yep', 'sure', 'correct', 'absolutely', 'definitely', 'ok', 'okay'):
+        values.append(True)
+    if first_word in ('no', 'nope', 'none', 'negative'):
+        values.append(False)
+    negative = r"\b(not required|isn't|is not|doesn't|does not|there's no|there is no|no need)\b"
+    if re.search(negative, text):
+        values.append(False)
+    if re.search(r"\b(required|requires?|needed|there's a|there is a|has an?|applies|go ahead|what would you like|"
+                 r"what do you want|what can i help)\b", re.sub(negative, ' ', text)):
+        values.append(True)
+    return _single(values)
+
+
+_SERVICES = r'(comprehensive exams?|routine exams?|exams?|cleanings?|x-rays?|bitewings?|fluoride|sealants?)'
+_FREQUENCY = (r'((?:once|twice|one|two|three|\d+)(?: times?)?\s+(?:per|a|every)\s+'
+              r'(?:\d+\s+)?(?:calendar\s+)?(?:years?|months?))')
+
+
+def parse_frequency(response: str) -> Optional[dict]:
+    result = {}
+    for clause in re.split(r'[,;]|\.\s', response):
+        frequency = re.search(_FREQUENCY, clause, re.IGNORECASE)
+        if not frequency:
+            continue
+        for service in re.findall(_SERVICES, clause, re.IGNORECASE):
+            result[service[0].upper() + service[1:]] = frequency.group(1)
+    return result or None
+
+
+PARSERS = {
+    'extract_status': parse_status,
+    'extract_date': parse_date,
+    'extract_plan_type': parse_plan_type,
+    'extract_amount': parse_amount,
+    'extract_percentage': parse_percentage,
+    'extract_group_number': parse_group_number,
+    'extract_period': parse_period,
+    'extract_frequency': parse_frequency,
+    'extract_boolean': parse_boolean
+}
@@ -0,0 +1,115 @@
+import re
+import json
+import time
+import random
+
+import local_extractors
+
+# Offline stand-in for the Gemini chat session. It recognises each prompt the
+# agent sends, pulls out the rep's text and answers the way the real model is
+# instructed to, so the full pipeline runs without network access.
+
+PROMPT_KINDS = [
+    ("respond with ONLY 'transition' or 'continue'", 'transition'),
+    ('phrase offering help', 'help'),
+    ('contain information relevant to', 'has_info'),
+    ('suggest the most likely correction', 'correction'),
+    ('determine the insurance status', 'extract_status'),
+    ('MM/DD/YYYY', 'extract_date'),
+    ('extract the dollar amount', 'extract_amount'),
+    ('extract the percentage', 'extract_percentage'),
+    ('extract the insurance plan type', 'extract_plan_type'),
+    ('extract the insurance group number', 'extract_group_number'),
+    ('extract the time period', 'extract_period'),
+    ('extract the frequency limitation', 'extract_frequency'),
+    ('positive (yes) or negative (no)', 'extract_boolean')
+]
+
+HELP_PHRASES = re.compile(
+    r'\b(how (may|can) i (help|assist)|what can i (help|do)|how can help|what else|what do you need|'
+    r'what would you like|go ahead)\b',
+    re.IGNORECASE
+)
+TRANSITION_PHRASES = re.compile(r"\b(help|assist|what's next|ready|proceed|go ahead|what else)\b", re.IGNORECASE)
+INFO_PATTERN = re.compile(
+    r'\d|\b(active|inactive|eligible|ineligible|yes|no|none|calendar|fiscal|ppo|hmo|dhmo|indemnity|'
+    r'full|half|required|waiting)\b',
+    re.IGNORECASE
+)
+
+
+def classify_prompt(prompt):
+    for marker, kind in PROMPT_KINDS:
+        if marker in prompt:
+            return kind
+    return None
+
+
+def _last_field(prompt, label):
+    """Value of the last 'Label: ...' line, unquoted"""
+    matches = re.findall(rf'^\s*{label}:\s*(.*?)\s*$', prompt, re.MULTILINE)
+    if not matches:
+        return ''
+    return matches[-1].strip().strip('"').strip()
+
+
+class LocalResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class LocalChat:
+    """Drop-in for a Gemini ChatSession answering from local_extractors"""
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.history = []
+        self._random = random.Random(seed)
+
+    def send_message(self, content, *args, **kwargs):
+        prompt = content.get('text', '') if isinstance(content, dict) else str(content)
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        return LocalResponse(self.answer(prompt))
+
+    def generate(self, content, history=()):
+        """Answers never depend on earlier turns, so history is ignored"""
+        return self.send_message(content)
+
+    def record(self, content, response):
+        pass
+
+    def answer(self, prompt):
+        kind = classify_prompt(prompt)
+
+        if kind == 'transition':
+            text = _last_field(prompt, 'Input')
+            return 'transition' if TRANSITION_PHRASES.search(text) else 'continue'
+
+        if kind == 'help':
+            return 'True' if HELP_PHRASES.search(_last_field(prompt, 'Text')) else 'False'
+
+        if kind == 'has_info':
+            return 'True' if INFO_PATTERN.search(_last_field(prompt, 'Text')) else 'False'
+
+        if kind == 'correction':
+            return json.dumps({'suggestion': _last_field(prompt, 'Input'), 'confidence': 'low'})
+
+        if kind is None:
+            return 'None'
+
+        response = _last_field(prompt, 'Response')
+        value = local_extractors.PARSERS[kind](response)
+        if value is None and kind == 'extract_boolean':
+            # The boolean extractor is sometimes called with question and response swapped
+            value = local_extractors.parse_boolean(_last_field(prompt, 'Question'))
+
+        if value is None:
+            return 'None'
+        if isinstance(value, bool):
+            return str(value)
+        if isinstance(value, float):
+            return f"{value:g}"
+        if isinstance(value, dict):
+            return json.dumps(value)
+        return str(value)
@@ -1,11 +1,8 @@
-import os
-import numpy as np
-import json
+import sys
 import warnings
 import nltk
 import time
 import speech_recognition as sr
-import whisper
 
 from utils import (
     fake_patient, 
@@ -16,22 +13,106 @@ from utils import (
     enhance_accent_handling,
     handle_confirmation
 )
-from llm import initialize_llm
-from stt import initialize_enhanced_recognition, listen_for_speech
+from llm import start_deadline
+from stt import initialize_enhanced_recognition, listen_for_speech, transcribe_audio, preload_stt_model
 from tts import initialize_tts, handle_speech_output
+from clip_bank import ClipBank
+from acknowledgements import AcknowledgementPlayer
+from results_store import get_store
+from prior_verifications import PRIOR_VERIFICATION, apply_prior_verification
+from session_log import open_session_log
+from speculation import SPECULATIVE_EXTRACTION, Speculation
 from verification import InsuranceVerification
-from flow import ConversationFlowManager, verify_patient
+from flow import ConversationFlowManager
+from tracing import tracer, span, start_session, start_turn, set_field
+from profiling import maybe_start_profiler, faiss_bytes, chat_history_bytes, clip_bank_bytes
+
+
+def greeting_parts(office_name, patient):
+    """The greeting's sentences; only the middle one depends on the patient"""
+    return (
+        f"Hi, this is an assistant from {office_name}.",
+        f"I'm calling about our patient {patient['first_name']} {patient['last_name']}.",
+        "Would you mind helping me verify insurance coverage?"
+    )
+
+
+def build_greeting(office_name, patient):
+    return " ".join(greeting_parts(office_name, patient))
+
+
+def build_resume_greeting(office_name, patient, flow_manager):
+    greeting = (
+        f"Hi, this is an assistant from {office_name} calling back about our patient "
+        f"{patient['first_name']} {patient['last_name']}. We got disconnected earlier. "
+    )
+    if flow_manager.is_patient_info_phase:
+        return greeting + "Would you mind helping me verify insurance coverage?"
+    return greeting + "I just need a few more details. " + (flow_manager.get_next_question() or "")
+
+
+def resolve_input(text, verification, flow_manager, faiss_index, correction_df):
+    """Validate a transcript in context and apply accent corrections.
+
+    Returns the text to process and, when a correction needs the rep to
+    confirm it first, the correction result; otherwise None.
+    """
+    validation_result = validate_input_context(text, verification, faiss_index, correction_df)
+
+    if validation_result["needs_correction"]:
+        print(f"Input needs correction: {validation_result['reason']}")
+        # Pass current context when calling enhance_accent_handling
+        current_context = "insurance verification" if flow_manager.verification_started else "patient information"
+        correction_result = enhance_accent_handling(text, faiss_index, correction_df, verification, current_context)
+
+        if correction_result['needs_confirmation']:
+            return text, correction_result
+        text = correction_result['corrected']
+        print(f"Auto-corrected input: {text}")
+    else:
+        print("Input was valid, proceeding without correction")
+    return text, None
+
+
+def generate_response(text, verification, flow_manager):
+    """Run the flow manager on resolved text and return the formatted reply, if any"""
+    print(f"Processing response: {text}")
+    response, is_transition = flow_manager.process_response(text, verification)
+    print(f"Response: {response}, Is transition: {is_transition}")
+    if flow_manager.session_log is not None:
+        flow_manager.session_log.checkpoint(verification, flow_manager)
+
+    if not response:
+        return None
+    formatted_response = format_speech_output(response)
+    print(f"\nResponding: {formatted_response}")
+    return formatted_response
 
 
 def main():
+    profiler = None
+    acks = None
+    session_log = None
+    store = get_store()
     try:
         nltk.download('punkt_tab', quiet=True)
         warnings.filterwarnings('ignore')
         office_name = "Everest Dental Clinic"
 
         patient = fake_patient()
+        session_id = start_session()
+        print(f"Trace session: {session_id}")
         verification = InsuranceVerification(office_name, patient)
         flow_manager = ConversationFlowManager(verification, patient)
+        # Pick up a dropped call for this member where it left off
+        session_log, resumed = open_session_log(session_id, patient, verification, flow_manager)
+
+        # Skip the call entirely when a recent verification is still fresh
+        if PRIOR_VERIFICATION and apply_prior_verification(verification, patient, store):
+            print("All fields are still fresh from a prior verification, no call needed")
+            store.save(get_verification_summary(verification), patient, session_id)
+            session_log.close('skipped')
+            return
         faiss_index, correction_df = initialize_correction_system()
         
         if faiss_index is None or correction_df is None:
@@ -39,12 +120,21 @@ def main():
             return
 
         tts = initialize_tts()
+        clip_bank = ClipBank(tts)
+        clip_bank.prerender()
+        acks = AcknowledgementPlayer(clip_bank)
+
+        profiler = maybe_start_profiler(session_id)
+        if profiler:
+            profiler.track('faiss_index', faiss_index, faiss_bytes)
+            profiler.track('chat_history', verification.chat, chat_history_bytes)
+            profiler.track('audio_clips', clip_bank, clip_bank_bytes)
         recognizer = initialize_enhanced_recognition()
         queue = []
         play_obj = None
 
-        if not hasattr(whisper, 'cached_model'):
-            whisper.cached_model = whisper.load_model("base")
+        # Load the shared STT model up front so the first turn does not pay for it
+        preload_stt_model()
 
         # Display patient information
         print("\nPatient Information Available:")
@@ -55,14 +145,12 @@ def main():
         print("\nStarting in Patient Information Phase\n")
 
         # Initial greeting
-        initial_message = (
-            f"Hi, this is an assistant from {office_name}. "
-            f"I'm calling about our patient {patient['first_name']} {patient['last_name']}. "
-            f"Would you mind helping me verify insurance coverage?"
-        )
-        initial_message = format_speech_output(initial_message)
-        wav = np.array(tts.tts(text=initial_message))
-        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, None)
+        if resumed:
+            initial_message = format_speech_output(build_resume_greeting(office_name, patient, flow_manager))
+        else:
+            initial_message = format_speech_output(build_greeting(office_name, patient))
+        wav = clip_bank.synthesize(initial_message)
+        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, None, tts.sample_rate)
 
         # Main conversation loop
         while True:
@@ -75,7 +163,7 @@ def main():
                             queue.clear()
                             audio = listen_for_speech(recognizer, source, play_obj)
                             if audio:
-                                text = recognizer.recognize_whisper(audio, model="base")
+                                text = transcribe_audio(audio)
                                 print(f"Heard during speech: {text}")
                                 continue
 
@@ -88,17 +176,34 @@ def main():
 
                     # Listen for speech
                     recognizer.adjust_for_ambient_noise(source, duration=1)
-                    audio = listen_for_speech(recognizer, source, play_obj)
+                    set_field(flow_manager.current_category, flow_manager.get_current_field())
+                    # Start extracting the answer while the rep is still finishing the sentence
+                    speculation = Speculation(verification, flow_manager) if SPECULATIVE_EXTRACTION else None
+                    with span('capture'):
+                        audio = listen_for_speech(
+                            recognizer, source, play_obj,
+                            expected_type=flow_manager.get_expected_answer_type(),
+                            transcribe=transcribe_audio,
+                            on_partial=speculation.observe if speculation else None
+                        )
+                    flow_manager.speculation = speculation
                     
                     if not audio:
                         continue
 
-                    # Process speech input
-                    text = recognizer.recognize_whisper(audio, model="base")
+                    # The turn runs from the end of the rep's speech to our first audio
+                    start_turn()
+                    start_deadline()
+                    # Cover long processing with an acknowledgement instead of dead air
+                    acks.start()
+
+                    # Process speech input, reusing the endpointing transcript when present
+                    text = getattr(audio, 'transcript', None) or transcribe_audio(audio)
                     print(f"Original input: {text}")
                     
                     # Check for quit command
                     if text.lower() == "quit":
+                        acks.stop()
                         verification_summary = get_verification_summary(verification)
                         print("\nVerification Summary:")
                         for category, data in verification_summary['collected'].items():
@@ -107,55 +212,46 @@ def main():
                                 for field, value in data.items():
                                     print(f"  {field}: {value}")
                         
-                        with open('verification_results.json', 'w') as f:
-                            json.dump(verification_summary, f, indent=2)
-                        print("\nResults saved to verification_results.json")
+                        store.save(verification_summary, patient, session_id)
+                        print(f"\nResults queued for {store.path}")
                         break
 
                     # First check if input needs correction in context
-                    validation_result = validate_input_context(text, verification, flow_manager, faiss_index, correction_df)
-                    
-                    if validation_result["needs_correction"]:
-                        print(f"Input needs correction: {validation_result['reason']}")
-                        # Pass current context when calling enhance_accent_handling
-                        current_context = "insurance verification" if flow_manager.verification_started else "patient information"
-                        correction_result = enhance_accent_handling(text, faiss_index, correction_df, verification, current_context)
+                    text, correction_result = resolve_input(text, verification, flow_manager, faiss_index, correction_df)
+
+                    if correction_result:
+                        acks.stop()
+                        confirmation_msg = correction_result['confirmation_msg']
+                        formatted_confirmation = format_speech_output(confirmation_msg)
+                        print(f"Seeking confirmation: {formatted_confirmation}")
+                        wav = clip_bank.synthesize(formatted_confirmation)
+                        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source, tts.sample_rate)
                         
-                        if correction_result['needs_confirmation']:
-                            confirmation_msg = correction_result['confirmation_msg']
-                            formatted_confirmation = format_speech_output(confirmation_msg)
-                            print(f"Seeking confirmation: {formatted_confirmation}")
-                            wav = np.array(tts.tts(text=formatted_confirmation))
-                            play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source)
-                            
-                            confirmation_audio = listen_for_speech(recognizer, source, play_obj)
-                            if confirmation_audio:
-                                confirmation = recognizer.recognize_whisper(confirmation_audio, model="base")
-                                if handle_confirmation(confirmation):
-                                    text = correction_result['corrected']
-                                    print(f"Confirmation received, using corrected input: {text}")
-                                else:
-                                    print("Correction rejected, asking for rephrasing")
-                                    error_msg = "Could you please rephrase that?"
-                                    wav = np.array(tts.tts(text=error_msg))
-                                    play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source)
-                                    continue
-                        else:
-                            text = correction_result['corrected']
-                            print(f"Auto-corrected input: {text}")
-                    else:
-                        print("Input was valid, proceeding without correction")
+                        confirmation_audio = listen_for_speech(recognizer, source, play_obj)
+                        if confirmation_audio:
+                            confirmation = transcribe_audio(confirmation_audio)
+                            if handle_confirmation(confirmation):
+                                text = correction_result['corrected']
+                                print(f"Confirmation received, using corrected input: {text}")
+                                start_deadline()
+                                acks.start()
+                            else:
+                                print("Correction rejected, asking for rephrasing")
+                                error_msg = "Could you please rephrase that?"
+                                wav = clip_bank.synthesize(error_msg)
+                                play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source, tts.sample_rate)
+                                continue
 
                     # Process response and get next action
-                    print(f"Processing response: {text}")
-                    response, is_transition = flow_manager.process_response(text, verification)
-                    print(f"Response: {response}, Is transition: {is_transition}")
-                    
-                    if response:
-                        formatted_response = format_speech_output(response)
-                        print(f"\nResponding: {formatted_response}")
-                        wav = np.array(tts.tts(text=formatted_response))
-                        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source)
+                    formatted_response = generate_response(text, verification, flow_manager)
+                    wav = clip_bank.synthesize(formatted_response) if formatted_response else None
+                    acks.stop()
+                    if wav is not None:
+                        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source, tts.sample_rate)
+
+                    tracer.write_snapshot()
+                    if profiler:
+                        profiler.end_turn()
 
                     # Check for verification completion
                     verification_summary = get_verification_summary(verification)
@@ -167,34 +263,59 @@ def main():
                                 print(f"\n{category.upper()}:")
                                 for field, value in data.items():
                                     print(f"  {field}: {value}")
+                        store.save(verification_summary, patient, session_id)
+                        session_log.close('complete')
                         
                         completion_message = "All verification information has been collected. Thank you for your help.\
                         Have a nice day. Bye Bye."
-                        wav = np.array(tts.tts(text=completion_message))
-                        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source)
+                        wav = clip_bank.synthesize(completion_message)
+                        play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source, tts.sample_rate)
                         break
 
             except sr.UnknownValueError:
+                acks.stop()
                 print("Could not understand audio input")
                 error_msg = "I'm sorry, I couldn't understand that. Could you please repeat?"
-                wav = np.array(tts.tts(text=error_msg))
-                play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source)
+                wav = clip_bank.synthesize(error_msg)
+                play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source, tts.sample_rate)
                 
             except Exception as e:
+                acks.stop()
                 print(f"Error in main loop: {str(e)}")
                 error_msg = "I encountered an error. Could you please rephrase that?"
-                wav = np.array(tts.tts(text=error_msg))
-                play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source)
+                wav = clip_bank.synthesize(error_msg)
+                play_obj = handle_speech_output(queue, play_obj, wav, recognizer, source, tts.sample_rate)
 
     finally:
+        # A log left without an end event is what makes the call resumable
+        if session_log:
+            session_log.close()
+        store.close()
+        if acks:
+            acks.stop(tail=0)
         if play_obj and play_obj.is_playing():
             play_obj.stop()
-        if hasattr(whisper, 'cached_model'):
-            del whisper.cached_model
+        tracer.write_snapshot()
+        tracer.close()
+        if profiler:
+            profiler.stop()
 
 if __name__ == '__main__':
     try:
-        main()
+        if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+            from replay import main as replay_main
+            replay_main(sys.argv[2:])
+        elif len(sys.argv) > 1 and sys.argv[1] == 'campaign':
+            from campaign import main as campaign_main
+            campaign_main(sys.argv[2:])
+        elif len(sys.argv) > 1 and sys.argv[1] == 'serve':
+            from call_server import main as serve_main
+            serve_main(sys.argv[2:])
+        elif len(sys.argv) > 1 and sys.argv[1] == 'load-sim':
+            from load_sim import main as load_sim_main
+            load_sim_main(sys.argv[2:])
+        else:
+            main()
     except KeyboardInterrupt:
         print("\nExiting gracefully...")
     except Exception as e:
@@ -0,0 +1,161 @@
+import os
+import gc
+import time
+import threading
+
+# Process-wide registry: every model is loaded once, lazily, and shared by all
+# sessions in the process (and by forked workers, copy-on-write).
+STT_BACKENDS = ('whisper', 'whisper-int8', 'faster-whisper')
+DEFAULT_STT_BACKEND = 'whisper'
+DEFAULT_STT_MODEL_SIZE = 'base'
+
+_models = {}
+_load_stats = {}
+_lock = threading.Lock()
+
+
+def get_model(key, loader):
+    """Return the registered model for key, loading it once with loader if needed"""
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            rss_before = process_rss()
+            start = time.perf_counter()
+            model = loader()
+            _models[key] = model
+            _load_stats[key] = {
+                'load_seconds': round(time.perf_counter() - start, 3),
+                'rss_delta_bytes': max(0, process_rss() - rss_before),
+                'weight_bytes': model_weight_bytes(model)
+            }
+            print(f"Loaded model {key} in {_load_stats[key]['load_seconds']}s")
+    return model
+
+
+def release_model(key):
+    """Drop a registered model so its memory can be reclaimed"""
+    with _lock:
+        _models.pop(key, None)
+        _load_stats.pop(key, None)
+    gc.collect()
+
+
+def get_stt_model(backend=None, size=None):
+    """Return the shared STT model for the configured backend"""
+    backend, size = resolve_stt_config(backend, size)
+    return get_model(('stt', backend, size), lambda: _load_stt_model(backend, size))
+
+
+def resolve_stt_config(backend=None, size=None):
+    backend = backend or os.getenv('STT_BACKEND', DEFAULT_STT_BACKEND)
+    size = size or os.getenv('STT_MODEL_SIZE', DEFAULT_STT_MODEL_SIZE)
+    if backend not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend '{backend}', expected one of {STT_BACKENDS}")
+    return backend, size
+
+
+def _load_stt_model(backend, size):
+    if backend == 'faster-whisper':
+        # CTranslate2 int8 kernels, no PyTorch at inference time
+        from faster_whisper import WhisperModel
+        return WhisperModel(size, device='cpu', compute_type='int8')
+
+    import whisper
+    model = whisper.load_model(size, device='cpu')
+    if backend == 'whisper-int8':
+        import torch
+        # whisper.model.Linear only differs from nn.Linear in dtype casting, which
+        # is a no-op in fp32 on CPU; downcast it so dynamic quantization applies.
+        for module in model.modules():
+            if isinstance(module, whisper.model.Linear):
+                module.__class__ = torch.nn.Linear
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def transcribe_array(audio, backend=None, size=None):
+    """Transcribe a 16 kHz mono float32 array with the shared STT model"""
+    backend, size = resolve_stt_config(backend, size)
+    model = get_stt_model(backend, size)
+
+    if backend == 'faster-whisper':
+        segments, _ = model.transcribe(audio, language='en', beam_size=1)
+        return ' '.join(segment.text.strip() for segment in segments).strip()
+
+    result = model.transcribe(audio, language='en', fp16=False)
+    return result['text'].strip()
+
+
+def transcribe_batch(audios, backend=None, size=None):
+    """Transcribe several 16 kHz float32 arrays, decoding clips of up to 30 s as one batch"""
+    backend, size = resolve_stt_config(backend, size)
+    if backend == 'faster-whisper' or len(audios) == 1:
+        return [transcribe_array(audio, backend, size) for audio in audios]
+
+    import torch
+    import whisper
+    model = get_stt_model(backend, size)
+    texts = [None] * len(audios)
+    short = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+    if short:
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audios[i])), n_mels=model.dims.n_mels)
+            for i in short
+        ])
+        options = whisper.DecodingOptions(language='en', fp16=False, without_timestamps=True)
+        with torch.no_grad():
+            results = whisper.decode(model, mels, options)
+        for i, result in zip(short, results):
+            texts[i] = result.text.strip()
+    for i, text in enumerate(texts):
+        if text is None:
+            # Longer than one window: needs the sliding-window transcribe loop
+            texts[i] = transcribe_array(audios[i], backend, size)
+    return texts
+
+
+def process_rss():
+    """Resident set size of this process in bytes, 0 if it cannot be read"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return 0
+
+
+def model_weight_bytes(model):
+    """Bytes held by a model's tensors, including packed quantized weights"""
+    state_dict = getattr(model, 'state_dict', None)
+    if state_dict is None:
+        return None
+
+    def tensor_bytes(value):
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(v) for v in value)
+        if hasattr(value, 'element_size') and hasattr(value, 'nelement'):
+            return value.element_size() * value.nelement()
+        return 0
+
+    try:
+        return sum(tensor_bytes(value) for value in state_dict().values())
+    except Exception:
+        return None
+
+
+def memory_report():
+    """Memory accounting for the process and each registered model"""
+    return {
+        'process_rss_bytes': process_rss(),
+        'models': {
+            '/'.join(str(part) for part in key): dict(stats)
+            for key, stats in _load_stats.items()
+        }
+    }
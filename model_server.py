@@ -0,0 +1,454 @@
+"""Local model server: one copy of the STT, embedding and TTS models for every call worker.
+
+Workers connect over a Unix socket. Concurrent STT and embedding requests
+are gathered for a short window and run as one batch; TTS requests stream
+int16 PCM back sentence by sentence, interleaved across requests so every
+caller gets its first audio early.
+
+The protocol pickles its messages, so only the user running the server may
+connect: the socket lives in a private (0700) directory and is itself 0600,
+and clients must present the auth key. Without MODEL_SERVER_AUTHKEY the
+server generates a random key and writes it next to the socket as a 0600
+.key file, which clients of the same user read.
+
+    python model_server.py --socket $XDG_RUNTIME_DIR/dental-agent/models.sock --services stt,embed,tts
+    MODEL_SERVER_SOCKET=$XDG_RUNTIME_DIR/dental-agent/models.sock python main.py campaign roster.csv --workers 8
+"""
+import os
+import stat
+import time
+import queue
+import secrets
+import tempfile
+import argparse
+import itertools
+import threading
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+from model_registry import get_stt_model, resolve_stt_config, transcribe_batch, memory_report
+from tracing import record, increment
+
+MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET')
+MODEL_SERVER_AUTHKEY = os.getenv('MODEL_SERVER_AUTHKEY')
+MODEL_SERVER_TIMEOUT = float(os.getenv('MODEL_SERVER_TIMEOUT', '60'))
+# Per-user runtime directory; the socket and its key file go inside
+DEFAULT_SOCKET = os.path.join(os.getenv('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                              f"dental-agent-{os.getuid()}", 'models.sock')
+BATCH_WINDOW_MS = 10
+MAX_BATCH = 16
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+
+class ModelServerError(Exception):
+    pass
+
+
+def private_dir(path, create=False):
+    """Make sure path is a directory only this user can enter"""
+    if create:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise ModelServerError(f"{path} must be a directory owned by this user with mode 0700")
+    return path
+
+
+def key_path(address):
+    return address + '.key'
+
+
+def create_authkey(address):
+    """The key from MODEL_SERVER_AUTHKEY, or a new random one written to a 0600 key file"""
+    if MODEL_SERVER_AUTHKEY:
+        return MODEL_SERVER_AUTHKEY.encode()
+    authkey = secrets.token_hex(32).encode()
+    path = key_path(address)
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        os.write(fd, authkey)
+    finally:
+        os.close(fd)
+    return authkey
+
+
+def load_authkey(address):
+    """The key a client presents: MODEL_SERVER_AUTHKEY, else the server's key file"""
+    if MODEL_SERVER_AUTHKEY:
+        return MODEL_SERVER_AUTHKEY.encode()
+    path = key_path(address)
+    try:
+        info = os.lstat(path)
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise ModelServerError(f"{path} must be a file owned by this user with mode 0600")
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise ModelServerError(f"No MODEL_SERVER_AUTHKEY and no key file at {path}; is the model server running?")
+
+
+class LockedConnection:
+    """Server side of one client connection; replies may come from several service threads"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        if self.closed:
+            return False
+        try:
+            with self._lock:
+                self.conn.send(message)
+            return True
+        except (OSError, EOFError):
+            self.closed = True
+            return False
+
+
+class Request:
+    def __init__(self, connection, req_id, payload):
+        self.connection = connection
+        self.req_id = req_id
+        self.payload = payload
+
+    def chunk(self, data):
+        return self.connection.send((self.req_id, 'chunk', data))
+
+    def done(self, data=None):
+        return self.connection.send((self.req_id, 'done', data))
+
+    def error(self, message):
+        return self.connection.send((self.req_id, 'error', message))
+
+
+class Batcher:
+    """Collects requests for up to window seconds (or max_batch) and runs them together"""
+    def __init__(self, name, run_batch, window=BATCH_WINDOW_MS / 1000, max_batch=MAX_BATCH):
+        self.name = name
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        threading.Thread(target=self._loop, name=f"batch-{name}", daemon=True).start()
+
+    def submit(self, request):
+        self.queue.put(request)
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            start = time.perf_counter()
+            try:
+                results = self.run_batch([request.payload for request in batch])
+                for request, result in zip(batch, results):
+                    request.done(result)
+            except Exception as e:
+                print(f"Error in {self.name} batch: {str(e)}")
+                for request in batch:
+                    request.error(str(e))
+            record(f"model_server_{self.name}", time.perf_counter() - start, batch_size=len(batch))
+            increment('model_server_batches', service=self.name)
+            increment('model_server_requests', len(batch), service=self.name)
+
+
+class StreamScheduler:
+    """Round-robins one chunk at a time across every open stream, admitting new requests between chunks"""
+    def __init__(self, name, open_stream):
+        self.name = name
+        self.open_stream = open_stream
+        self.queue = queue.Queue()
+        threading.Thread(target=self._loop, name=f"stream-{name}", daemon=True).start()
+
+    def submit(self, request):
+        self.queue.put(request)
+
+    def _loop(self):
+        active = deque()
+        while True:
+            block = not active
+            try:
+                while True:
+                    request = self.queue.get(block=block)
+                    block = False
+                    active.append((request, iter(self.open_stream(request.payload)), time.perf_counter()))
+                    increment('model_server_requests', service=self.name)
+            except queue.Empty:
+                pass
+
+            request, stream, started = active.popleft()
+            try:
+                chunk = next(stream)
+            except StopIteration:
+                record(f"model_server_{self.name}", time.perf_counter() - started, concurrent=len(active) + 1)
+                request.done(None)
+                continue
+            except Exception as e:
+                print(f"Error in {self.name} stream: {str(e)}")
+                request.error(str(e))
+                continue
+            if request.chunk(chunk):
+                active.append((request, stream, started))
+
+
+def stt_service(backend=None, size=None, window=BATCH_WINDOW_MS / 1000, max_batch=MAX_BATCH):
+    backend, size = resolve_stt_config(backend, size)
+    get_stt_model(backend, size)
+    return Batcher('stt', lambda audios: transcribe_batch(audios, backend, size), window, max_batch)
+
+
+def embed_service(window=BATCH_WINDOW_MS / 1000, max_batch=MAX_BATCH * 4):
+    from utils import load_instructor_embeddings
+    embeddings = load_instructor_embeddings()
+
+    def run(payloads):
+        # Queries and documents only differ in their instruction, so one encode covers both
+        pairs = [[embeddings.query_instruction if kind == 'query' else embeddings.embed_instruction, text]
+                 for kind, text in payloads]
+        vectors = embeddings.client.encode(pairs, **embeddings.encode_kwargs)
+        return [vector.tolist() for vector in vectors]
+    return Batcher('embed', run, window, max_batch)
+
+
+def tts_service(backend=None):
+    from tts import TTS_MODELS, DEFAULT_TTS_BACKEND, CoquiBackend
+    backend = backend or os.getenv('TTS_BACKEND', DEFAULT_TTS_BACKEND)
+    tts = CoquiBackend(backend, TTS_MODELS[backend])
+    scheduler = StreamScheduler('tts', lambda text: tts.tts_stream(text))
+    scheduler.info = {'tts_name': tts.name, 'tts_sample_rate': tts.sample_rate}
+    return scheduler
+
+
+class ModelServer:
+    def __init__(self, address, services, authkey=None):
+        self.address = address
+        self.services = services
+        private_dir(os.path.dirname(os.path.abspath(address)), create=True)
+        self.authkey = authkey or create_authkey(address)
+        self.info = {'services': sorted(services)}
+        for service in services.values():
+            self.info.update(getattr(service, 'info', {}))
+
+    def _serve_connection(self, conn):
+        connection = LockedConnection(conn)
+        try:
+            while True:
+                req_id, service, payload = conn.recv()
+                if service == 'info':
+                    connection.send((req_id, 'done', dict(self.info, memory=memory_report())))
+                elif service in self.services:
+                    self.services[service].submit(Request(connection, req_id, payload))
+                else:
+                    connection.send((req_id, 'error', f"Unknown service '{service}'"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.closed = True
+            conn.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # Bind with a umask that leaves the socket 0600 from the start
+        umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        os.chmod(self.address, 0o600)
+        with listener:
+            print(f"Model server on {self.address}: {', '.join(self.info['services'])}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    print(f"Error accepting model server client: {str(e)}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+class ModelClient:
+    """Connection to the model server; safe to share between threads of one process"""
+    def __init__(self, address=None, authkey=None, timeout=MODEL_SERVER_TIMEOUT):
+        address = address or MODEL_SERVER_SOCKET or DEFAULT_SOCKET
+        # Replies are unpickled too; only trust a socket in a directory nobody else can write
+        private_dir(os.path.dirname(os.path.abspath(address)))
+        self.conn = Client(address, family='AF_UNIX', authkey=authkey or load_authkey(address))
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._info = None
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        try:
+            while True:
+                req_id, kind, data = self.conn.recv()
+                replies = self._pending.get(req_id)
+                if replies is not None:
+                    replies.put((kind, data))
+        except (EOFError, OSError):
+            for replies in list(self._pending.values()):
+                replies.put(('error', 'Model server connection closed'))
+
+    def stream(self, service, payload):
+        """Send a request now and return an iterator over its response chunks"""
+        replies = queue.Queue()
+        with self._lock:
+            req_id = next(self._ids)
+            self._pending[req_id] = replies
+            self.conn.send((req_id, service, payload))
+        return self._replies(service, req_id, replies)
+
+    def _replies(self, service, req_id, replies):
+        try:
+            while True:
+                try:
+                    kind, data = replies.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise ModelServerError(f"No reply from model server for {service}")
+                if kind == 'chunk':
+                    yield data
+                elif kind == 'done':
+                    if data is not None:
+                        yield data
+                    return
+                else:
+                    raise ModelServerError(data)
+        finally:
+            self._pending.pop(req_id, None)
+
+    def call(self, service, payload=None):
+        result = None
+        for result in self.stream(service, payload):
+            pass
+        return result
+
+    def info(self):
+        if self._info is None:
+            self._info = self.call('info')
+        return self._info
+
+    def transcribe(self, audio):
+        return self.call('stt', np.ascontiguousarray(audio, dtype=np.float32))
+
+    def embed_query(self, text):
+        return self.call('embed', ('query', text))
+
+    def embed_documents(self, texts):
+        # Submit every text before waiting so they land in the same batches
+        streams = [self.stream('embed', ('document', text)) for text in texts]
+        return [next(stream) for stream in streams]
+
+    def tts_stream(self, text):
+        return self.stream('tts', text)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_enabled():
+    return bool(MODEL_SERVER_SOCKET)
+
+
+def get_client():
+    """Per-process client; forked workers open their own connection"""
+    pid = os.getpid()
+    with _clients_lock:
+        client = _clients.get(pid)
+        if client is None:
+            client = ModelClient()
+            _clients[pid] = client
+        return client
+
+
+class RemoteEmbeddings(Embeddings):
+    """LangChain embeddings backed by the model server"""
+    def embed_documents(self, texts):
+        return get_client().embed_documents(list(texts))
+
+    def embed_query(self, text):
+        return get_client().embed_query(text)
+
+
+def remote_tts_backend():
+    """A TTSBackend whose synthesis runs on the model server"""
+    from tts import TTSBackend
+
+    class RemoteTTSBackend(TTSBackend):
+        def __init__(self):
+            info = get_client().info()
+            self.name = info['tts_name']
+            self.sample_rate = info['tts_sample_rate']
+
+        def tts_stream(self, text):
+            return get_client().tts_stream(text)
+
+        def pcm(self, text):
+            chunks = list(self.tts_stream(text))
+            return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+
+        def tts(self, text):
+            return self.pcm(text).astype(np.float32) / 32768.0
+
+    return RemoteTTSBackend()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', default=MODEL_SERVER_SOCKET or DEFAULT_SOCKET)
+    parser.add_argument('--services', default='stt,embed,tts')
+    parser.add_argument('--window-ms', type=float, default=BATCH_WINDOW_MS, help='batching window')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--stt-backend', default=None)
+    parser.add_argument('--tts-backend', default=None)
+    args = parser.parse_args(argv)
+
+    window = args.window_ms / 1000
+    builders = {
+        'stt': lambda: stt_service(args.stt_backend, window=window, max_batch=args.max_batch),
+        'embed': lambda: embed_service(window=window, max_batch=args.max_batch * 4),
+        'tts': lambda: tts_service(args.tts_backend)
+    }
+    services = {}
+    for name in [name.strip() for name in args.services.split(',') if name.strip()]:
+        if name not in builders:
+            parser.error(f"unknown service '{name}'")
+        services[name] = builders[name]()
+
+    report = memory_report()
+    print(f"Models loaded, RSS {report['process_rss_bytes'] / 1e6:.0f} MB")
+    server = ModelServer(args.socket, services)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for path in (args.socket, key_path(args.socket)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
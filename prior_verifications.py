@@ -0,0 +1,93 @@
+import os
+import time
+from results_store import get_store
+from schema import SPEC_BY_FIELD
+
+# Member-level reuse of earlier verifications. Each field stays fresh for its
+# own number of days; values that move with every claim (remaining maximum,
+# deductible met) only for the day they were taken, so a member verified twice
+# in one day is not called again.
+PRIOR_VERIFICATION = os.getenv('PRIOR_VERIFICATION', '1') == '1'
+DAY = 86400
+
+FIELD_TTL_DAYS = {
+    'eligibility': {
+        'status': 7,
+        'effective_date': 180,
+        'plan_type': 90
+    },
+    'benefits': {
+        'annual_maximum': 90,
+        'remaining_maximum': 1,
+        'deductible': 90,
+        'deductible_met': 1,
+        'benefit_period': 180
+    },
+    'coverage': {
+        'preventive': 90,
+        'basic': 90,
+        'major': 90,
+        'periodontics': 90,
+        'endodontics': 90
+    },
+    'limitations': {
+        'waiting_period': 90,
+        'frequency': 90,
+        'missing_tooth': 180,
+        'pre_authorization': 90
+    }
+}
+
+
+def _reusable(value):
+    return value is not None and not (isinstance(value, dict) and 'Original Response' in value)
+
+
+def fresh_fields(patient, store=None, now=None):
+    """Still-fresh values from earlier verifications of this member with the same payer.
+
+    Each field comes from the newest row that actually asked it; values a row
+    only carried forward do not renew their age. Only live calls count, never
+    the scripted answers of a campaign.
+    """
+    store = store or get_store()
+    now = now or time.time()
+    oldest = now - max(ttl for fields in FIELD_TTL_DAYS.values() for ttl in fields.values()) * DAY
+    rows = store.query(member_number=patient['member_number'], since=oldest, source='live')
+
+    fresh = {}
+    for row in rows:
+        if patient.get('insurance_provider') and row['payer'] != patient['insurance_provider']:
+            continue
+        prefilled = set(row.get('prefilled') or ())
+        age = now - row['created_ts']
+        for category, fields in (row['collected'] or {}).items():
+            for field, value in fields.items():
+                ttl = FIELD_TTL_DAYS.get(category, {}).get(field, 0) * DAY
+                if (f"{category}.{field}" in prefilled or age > ttl or not _reusable(value)
+                        or field in fresh.get(category, {})):
+                    continue
+                fresh.setdefault(category, {})[field] = value
+    return fresh
+
+
+def apply_prior_verification(verification, patient, store=None, now=None):
+    """Prefill fresh fields; returns True when nothing is left to ask"""
+    try:
+        fresh = fresh_fields(patient, store, now)
+    except Exception as e:
+        print(f"Error loading prior verifications: {str(e)}")
+        return False
+
+    record = verification.record
+    for category, fields in fresh.items():
+        for field, value in fields.items():
+            spec = SPEC_BY_FIELD.get((category, field))
+            if spec is not None and record.get(spec) is None:
+                record.set(spec, value)
+                verification.prefilled.add(spec.key)
+
+    remaining = record.remaining
+    if verification.prefilled:
+        print(f"Reused {len(verification.prefilled)} fresh fields from prior verifications, {remaining} left to ask")
+    return remaining == 0
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+
+from model_registry import memory_report
+from tracing import tracer
+
+# Opt-in per-session profiling. Only a sampled fraction of sessions pay for
+# tracemalloc and the CPU sampler; everyone else gets no hooks at all.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+CPU_SAMPLE_INTERVAL = float(os.getenv('PROFILE_CPU_INTERVAL', '0.01'))
+TRACEMALLOC_FRAMES = 1
+TOP_N = 15
+
+
+def faiss_bytes(faiss_index):
+    index = getattr(faiss_index, 'index', None)
+    if index is None:
+        return None
+    return int(index.ntotal) * int(index.d) * 4
+
+
+def chat_history_bytes(chat):
+    history = getattr(chat, 'history', None) or []
+    total = 0
+    for message in history:
+        for part in getattr(message, 'parts', None) or []:
+            total += len(getattr(part, 'text', '') or '')
+    return total
+
+
+def clip_bank_bytes(clip_bank):
+    return (sum(clip.nbytes for clip in clip_bank.clips.values()) +
+            sum(clip.nbytes for clip in clip_bank.carriers.values()))
+
+
+class SessionProfiler:
+    def __init__(self, session_id, report_dir=PROFILE_DIR, cpu_interval=CPU_SAMPLE_INTERVAL):
+        self.session_id = session_id
+        self.report_dir = os.path.join(report_dir, session_id)
+        self.cpu_interval = cpu_interval
+        self.thread_id = threading.get_ident()
+        self.tracked = {}
+        self.turn = 0
+        self._stage_stack = []
+        self._stage_start = {}
+        self._stages = defaultdict(lambda: {'calls': 0, 'wall_ms': 0.0, 'alloc_bytes': 0, 'peak_bytes': 0})
+        self._cpu_stages = Counter()
+        self._cpu_functions = Counter()
+        self._last_snapshot = None
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started_tracemalloc = False
+
+    def track(self, name, obj, estimator):
+        """Report estimator(obj) bytes under name in every turn report"""
+        self.tracked[name] = (obj, estimator)
+
+    def start(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._last_snapshot = self._snapshot()
+        tracer.add_hook(self._on_span)
+        self._sampler = threading.Thread(target=self._sample_cpu, daemon=True)
+        self._sampler.start()
+        print(f"Profiling session {self.session_id} into {self.report_dir}")
+        return self
+
+    def stop(self):
+        tracer.remove_hook(self._on_span)
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join(timeout=1)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def _on_span(self, event, stage, context):
+        if threading.get_ident() != self.thread_id:
+            return
+        if event == 'start':
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            self._stage_stack.append(stage)
+            self._stage_start[len(self._stage_stack)] = (time.perf_counter(), current)
+        elif self._stage_stack:
+            started, allocated_before = self._stage_start.pop(len(self._stage_stack))
+            self._stage_stack.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            stats = self._stages[stage]
+            stats['calls'] += 1
+            stats['wall_ms'] += (time.perf_counter() - started) * 1000
+            stats['alloc_bytes'] += current - allocated_before
+            stats['peak_bytes'] = max(stats['peak_bytes'], peak - allocated_before)
+
+    def _sample_cpu(self):
+        """Statistical CPU profile of the conversation thread, attributed to stages"""
+        while not self._stop.wait(self.cpu_interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stage = self._stage_stack[-1] if self._stage_stack else 'idle'
+            self._cpu_stages[stage] += 1
+            code = frame.f_code
+            self._cpu_functions[f"{os.path.basename(code.co_filename)}:{code.co_name}"] += 1
+
+    def model_memory(self):
+        models = {name: stats.get('weight_bytes') for name, stats in memory_report()['models'].items()}
+        for name, (obj, estimator) in self.tracked.items():
+            try:
+                models[name] = estimator(obj)
+            except Exception as e:
+                models[name] = f"error: {str(e)}"
+        return models
+
+    def end_turn(self):
+        """Write a diffable report for the turn just finished and reset counters"""
+        self.turn += 1
+        snapshot = self._snapshot()
+        growth = snapshot.compare_to(self._last_snapshot, 'lineno')[:TOP_N]
+        self._last_snapshot = snapshot
+
+        report = {
+            'session_id': self.session_id,
+            'turn': self.turn,
+            'process_rss_bytes': memory_report()['process_rss_bytes'],
+            'traced_bytes': tracemalloc.get_traced_memory()[0],
+            'models': self.model_memory(),
+            'stages': {stage: {k: round(v, 3) for k, v in stats.items()} for stage, stats in self._stages.items()},
+            'cpu_samples_by_stage': dict(self._cpu_stages),
+            'cpu_top_functions': dict(self._cpu_functions.most_common(TOP_N)),
+            'allocation_growth': [
+                {'where': str(stat.traceback), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+                for stat in growth
+            ]
+        }
+        path = os.path.join(self.report_dir, f"turn_{self.turn:04d}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True, default=str)
+
+        self._stages.clear()
+        self._cpu_stages.clear()
+        self._cpu_functions.clear()
+        return path
+
+
+def maybe_start_profiler(session_id, sample_rate=None):
+    """Start a profiler for this session if it falls in the sampled fraction"""
+    sample_rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    return SessionProfiler(session_id).start()
@@ -0,0 +1,241 @@
+import re
+from datetime import datetime
+from itertools import groupby
+
+# Prompt templates for the LLM extractors, compiled once at import. Each
+# prompt is a static part (task, answer format, few-shot examples) followed
+# by the call's question and response. The static part is stripped of the
+# source indentation and is byte-identical on every call, so it forms a
+# shared prefix that providers with prompt caching can reuse; only the
+# date template depends on anything, the current year, and it is rendered
+# once per year. Input-token counts are checked against per-template
+# budgets by tests/test_prompts.py, or by hand with:
+#   python prompts.py
+TOKEN_ENCODING = 'cl100k_base'
+SAMPLE_RESPONSE = ("Let me check that for you. Okay, so I'm showing the patient has an active PPO plan, "
+                   "the deductible is fifty dollars and preventive is covered at one hundred percent.")
+
+
+class Prompt(str):
+    """Prompt text that remembers its template name, which cassettes key recordings by"""
+    def __new__(cls, text, template):
+        prompt = super().__new__(cls, text)
+        prompt.template = template
+        return prompt
+
+
+def compact(text):
+    """Drop indentation and blank lines from a triple-quoted block"""
+    return '\n'.join(line.strip() for line in text.strip().splitlines() if line.strip())
+
+
+class PromptTemplate:
+    def __init__(self, name, instructions, examples=(), closing=''):
+        """examples are (question, answer, output) triples; {year}, {last_year} and
+        {next_year} in the instructions or examples make the template dated"""
+        self.name = name
+        parts = [compact(instructions)]
+        if examples:
+            # Examples sharing a question are grouped under it, so each question is sent once
+            parts.append('Examples:')
+            for question, group in groupby(examples, key=lambda example: example[0]):
+                parts.append(f'Q: "{question}"')
+                parts.extend(f'A: "{answer}" -> {output}' for _, answer, output in group)
+        self.static = '\n'.join(parts)
+        self.closing = compact(closing)
+        self.dated = '{year}' in self.static
+        self._prefixes = {}
+
+    def prefix(self, year=None):
+        """The static part of the prompt; dated templates are rendered once per year"""
+        if not self.dated:
+            return self.static
+        year = year or datetime.now().year
+        prefix = self._prefixes.get(year)
+        if prefix is None:
+            prefix = self.static.format(year=year, last_year=year - 1, next_year=year + 1)
+            self._prefixes[year] = prefix
+        return prefix
+
+    def render(self, question, response, year=None):
+        text = f'{self.prefix(year)}\nQuestion: "{question}"\nResponse: "{response}"'
+        if self.closing:
+            text += '\n' + self.closing
+        return Prompt(text, self.name)
+
+
+STATUS = PromptTemplate('extract_status', """
+    Given this question and response, determine the insurance status.
+    Return only 'Active' if the patient is eligible/active/covered, 'Inactive' if not eligible/inactive/not covered, or 'None' if unclear.
+    """, [
+    ("What is the patient's current eligibility status?",
+     "The patient is currently active and eligible for benefits.", '"Active"'),
+    ("What is the patient's current eligibility status?", "The patient's coverage is active and verified.", '"Active"'),
+    ("What is the patient's current eligibility status?",
+     "Yes, the patient is eligible and the coverage is in force.", '"Active"'),
+    ("What is the patient's current eligibility status?", "The patient's coverage was terminated last month.",
+     '"Inactive"')
+])
+
+DATE = PromptTemplate('extract_date', """
+    Given this question and response, extract the date and convert it to MM/DD/YYYY format.
+    If the response refers to 'calendar year' or 'year end', use the current year ({year}) to determine the date.
+    """, [
+    ("What is their effective date of coverage?", "The coverage effective date is January 1st, {year}.",
+     '"01/01/{year}"'),
+    ("What is their effective date of coverage?", "Their coverage began on March 15th, {year}.", '"03/15/{year}"'),
+    ("What is their effective date of coverage?", "The effective date shows as September 1st, {last_year}.",
+     '"09/01/{last_year}"'),
+    ("What is their effective date of coverage?", "Coverage has been effective since July 1st, {year}.",
+     '"07/01/{year}"'),
+    ("What is their effective date of coverage?", "Coverage has been effective since the start of the year.",
+     '"01/01/{year}"'),
+    ("What is their benefit period?", "The benefit period is calendar year, January through December.",
+     '"12/31/{year}"'),
+    ("What is their benefit period?", "Benefits run on a fiscal year, July through June.", '"06/30/{next_year}"'),
+    ("When did the patient's treatment start?", "The treatment started on May 5th, {year}.", '"05/05/{year}"'),
+    ("What was the date of service?", "The date of service was August 20th, {year}.", '"08/20/{year}"')
+])
+
+AMOUNT = PromptTemplate('extract_amount', """
+    Given this question and response, extract the dollar amount.
+    Return only the number (no $ or commas) or 'None' if no amount found.
+    """, [
+    ("What is the deductible amount?", "fifty dollars", '"50"'),
+    ("What is their annual maximum benefit?", "1k", '"1000"'),
+    ("How much deductible has been met?", "They haven't met any of the deductible yet.", '"0"')
+])
+
+PERCENTAGE = PromptTemplate('extract_percentage', """
+    Given this question and response, extract the percentage and return only the number (no % symbol) or 'None' if no percentage is found.
+    Interpret phrases like 'half coverage' as 50% and 'full coverage' as 100%.
+    """, [
+    ("What is the coverage percentage for preventive services?", "Preventive services are covered at 100%.", '"100"'),
+    ("What is the coverage percentage for preventive services?", "Preventive services have full coverage.", '"100"'),
+    ("What about basic services?", "Basic services are covered at 80%.", '"80"'),
+    ("What about basic services?", "Basic services have half coverage.", '"50"'),
+    ("What is the coverage for major services?", "Major services are covered at 50%.", '"50"'),
+    ("What's the coverage for periodontal services?", "Periodontal services are covered at 80%.", '"80"')
+])
+
+PLAN_TYPE = PromptTemplate('extract_plan_type', """
+    Given this question and response, extract the insurance plan type.
+    Common types include: PPO, HMO, DHMO, Indemnity, etc.
+    Return only the plan type or 'None' if unclear. No other text.
+    """, [
+    ("What type of plan do they have?", "This is a PPO plan.", '"PPO"'),
+    ("What type of plan do they have?", "They have a DHMO plan.", '"DHMO"'),
+    ("What type of plan do they have?", "It's an indemnity plan.", '"Indemnity"'),
+    ("What type of plan do they have?", "The patient has a PPO Plus plan.", '"PPO Plus"')
+])
+
+GROUP_NUMBER = PromptTemplate('extract_group_number', """
+    Given this question and response, extract the insurance group number.
+    The group number might be labeled as 'Group #', 'Group Number', or similar.
+    Return only the group number or 'None' if not found. No other text.
+    """, [
+    ("Could you verify their group number?", "The group number is 123456.", '"123456"'),
+    ("Could you verify their group number?", "I'm showing group number 789012.", '"789012"'),
+    ("Could you verify their group number?", "Yes, the group number is 345678.", '"345678"'),
+    ("Could you verify their group number?", "The verified group number is 901234.", '"901234"')
+])
+
+PERIOD = PromptTemplate('extract_period', """
+    Given this question and response, extract the time period.
+    Common formats include: 'Calendar Year', 'Contract Year', '6 months', '12 months', etc.
+    Return only the period or 'None' if not found. No other text.
+    """, [
+    ("What is their benefit period?", "The benefit period is calendar year, January through December.",
+     '"Calendar Year"'),
+    ("What is their benefit period?", "Benefits run on a fiscal year, July through June.", '"Fiscal Year"'),
+    ("What is their benefit period?", "It's a calendar year benefit period.", '"Calendar Year"'),
+    ("What is their benefit period?", "The benefit period follows the calendar year.", '"Calendar Year"')
+])
+
+FREQUENCY = PromptTemplate('extract_frequency', """
+    Given this question and response, extract the frequency limitation for each type of service mentioned.
+    Common formats include: 'Once every 6 months', '2 per year', 'Annual', etc.
+    Return a dictionary with the type of service as the key and the frequency as the value. If unable to extract, return the original response as the value.
+    """, [
+    ("What are the frequency limitations?", "Cleanings are covered twice per calendar year.",
+     '{"Cleanings": "twice per calendar year"}'),
+    ("What are the frequency limitations?", "Exams and cleanings twice per year, x-rays once every 3 years.",
+     '{"Exams": "twice per year", "Cleanings": "twice per year", "X-rays": "once every 3 years"}'),
+    ("What are the frequency limitations?", "Two cleanings per year with 6 months separation required.",
+     '{"Cleanings": "twice per year, 6 months separation"}'),
+    ("What are the frequency limitations?",
+     "Comprehensive exams once every 3 years, routine exams twice per year.",
+     '{"Comprehensive exams": "once every 3 years", "Routine exams": "twice per year"}')
+])
+
+BOOLEAN = PromptTemplate('extract_boolean', """
+    Given this question and response, analyze the text to determine if it indicates a positive (yes) or negative (no) response.
+    Positive indicators: yes, sure, affirmative, absolutely, of course, definitely, indeed, active, eligible, covered, required, approved, confirmed, consent, positive, agree, proceed, what do you want, what would you like (to do/verify), what can I help you with
+    Negative indicators: no, not, never, inactive, ineligible, not covered, not required, denied, rejected, negative, disagree
+    Questions asking for the next action, such as 'Sure, what would you like to verify?', are positive (yes) responses.
+    """, closing="""
+    Return only one of the following: 'True' for positive, 'False' for negative, or 'None' if unclear. No other text.
+    """)
+
+TEMPLATES = {template.name: template
+             for template in (STATUS, DATE, AMOUNT, PERCENTAGE, PLAN_TYPE, GROUP_NUMBER, PERIOD, FREQUENCY, BOOLEAN)}
+
+# Input tokens for a full prompt with the longest schema question and SAMPLE_RESPONSE,
+# as counted by estimate_tokens. The budgets are calibrated for that counter, not
+# for tiktoken, so the check gives the same answer wherever it runs.
+TOKEN_BUDGETS = {
+    'extract_status': 215,
+    'extract_date': 390,
+    'extract_amount': 180,
+    'extract_percentage': 280,
+    'extract_plan_type': 195,
+    'extract_group_number': 205,
+    'extract_period': 220,
+    'extract_frequency': 320,
+    'extract_boolean': 245
+}
+
+
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKEN_ENCODING).encode
+    except Exception:
+        return None
+
+
+def estimate_tokens(text):
+    """Token estimate: words, punctuation, line breaks and runs of indentation"""
+    return len(re.findall(r"\w+|[^\w\s]|\n|[ \t]{2,}", text))
+
+
+def count_tokens(text, encode=None):
+    """BPE token count with the given tiktoken encode, else estimate_tokens"""
+    if encode is not None:
+        return len(encode(text))
+    return estimate_tokens(text)
+
+
+def check_budgets(budgets=TOKEN_BUDGETS):
+    """estimate_tokens of every template against its budget; returns the templates over budget.
+    The tiktoken count is shown alongside when tiktoken can load"""
+    from schema import SPECS
+    question = max((spec.question for spec in SPECS), key=len)
+    encode = _encoder()
+    over = []
+    for name, template in TEMPLATES.items():
+        prefix = estimate_tokens(template.prefix())
+        text = template.render(question, SAMPLE_RESPONSE)
+        total = estimate_tokens(text)
+        bpe = f"{count_tokens(text, encode):>8} {TOKEN_ENCODING}" if encode else ''
+        budget = budgets.get(name)
+        status = 'ok' if budget is None or total <= budget else 'OVER'
+        print(f"{name:<22}{prefix:>8} prefix{total:>8} total{budget or '-':>8} budget  {status}{bpe}")
+        if status == 'OVER':
+            over.append(name)
+    return over
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(1 if check_budgets() else 0)
@@ -0,0 +1,362 @@
+"""Offline replay of insurance rep audio through the full agent pipeline.
+
+Rep turns come from recorded files or are synthesized from the sample_answers
+in insurance_qa_sample.json. They run through STT -> validation -> flow -> TTS
+without a microphone or speaker, as fast as the machine allows, and the
+harness reports per-turn and per-call latency distributions.
+
+    python main.py replay --calls 5 --llm local
+    python main.py replay --audio test.m4a test_output.wav --llm local
+    python main.py replay --mode text --llm local --llm-latency 0.4 --llm-jitter 0.2
+    python main.py replay --mode text --llm gemini --cassette calls.jsonl.gz --cassette-mode record
+    python main.py replay --mode text --cassette calls.jsonl.gz --cassette-timing
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+from flow import ConversationFlowManager, reset_patient_info_state
+from llm import start_deadline, wrap_chat, initialize_llm
+from cassette import get_cassette, close_cassettes
+from local_llm import LocalChat
+from main import build_greeting, resolve_input, generate_response
+from stt import transcribe_audio
+from tracing import tracer, percentile, start_session, start_turn, end_turn, set_field
+from utils import fake_patient, format_speech_output, get_verification_summary
+from verification import InsuranceVerification
+from prior_verifications import apply_prior_verification
+from session_log import open_session_log, flow_state
+from session_pool import SessionPool, SESSION_POOL_SIZE
+from speculation import Speculation
+
+SAMPLE_FILE = 'insurance_qa_sample.json'
+OFFICE_NAME = "Everest Dental Clinic"
+STAGES = ('stt_s', 'understand_s', 'tts_s', 'turn_s')
+REP_CHARS_PER_SECOND = 15
+
+PATIENT_PHASE_LINES = {
+    'dob': "Can I have the patient's date of birth?",
+    'member_id': "And what is the member ID?",
+    'help': "Thank you. How can I help you today?",
+    'consent': "Sure, go ahead."
+}
+
+
+def load_samples(path=SAMPLE_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def call_state(flow_manager):
+    """Where a call stands, as plain data: phase, verify_patient's state and the open field"""
+    return dict(flow_state(flow_manager), field=flow_manager.get_current_field())
+
+
+class ScriptedRep:
+    """Plays the insurance rep, answering each question from the sample answers"""
+    def __init__(self, samples, seed=None):
+        self.samples = samples
+        self.random = random.Random(seed)
+
+    def next_line(self, flow_manager):
+        return self.line_for(call_state(flow_manager))
+
+    def line_for(self, state):
+        """The rep's next line for a call_state() snapshot, which may come from another process"""
+        if state['is_patient_info_phase']:
+            provided = state['provided']
+            if 'dob' not in provided:
+                return PATIENT_PHASE_LINES['dob']
+            if 'member_id' not in provided:
+                return PATIENT_PHASE_LINES['member_id']
+            if not state['verification_asked']:
+                return PATIENT_PHASE_LINES['help']
+            return PATIENT_PHASE_LINES['consent']
+
+        category = state['current_category']
+        field = state['field']
+        answers = self.samples.get(category, {}).get(field, {}).get('sample_answers')
+        if not answers:
+            return "I'm not sure, let me check."
+        return self.random.choice(answers)
+
+
+def load_audio_file(path):
+    """Decode a recording (any ffmpeg format) into 16 kHz int16 AudioData"""
+    import whisper
+    audio = whisper.load_audio(path)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    return sr.AudioData(pcm.tobytes(), 16000, 2)
+
+
+class ReplayPipeline:
+    def __init__(self, args):
+        self.args = args
+        self.clip_bank = None
+        self.rep_tts = None
+        self.faiss_index, self.correction_df = None, None
+        self.cassette = None
+        self.prior_store = None
+        if getattr(args, 'prior_store', None):
+            from results_store import get_store
+            self.prior_store = get_store(args.prior_store)
+        if args.cassette:
+            self.cassette = get_cassette(args.cassette, args.cassette_mode, args.cassette_timing)
+
+        if not args.no_tts or args.mode == 'synth':
+            from tts import initialize_tts
+            from clip_bank import ClipBank
+            tts = initialize_tts(args.tts_backend)
+            self.rep_tts = tts
+            if not args.no_tts:
+                self.clip_bank = ClipBank(tts)
+                self.clip_bank.prerender()
+        if args.mode != 'text':
+            from stt import preload_stt_model
+            preload_stt_model()
+        if not args.no_correction:
+            from utils import initialize_correction_system
+            self.faiss_index, self.correction_df = initialize_correction_system()
+        # Coqui models and the clip bank caches are not thread-safe
+        self.tts_lock = threading.Lock()
+        self.pool = None
+        if args.session_pool > 0:
+            # A server keeps a session per concurrent call once they have been built
+            self.pool = SessionPool(OFFICE_NAME, args.session_pool, self.new_chat, self.clip_bank,
+                                    capacity=getattr(args, 'max_calls', None), render_lock=self.tts_lock)
+
+    def new_chat(self, call_index):
+        if self.cassette is not None and self.cassette.mode == 'replay':
+            return wrap_chat(None, cassette=self.cassette)
+        if self.args.llm == 'local':
+            latency, jitter = self.args.llm_latency, self.args.llm_jitter
+            hedge = LocalChat(latency, jitter, seed=-1 - call_index)
+            return wrap_chat(LocalChat(latency, jitter, seed=call_index), hedge.send_message, self.cassette)
+        return initialize_llm(cassette=self.cassette)
+
+    def rep_audio(self, line):
+        pcm = self.rep_tts.pcm(line)
+        return sr.AudioData(pcm.tobytes(), self.rep_tts.sample_rate, 2), len(pcm) / self.rep_tts.sample_rate
+
+    def speculate(self, line, verification, flow_manager):
+        """Play a text line as a streaming transcript would: word-by-word partials, in speaking time"""
+        speculation = Speculation(verification, flow_manager)
+        line = line.strip()
+        cuts = [match.start() for match in re.finditer(r'\s+', line)]
+        spoken = 0
+        for cut in cuts:
+            time.sleep((cut - spoken) / REP_CHARS_PER_SECOND)
+            spoken = cut
+            speculation.observe(line[:cut])
+        time.sleep((len(line) - spoken) / REP_CHARS_PER_SECOND)
+        return speculation
+
+    def synthesize(self, text):
+        if self.clip_bank is None:
+            return 0.0
+        pcm = self.clip_bank.synthesize(text)
+        return len(pcm) / self.clip_bank.sample_rate
+
+    def run_call(self, call_index, rep, audio_files=None, patient=None):
+        patient = patient or fake_patient()
+        session = None
+        if self.pool is not None:
+            session = self.pool.acquire(patient)
+            verification, flow_manager = session.verification, session.flow_manager
+        else:
+            reset_patient_info_state()
+            verification = InsuranceVerification(OFFICE_NAME, patient, chat=self.new_chat(call_index))
+            flow_manager = ConversationFlowManager(verification, patient)
+        try:
+            return self._run_call(call_index, rep, audio_files, patient, verification, flow_manager, session)
+        finally:
+            if session is not None:
+                self.pool.release(session)
+
+    def _run_call(self, call_index, rep, audio_files, patient, verification, flow_manager, session):
+        session_id = start_session(f"replay-{call_index}")
+        session_log = None
+        if self.args.session_log:
+            session_log, _ = open_session_log(session_id, patient, verification, flow_manager,
+                                              self.args.session_log)
+        if self.prior_store is not None and apply_prior_verification(verification, patient, self.prior_store):
+            # Every field is still fresh: no call is placed
+            summary = get_verification_summary(verification)
+            if session_log:
+                session_log.close('skipped')
+            return {'call': call_index, 'turns': [], 'wall_s': 0.0, 'status': summary['status'],
+                    'missing': summary['missing'], 'collected': summary['collected'],
+                    'prefilled': summary['prefilled'], 'audio_s': 0.0, 'speedup': None, 'skipped': True}
+
+        call_start = time.perf_counter()
+        if session is not None and session.greeting_audio is not None:
+            agent_audio = len(session.greeting_audio) / self.clip_bank.sample_rate
+        else:
+            agent_audio = self.synthesize(format_speech_output(build_greeting(OFFICE_NAME, patient)))
+        rep_audio = 0.0
+        turns = []
+        recordings = iter(audio_files or ())
+
+        for turn_index in range(self.args.max_turns):
+            set_field(flow_manager.current_category, flow_manager.get_current_field())
+            if audio_files:
+                path = next(recordings, None)
+                if path is None:
+                    break
+                audio, line = load_audio_file(path), path
+                audio_seconds = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+            else:
+                line = rep.next_line(flow_manager)
+                audio, audio_seconds = (None, 0.0) if self.args.mode == 'text' else self.rep_audio(line)
+            rep_audio += audio_seconds
+            if self.args.speculate and audio is None:
+                flow_manager.speculation = self.speculate(line, verification, flow_manager)
+
+            # The rep has stopped talking: the turn clock starts now
+            start_turn()
+            start_deadline()
+            t0 = time.perf_counter()
+            text = line if audio is None else transcribe_audio(audio)
+            t1 = time.perf_counter()
+            text, correction_result = resolve_input(
+                text, verification, flow_manager, self.faiss_index, self.correction_df
+            )
+            if correction_result:
+                # Nobody to confirm with offline; take the suggested correction
+                text = correction_result['corrected']
+            response = generate_response(text, verification, flow_manager)
+            t2 = time.perf_counter()
+            response_audio = self.synthesize(response) if response else 0.0
+            t3 = time.perf_counter()
+            end_turn()
+            agent_audio += response_audio
+
+            turns.append({
+                'call': call_index,
+                'turn': turn_index + 1,
+                'heard': text,
+                'response': response,
+                'stt_s': t1 - t0,
+                'understand_s': t2 - t1,
+                'tts_s': t3 - t2,
+                'turn_s': t3 - t0
+            })
+
+            if get_verification_summary(verification)['status'] == 'complete':
+                break
+
+        wall = time.perf_counter() - call_start
+        summary = get_verification_summary(verification)
+        if session_log:
+            # Incomplete calls stay open so the next attempt resumes them
+            session_log.close('complete' if summary['status'] == 'complete' else None)
+        return {
+            'call': call_index,
+            'turns': turns,
+            'wall_s': wall,
+            'status': summary['status'],
+            'missing': summary['missing'],
+            'collected': summary['collected'],
+            'prefilled': summary['prefilled'],
+            'audio_s': rep_audio + agent_audio,
+            'speedup': (rep_audio + agent_audio) / wall if wall else None,
+            'skipped': False
+        }
+
+
+def _distribution(values):
+    return {
+        'p50_ms': round(percentile(values, 50) * 1000, 1),
+        'p95_ms': round(percentile(values, 95) * 1000, 1),
+        'max_ms': round(max(values) * 1000, 1),
+        'mean_ms': round(statistics.mean(values) * 1000, 1)
+    }
+
+
+def summarize(calls):
+    turns = [turn for call in calls for turn in call['turns']]
+    report = {
+        'calls': len(calls),
+        'completed': sum(1 for call in calls if call['status'] == 'complete'),
+        'skipped': sum(1 for call in calls if call.get('skipped')),
+        'turns': len(turns),
+        'per_turn': {stage: _distribution([t[stage] for t in turns]) for stage in STAGES} if turns else {},
+        'per_call_wall': _distribution([call['wall_s'] for call in calls]) if calls else {},
+        'turns_per_call': [len(call['turns']) for call in calls],
+        'speedup_vs_real_time': [round(call['speedup'], 1) for call in calls if call['speedup']]
+    }
+    return report
+
+
+def print_report(report):
+    print(f"\nReplayed {report['calls']} calls, {report['completed']} complete, {report['turns']} turns")
+    print(f"{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'mean ms':>10}")
+    rows = list(report['per_turn'].items()) + [('call wall', report['per_call_wall'])]
+    for stage, dist in rows:
+        if dist:
+            print(f"{stage:<16}{dist['p50_ms']:>10}{dist['p95_ms']:>10}{dist['max_ms']:>10}{dist['mean_ms']:>10}")
+    print(f"Turns per call: {report['turns_per_call']}")
+    print(f"Speed vs real time: {report['speedup_vs_real_time']}")
+
+
+def add_pipeline_arguments(parser):
+    """Options shared by everything that drives calls through ReplayPipeline"""
+    parser.add_argument('--mode', choices=('synth', 'text'), default='synth',
+                        help='synthesize rep audio from sample answers, or feed the text straight in')
+    parser.add_argument('--max-turns', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--llm', choices=('local', 'gemini'), default='local')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds added to every local LLM call')
+    parser.add_argument('--llm-jitter', type=float, default=0.0)
+    parser.add_argument('--cassette', help='LLM record/replay file (.jsonl or .jsonl.gz)')
+    parser.add_argument('--cassette-mode', choices=('record', 'replay'), default='replay')
+    parser.add_argument('--cassette-timing', action='store_true', help='replay with the recorded LLM latency')
+    parser.add_argument('--tts-backend', default=None)
+    parser.add_argument('--no-tts', action='store_true', help='skip synthesizing agent responses')
+    parser.add_argument('--no-correction', action='store_true', help='skip the FAISS correction system')
+    parser.add_argument('--session-pool', type=int, default=SESSION_POOL_SIZE,
+                        help='warm verification sessions kept ready between calls (0 builds one per call)')
+    parser.add_argument('--session-log', help='directory for per-call event logs; unfinished calls are resumed')
+    parser.add_argument('--prior-store', help='results store whose fresh fields are reused for the same member')
+    parser.add_argument('--speculate', action='store_true',
+                        help='text mode: extract from clause-by-clause partials while the rest of the line is spoken')
+    return parser
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='main.py replay', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--audio', nargs='+', help='recorded rep turns, played in order (one call)')
+    parser.add_argument('--calls', type=int, default=1)
+    parser.add_argument('--report', help='write the full per-turn report as JSON')
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    pipeline = ReplayPipeline(args)
+    rep = ScriptedRep(load_samples(), seed=args.seed)
+
+    calls = []
+    for call_index in range(1 if args.audio else args.calls):
+        calls.append(pipeline.run_call(call_index, rep, args.audio))
+
+    close_cassettes()
+
+    report = summarize(calls)
+    print_report(report)
+    tracer.write_snapshot()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'summary': report, 'calls': calls}, f, indent=2, default=str)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""Durable verification results, written in the background.
+
+SQLite in WAL mode by default (many worker processes can write the same
+file; readers never block writers), or an append-only JSONL file when the
+path ends in .jsonl. Rows are indexed by member number, payer and time,
+and tagged with their source: 'live' for real calls, 'campaign' for the
+scripted reps of a campaign run.
+
+    python results_store.py query --member 123456789
+    python results_store.py export results.parquet
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from contextlib import closing
+from datetime import datetime
+
+RESULTS_STORE = os.getenv('RESULTS_STORE', 'verification_results.db')
+BATCH_SIZE = 64
+FLUSH_INTERVAL = 0.5
+_FLUSH = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    member_number TEXT,
+    payer TEXT,
+    patient_name TEXT,
+    status TEXT,
+    created_at TEXT,
+    created_ts REAL,
+    missing TEXT,
+    collected TEXT,
+    prefilled TEXT,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_verifications_member ON verifications (member_number, created_ts);
+CREATE INDEX IF NOT EXISTS idx_verifications_payer ON verifications (payer, created_ts);
+CREATE INDEX IF NOT EXISTS idx_verifications_created ON verifications (created_ts);
+"""
+COLUMNS = ('session_id', 'member_number', 'payer', 'patient_name', 'status', 'created_at', 'created_ts',
+           'missing', 'collected', 'prefilled', 'source')
+JSON_COLUMNS = ('missing', 'collected', 'prefilled')
+
+
+def build_row(summary, patient, session_id=None, source='live'):
+    """Flatten a get_verification_summary() result and its patient into a store row"""
+    now = time.time()
+    return {
+        'session_id': session_id,
+        'member_number': str(patient.get('member_number', '')),
+        'payer': patient.get('insurance_provider', ''),
+        'patient_name': f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip(),
+        'status': summary['status'],
+        'created_at': datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+        'created_ts': now,
+        'missing': summary['missing'],
+        'collected': summary['collected'],
+        'prefilled': summary.get('prefilled', []),
+        'source': source
+    }
+
+
+def row_source(row):
+    """The row's source; rows written before sources were recorded count as campaign rows
+    when their session id says so"""
+    source = row.get('source')
+    if source:
+        return source
+    return 'campaign' if str(row.get('session_id') or '').startswith('campaign-') else 'live'
+
+
+class _BackgroundWriter:
+    """Queues rows and writes them in batches on a daemon thread"""
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='results-writer', daemon=True)
+        self._thread.start()
+
+    def save(self, summary, patient, session_id=None, source='live'):
+        """Queue a result; returns immediately"""
+        self.queue.put(build_row(summary, patient, session_id, source))
+
+    def flush(self):
+        """Block until everything queued so far is written"""
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _loop(self):
+        while True:
+            row = self.queue.get()
+            if row is None:
+                self.queue.task_done()
+                return
+            if row is _FLUSH:
+                self.queue.task_done()
+                continue
+            batch = [row]
+            deadline = time.perf_counter() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    row = self.queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None or row is _FLUSH:
+                    # Write now; a close sentinel goes back for the outer loop
+                    self.queue.task_done()
+                    if row is None:
+                        self.queue.put(None)
+                    break
+                batch.append(row)
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} results: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+class SQLiteResultsStore(_BackgroundWriter):
+    def __init__(self, path=RESULTS_STORE, **kwargs):
+        self.path = path
+        # closing() closes the setup connection; the inner with commits the migration
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+            existing = {row['name'] for row in conn.execute("PRAGMA table_info(verifications)")}
+            if 'prefilled' not in existing:
+                conn.execute("ALTER TABLE verifications ADD COLUMN prefilled TEXT")
+            if 'source' not in existing:
+                conn.execute("ALTER TABLE verifications ADD COLUMN source TEXT")
+                conn.execute("UPDATE verifications SET source = CASE WHEN session_id LIKE 'campaign-%' "
+                             "THEN 'campaign' ELSE 'live' END")
+        self._writer = None
+        super().__init__(**kwargs)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def write_batch(self, rows):
+        if self._writer is None:
+            self._writer = self._connect()
+        values = [tuple(json.dumps(row[c]) if c in JSON_COLUMNS else row[c] for c in COLUMNS)
+                  for row in rows]
+        with self._writer:
+            self._writer.executemany(
+                f"INSERT INTO verifications ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                values
+            )
+
+    def query(self, member_number=None, payer=None, since=None, status=None, limit=None, source=None):
+        """Rows matching the filters, newest first"""
+        clauses, params = [], []
+        for column, value in (('member_number', member_number), ('payer', payer), ('status', status),
+                              ('source', source)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(str(value))
+        if since is not None:
+            clauses.append("created_ts >= ?")
+            params.append(since)
+        sql = "SELECT * FROM verifications"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_ts DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        return [dict(row, **{c: json.loads(row[c]) if row[c] else [] for c in JSON_COLUMNS}) for row in rows]
+
+
+class JsonlResultsStore(_BackgroundWriter):
+    """Append-only JSONL; each batch is a single write so concurrent appenders do not interleave lines"""
+    def __init__(self, path, **kwargs):
+        self.path = path
+        super().__init__(**kwargs)
+
+    def write_batch(self, rows):
+        data = ''.join(json.dumps(row, separators=(',', ':'), default=str) + '\n' for row in rows).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def query(self, member_number=None, payer=None, since=None, status=None, limit=None, source=None):
+        if not os.path.exists(self.path):
+            return []
+        rows = []
+        with open(self.path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if member_number is not None and row['member_number'] != str(member_number):
+                    continue
+                if payer is not None and row['payer'] != payer:
+                    continue
+                if status is not None and row['status'] != status:
+                    continue
+                if since is not None and row['created_ts'] < since:
+                    continue
+                row['source'] = row_source(row)
+                if source is not None and row['source'] != source:
+                    continue
+                rows.append(row)
+        rows.sort(key=lambda row: row['created_ts'], reverse=True)
+        return rows[:limit] if limit else rows
+
+
+def open_store(path=None, **kwargs):
+    path = path or RESULTS_STORE
+    if path.endswith('.jsonl'):
+        return JsonlResultsStore(path, **kwargs)
+    return SQLiteResultsStore(path, **kwargs)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=None):
+    """Process-wide store for path; forked workers get their own writer thread and connection"""
+    key = (os.getpid(), path or RESULTS_STORE)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = open_store(path)
+            _stores[key] = store
+        return store
+
+
+def flatten(row):
+    """One flat record per result: collected fields become category.field columns"""
+    flat = {column: row[column] for column in COLUMNS if column not in JSON_COLUMNS}
+    flat['missing'] = ';'.join(row['missing'])
+    flat['prefilled'] = ';'.join(row.get('prefilled') or [])
+    for category, fields in row['collected'].items():
+        for field, value in fields.items():
+            flat[f"{category}.{field}"] = json.dumps(value) if isinstance(value, dict) else value
+    return flat
+
+
+def export(store, path):
+    """Columnar export for analytics: Parquet when pyarrow is available, CSV otherwise"""
+    import pandas as pd
+    df = pd.DataFrame([flatten(row) for row in store.query()])
+    if path.endswith('.parquet'):
+        try:
+            df.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = path[:-len('.parquet')] + '.csv'
+            print(f"pyarrow not installed, exporting CSV to {path}")
+    df.to_csv(path, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=RESULTS_STORE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    query = commands.add_parser('query')
+    query.add_argument('--member')
+    query.add_argument('--payer')
+    query.add_argument('--status')
+    query.add_argument('--source', help="'live' or 'campaign'")
+    query.add_argument('--limit', type=int, default=20)
+    export_parser = commands.add_parser('export')
+    export_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store)
+    if args.command == 'query':
+        for row in store.query(args.member, args.payer, status=args.status, limit=args.limit, source=args.source):
+            print(json.dumps(row, default=str))
+    else:
+        print(f"Exported to {export(store, args.path)}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+from collections.abc import Mapping, MutableMapping
+
+# The verification form, defined once. Everything else (the flow's
+# questions, the extractor for each field, the per-session record and the
+# summary) is compiled from this table, in this order.
+#   (category, field, question, answer_type, extractor method)
+FIELDS = (
+    ('eligibility', 'status', "What is the patient's current eligibility status?", 'status', 'extract_status'),
+    ('eligibility', 'effective_date', "What is the effective date of coverage?", 'date', 'extract_date'),
+    ('eligibility', 'plan_type', "What type of plan does the patient have?", 'plan', 'extract_plan_type'),
+    ('benefits', 'annual_maximum', "What is the annual maximum benefit?", 'amount', 'extract_amount'),
+    ('benefits', 'remaining_maximum', "What is the remaining benefit amount?", 'amount', 'extract_amount'),
+    ('benefits', 'deductible', "What is the deductible amount?", 'amount', 'extract_amount'),
+    ('benefits', 'deductible_met', "How much of the deductible has been met? Please provide dollar amount.",
+     'amount', 'extract_amount'),
+    ('benefits', 'benefit_period', "What is the benefit period?", 'period', 'extract_period'),
+    ('coverage', 'preventive', "What is the coverage percentage for preventive services?",
+     'percentage', 'extract_percentage'),
+    ('coverage', 'basic', "What is the coverage percentage for basic services?", 'percentage', 'extract_percentage'),
+    ('coverage', 'major', "What is the coverage percentage for major services?", 'percentage', 'extract_percentage'),
+    ('coverage', 'periodontics', "What is the coverage percentage for periodontal services?",
+     'percentage', 'extract_percentage'),
+    ('coverage', 'endodontics', "What is the coverage percentage for endodontic services?",
+     'percentage', 'extract_percentage'),
+    ('limitations', 'waiting_period', "Are there any waiting periods?", 'period', 'extract_period'),
+    ('limitations', 'frequency', "What are the frequency limitations?", None, 'extract_frequency'),
+    ('limitations', 'missing_tooth', "Is there a missing tooth clause?", 'yes_no', '_extract_boolean_answer'),
+    ('limitations', 'pre_authorization', "Are there any pre-authorization requirements?",
+     'yes_no', '_extract_boolean_answer')
+)
+
+
+class FieldSpec:
+    __slots__ = ('index', 'category', 'name', 'key', 'question', 'answer_type', 'extractor')
+
+    def __init__(self, index, category, name, question, answer_type, extractor):
+        self.index = index
+        self.category = category
+        self.name = name
+        self.key = f"{category}.{name}"
+        self.question = question
+        self.answer_type = answer_type
+        self.extractor = extractor
+
+    def __repr__(self):
+        return f"FieldSpec({self.key})"
+
+
+SPECS = tuple(FieldSpec(index, *row) for index, row in enumerate(FIELDS))
+CATEGORIES = tuple(dict.fromkeys(spec.category for spec in SPECS))
+CATEGORY_SPECS = {category: tuple(spec for spec in SPECS if spec.category == category) for category in CATEGORIES}
+SPEC_BY_FIELD = {(spec.category, spec.name): spec for spec in SPECS}
+FIELD_COUNT = len(SPECS)
+
+# The nested question table the flow manager has always exposed
+INSURANCE_QA = {
+    category: {spec.name: {'question': spec.question, 'answer_type': spec.answer_type} for spec in specs}
+    for category, specs in CATEGORY_SPECS.items()
+}
+
+
+class VerificationRecord:
+    """One session's answers: a flat list in schema order with a next-open cursor and a fill count"""
+    __slots__ = ('values', 'filled', 'cursor')
+
+    def __init__(self):
+        self.values = [None] * FIELD_COUNT
+        self.filled = 0
+        self.cursor = 0
+
+    def get(self, spec):
+        return self.values[spec.index]
+
+    def set(self, spec, value):
+        index = spec.index
+        old = self.values[index]
+        self.values[index] = value
+        self.filled += (value is not None) - (old is not None)
+        if value is None:
+            self.cursor = min(self.cursor, index)
+        elif index == self.cursor:
+            values = self.values
+            while self.cursor < FIELD_COUNT and values[self.cursor] is not None:
+                self.cursor += 1
+
+    def next_open(self):
+        """First unanswered field in schema order, or None when complete"""
+        return SPECS[self.cursor] if self.cursor < FIELD_COUNT else None
+
+    @property
+    def complete(self):
+        return self.filled == FIELD_COUNT
+
+    @property
+    def remaining(self):
+        return FIELD_COUNT - self.filled
+
+    def items(self):
+        return zip(SPECS, self.values)
+
+    def view(self):
+        """verification_data-style nested mapping over this record"""
+        return RecordView(self)
+
+
+class CategoryView(MutableMapping):
+    __slots__ = ('record', 'specs')
+
+    def __init__(self, record, category):
+        self.record = record
+        self.specs = {spec.name: spec for spec in CATEGORY_SPECS[category]}
+
+    def __getitem__(self, field):
+        return self.record.values[self.specs[field].index]
+
+    def __setitem__(self, field, value):
+        self.record.set(self.specs[field], value)
+
+    def __delitem__(self, field):
+        raise TypeError("verification fields cannot be removed")
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class RecordView(Mapping):
+    """Read and write a record as {category: {field: value}}"""
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        self.record = record
+
+    def __getitem__(self, category):
+        if category not in CATEGORY_SPECS:
+            raise KeyError(category)
+        return CategoryView(self.record, category)
+
+    def __iter__(self):
+        return iter(CATEGORIES)
+
+    def __len__(self):
+        return len(CATEGORIES)
+
+    def __repr__(self):
+        return repr({category: dict(self[category]) for category in CATEGORIES})
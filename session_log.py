@@ -0,0 +1,222 @@
+import os
+import json
+import time
+from flow import verify_patient
+from schema import SPEC_BY_FIELD
+
+# Append-only event log per call, so a crash or dropped line does not lose
+# the fields already collected. Each turn appends only what changed: one
+# 'field' event per newly extracted value and a 'flow' event when the
+# conversation position moves. A later call for the same member replays
+# the newest unfinished log and continues with the missing questions.
+#   sessions/<session_id>.jsonl
+SESSION_LOG_DIR = os.getenv('SESSION_LOG_DIR', 'sessions')
+SESSION_LOG_FSYNC = os.getenv('SESSION_LOG_FSYNC', '0') == '1'
+SESSION_RESUME = os.getenv('SESSION_RESUME', '1') == '1'
+SESSION_RESUME_HOURS = float(os.getenv('SESSION_RESUME_HOURS', '24'))
+
+
+def patient_info_state():
+    """What verify_patient has been asked and has answered so far"""
+    return {
+        'asked': sorted(getattr(verify_patient, 'asked_fields', ())),
+        'provided': sorted(getattr(verify_patient, 'provided_fields', ())),
+        'verification_asked': hasattr(verify_patient, 'verification_asked')
+    }
+
+
+def flow_state(flow_manager):
+    return dict(
+        patient_info_state(),
+        is_patient_info_phase=flow_manager.is_patient_info_phase,
+        verification_started=flow_manager.verification_started,
+        current_category=flow_manager.current_category
+    )
+
+
+class SessionLog:
+    def __init__(self, session_id, patient, directory=SESSION_LOG_DIR, fsync=SESSION_LOG_FSYNC, resumed_from=None):
+        os.makedirs(directory, exist_ok=True)
+        self.session_id = session_id
+        self.path = os.path.join(directory, f"{session_id}.jsonl")
+        if os.path.exists(self.path):
+            # Session ids may repeat across runs (replay-0, ...); never append to another call's log
+            self.path = os.path.join(directory, f"{session_id}-{time.time_ns()}.jsonl")
+        self.fsync = fsync
+        self.logged_fields = set()
+        self.last_flow = None
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.append('start', session_id=session_id, member_number=str(patient.get('member_number', '')),
+                    payer=patient.get('insurance_provider', ''), resumed_from=resumed_from)
+
+    def append(self, event, **data):
+        """One event per line; a single write each, so a crash never leaves half an event behind"""
+        if self._fd is None:
+            return
+        line = json.dumps(dict(e=event, ts=round(time.time(), 3), **data), separators=(',', ':'), default=str)
+        try:
+            os.write(self._fd, (line + '\n').encode())
+            if self.fsync:
+                os.fsync(self._fd)
+        except OSError as e:
+            print(f"Error writing session log: {str(e)}")
+
+    def checkpoint(self, verification, flow_manager):
+        """Append fields extracted since the last checkpoint and the flow position if it moved"""
+        prefilled = getattr(verification, 'prefilled', ())
+        if verification.record.filled != len(self.logged_fields):
+            for spec, value in verification.record.items():
+                if value is None or spec.index in self.logged_fields:
+                    continue
+                self.logged_fields.add(spec.index)
+                self.append('field', category=spec.category, field=spec.name, value=value,
+                            prefilled=spec.key in prefilled)
+
+        state = flow_state(flow_manager)
+        if state != self.last_flow:
+            self.last_flow = state
+            self.append('flow', **state)
+
+    def close(self, status=None):
+        if self._fd is None:
+            return
+        if status:
+            self.append('end', status=status)
+        os.close(self._fd)
+        self._fd = None
+
+
+def load_events(path):
+    """Events of a session log; a torn last line from a crash is ignored"""
+    events = []
+    with open(path) as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                break
+    return events
+
+
+def read_ends(path, tail_bytes=4096):
+    """First and last events of a session log, read without loading the events in between"""
+    with open(path, 'rb') as f:
+        first = f.readline()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(len(first), size - tail_bytes))
+        tail = f.read().splitlines()
+    try:
+        start = json.loads(first)
+    except ValueError:
+        return None, None
+    last = start
+    # The final line may be torn by a crash; the newest whole event is the last one
+    for line in reversed(tail):
+        try:
+            last = json.loads(line)
+            break
+        except ValueError:
+            continue
+    return start, last
+
+
+def find_resumable(patient, directory=SESSION_LOG_DIR, max_age_hours=SESSION_RESUME_HOURS):
+    """Newest unfinished session log for this member and payer, or None.
+
+    Only each log's first line (the start event) and last line are read.
+    """
+    if not os.path.isdir(directory):
+        return None
+    oldest = time.time() - max_age_hours * 3600
+    candidates = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.jsonl'):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if mtime >= oldest:
+                candidates.append((mtime, entry.path))
+
+    member_number = str(patient.get('member_number', ''))
+    payer = patient.get('insurance_provider', '')
+    for _, path in sorted(candidates, reverse=True):
+        try:
+            start, last = read_ends(path)
+        except OSError:
+            continue
+        if start is None or start.get('e') != 'start':
+            continue
+        if start['member_number'] != member_number or start['payer'] != payer:
+            continue
+        # Finished, or nothing logged after the start event
+        if last['e'] in ('end', 'start'):
+            continue
+        return path
+    return None
+
+
+def restore(events, verification, flow_manager):
+    """Rebuild collected fields, the flow position and verify_patient's state from events"""
+    fields = 0
+    state = None
+    for event in events:
+        if event['e'] == 'field':
+            spec = SPEC_BY_FIELD.get((event['category'], event['field']))
+            if spec is not None:
+                verification.record.set(spec, event['value'])
+                fields += 1
+                if event.get('prefilled'):
+                    verification.prefilled.add(spec.key)
+        elif event['e'] == 'flow':
+            state = event
+
+    if state is not None:
+        flow_manager.is_patient_info_phase = state['is_patient_info_phase']
+        flow_manager.verification_started = state['verification_started']
+        flow_manager.current_category = state['current_category']
+        verification.verification_started = not state['is_patient_info_phase']
+        if not state['is_patient_info_phase']:
+            verification.conversation_manager = flow_manager
+        verify_patient.asked_fields = set(state['asked'])
+        verify_patient.provided_fields = set(state['provided'])
+        if state['verification_asked']:
+            verify_patient.verification_asked = True
+        elif hasattr(verify_patient, 'verification_asked'):
+            delattr(verify_patient, 'verification_asked')
+    return fields
+
+
+def resume_session(path, verification, flow_manager, session_log=None):
+    """Continue a dropped call: restore its state and hand it over to session_log"""
+    try:
+        events = load_events(path)
+        fields = restore(events, verification, flow_manager)
+    except Exception as e:
+        print(f"Error resuming session from {path}: {str(e)}")
+        return False
+
+    print(f"Resumed {events[0]['session_id']}: {fields} fields restored, "
+          f"{'patient info' if flow_manager.is_patient_info_phase else flow_manager.current_category} phase")
+    # Mark the old log as taken over so it is not resumed twice
+    with open(path, 'a') as f:
+        f.write(json.dumps({'e': 'end', 'ts': round(time.time(), 3), 'status': 'resumed'}) + '\n')
+    if session_log is not None:
+        session_log.checkpoint(verification, flow_manager)
+    return True
+
+
+def open_session_log(session_id, patient, verification, flow_manager, directory=SESSION_LOG_DIR, resume=SESSION_RESUME):
+    """Start the event log for a call, resuming the member's last dropped call when there is one.
+
+    Returns the log and whether a previous call was resumed.
+    """
+    previous = find_resumable(patient, directory) if resume else None
+    resumed_from = os.path.basename(previous)[:-len('.jsonl')] if previous else None
+    session_log = SessionLog(session_id, patient, directory, resumed_from=resumed_from)
+    resumed = bool(previous) and resume_session(previous, verification, flow_manager, session_log)
+    flow_manager.session_log = session_log
+    return session_log, resumed
@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import nullcontext
+
+from verification import InsuranceVerification
+from flow import ConversationFlowManager, reset_patient_info_state
+from llm import initialize_llm, reset_chat
+from main import greeting_parts
+from clip_bank import stitch, SEGMENT_GAP_MS
+from tracing import record, increment
+
+# Ready-to-go verification sessions. Building a session means an LLM chat,
+# the verification record and the flow manager; the pool does that ahead
+# of time and recycles sessions between calls, and keeps the patient-free
+# sentences of the greeting prerendered so a call only synthesizes the
+# patient's name before the first words go out.
+SESSION_POOL_SIZE = int(os.getenv('SESSION_POOL_SIZE', '2'))
+SESSION_MAX_CALLS = int(os.getenv('SESSION_MAX_CALLS', '50'))
+
+
+class WarmSession:
+    """A verification session between calls"""
+    def __init__(self, office_name, chat):
+        self.chat = chat
+        self.verification = InsuranceVerification(office_name, None, chat=chat)
+        self.flow_manager = ConversationFlowManager(self.verification, None)
+        self.patient = None
+        self.greeting = None
+        self.greeting_audio = None
+        self.calls = 0
+
+    def bind(self, patient):
+        self.patient = patient
+        self.verification.reset(patient)
+        self.flow_manager.reset(patient)
+        reset_patient_info_state()
+
+    def reset(self):
+        """Forget the last call: record, flow position, chat history and greeting"""
+        self.bind(None)
+        reset_chat(self.chat)
+        self.greeting = None
+        self.greeting_audio = None
+
+
+class SessionPool:
+    def __init__(self, office_name, size=SESSION_POOL_SIZE, new_chat=None, clip_bank=None,
+                 max_calls=SESSION_MAX_CALLS, capacity=None, render_lock=None):
+        """size sessions are built up front; up to capacity idle sessions are kept between calls.
+        render_lock, when given, is held around every use of the clip bank"""
+        self.office_name = office_name
+        self.size = size
+        self.capacity = max(size, capacity or 0)
+        self.render_lock = render_lock or nullcontext()
+        self.new_chat = new_chat or (lambda index: initialize_llm())
+        self.clip_bank = clip_bank
+        self.max_calls = max_calls
+        self.idle = deque()
+        self.created = 0
+        self._lock = threading.Lock()
+
+        start = time.perf_counter()
+        for _ in range(size):
+            self.idle.append(self._build())
+        self.opening, self.ask = None, None
+        if clip_bank is not None:
+            opening, _, ask = greeting_parts(office_name, {'first_name': '', 'last_name': ''})
+            self.opening = clip_bank.carrier(opening)
+            self.ask = clip_bank.carrier(ask)
+        print(f"Session pool ready: {size} sessions in {time.perf_counter() - start:.2f}s")
+
+    def _build(self):
+        with self._lock:
+            index = self.created
+            self.created += 1
+        return WarmSession(self.office_name, self.new_chat(index))
+
+    def render_greeting(self, patient):
+        """Greeting PCM: prerendered opening and ask around the synthesized patient line"""
+        if self.clip_bank is None:
+            return None
+        _, patient_line, _ = greeting_parts(self.office_name, patient)
+        with self.render_lock:
+            patient_pcm = self.clip_bank.carrier(patient_line)
+        segments = [self.opening, patient_pcm, self.ask]
+        return stitch(segments, self.clip_bank.sample_rate, gap_ms=SEGMENT_GAP_MS)
+
+    def acquire(self, patient):
+        """A session bound to patient, with its greeting ready to play"""
+        start = time.perf_counter()
+        with self._lock:
+            session = self.idle.popleft() if self.idle else None
+        if session is None:
+            increment('session_pool_misses')
+            session = self._build()
+        else:
+            increment('session_pool_hits')
+        session.bind(patient)
+        session.greeting = " ".join(greeting_parts(self.office_name, patient))
+        session.greeting_audio = self.render_greeting(patient)
+        record('session_acquire', time.perf_counter() - start)
+        return session
+
+    def release(self, session):
+        """Recycle a session after its call; worn-out sessions are replaced with fresh ones"""
+        session.calls += 1
+        if session.calls >= self.max_calls:
+            session = self._build()
+        else:
+            session.reset()
+        with self._lock:
+            if len(self.idle) < self.capacity:
+                self.idle.append(session)
+
@@ -0,0 +1,114 @@
+import os
+import copy
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import start_deadline
+from stt import ANSWER_PATTERNS
+from tracing import record, increment
+
+# Speculative extraction. While the rep is still talking, endpointing
+# transcribes partial phrases; as soon as a partial holds a candidate answer
+# for the open question, that field's extraction starts in the background
+# (local parser first, then the cache and the LLM as usual), and it starts
+# over whenever a later partial holds different candidates. When the final
+# transcript reaches process_response the speculative value is used if the
+# final transcript holds the same candidate answers, and the field is
+# extracted again from the final transcript otherwise. Speculative LLM
+# requests are sent outside the chat history, so one that is superseded or
+# that the final transcript disagrees with is dropped without waiting for it.
+SPECULATIVE_EXTRACTION = os.getenv('SPECULATIVE_EXTRACTION', '1') == '1'
+SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', '4'))
+
+_speculation_pool = None
+_speculation_pool_pid = None
+_speculation_pool_lock = threading.Lock()
+
+
+def get_speculation_pool():
+    """Process-wide pool, created on first use so forked workers get their own"""
+    global _speculation_pool, _speculation_pool_pid
+    with _speculation_pool_lock:
+        if _speculation_pool is None or _speculation_pool_pid != os.getpid():
+            _speculation_pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix='speculate')
+            _speculation_pool_pid = os.getpid()
+        return _speculation_pool
+
+
+class HistoryFreeChat:
+    """The session's chat, with every request sent on its own outside the conversation history"""
+    def __init__(self, chat):
+        self._chat = chat
+
+    def send_message(self, content, *args, **kwargs):
+        return self._chat.send_message(content, history=False)
+
+
+def candidate_answers(text, answer_type):
+    """The spans of text that look like an answer of answer_type, in order"""
+    pattern = ANSWER_PATTERNS.get(answer_type)
+    if pattern is None or not text:
+        return ()
+    return tuple(match.group(0).lower() for match in pattern.finditer(text))
+
+
+class Speculation:
+    """One turn's speculative extraction for the open verification field"""
+    def __init__(self, verification, flow_manager):
+        # Extractors only use the chat and the backend settings; a shallow copy
+        # with a history-free chat keeps the session's history out of reach
+        self.verification = copy.copy(verification)
+        self.verification.chat = HistoryFreeChat(verification.chat)
+        self.spec = None if flow_manager.is_patient_info_phase else flow_manager.current_spec()
+        self.answers = None
+        self.future = None
+
+    def observe(self, partial_text):
+        """Feed a partial transcript; starts extraction on its candidate answers, again if they change"""
+        if self.spec is None or self.spec.answer_type is None:
+            return
+        answers = candidate_answers(partial_text, self.spec.answer_type)
+        if not answers or answers == self.answers:
+            return
+        if self.future is not None:
+            # The rep changed the answer; a request already running is history-free, so let it finish unseen
+            self.future.cancel()
+            increment('speculation_restarts')
+
+        self.answers = answers
+        context = contextvars.copy_context()
+        self.future = get_speculation_pool().submit(context.run, self._extract, partial_text)
+        increment('speculations')
+        print(f"Speculating on {self.spec.name}: '{partial_text}'")
+
+    def _extract(self, text):
+        # The turn's own deadline starts when the rep stops talking
+        start_deadline()
+        return self.verification.extractor(self.spec)(text, self.spec.question)
+
+    def result(self, spec, text):
+        """The speculative value for spec if text agrees with the partial it started on, otherwise None"""
+        if self.future is None or spec is not self.spec:
+            return None
+        if candidate_answers(text, spec.answer_type) != self.answers:
+            # Nothing to wait for: a request still in flight cannot touch the chat history
+            self.future.cancel()
+            increment('speculation_redos')
+            return None
+
+        start = time.perf_counter()
+        try:
+            value = self.future.result()
+        except Exception as e:
+            print(f"Error in speculative extraction: {str(e)}")
+            value = None
+        hit = value is not None
+        record('speculation_wait', time.perf_counter() - start, hit=hit)
+        if not hit:
+            increment('speculation_redos')
+            return None
+        increment('speculation_hits')
+        print(f"Speculative {spec.name} confirmed by final transcript: {value}")
+        return value
@@ -4,6 +4,64 @@ import numpy as np
 from scipy import signal
 import simpleaudio as sa
 import time
+import re
+from model_registry import transcribe_array, get_stt_model
+import model_server
+from tracing import traced, record
+
+STT_SAMPLE_RATE = 16000
+
+# Semantic endpointing: a short VAD pause yields a partial phrase, which is
+# transcribed and checked for the answer the current question expects.
+ENDPOINT_PAUSE_THRESHOLD = 0.4
+ENDPOINT_PROBE_TIMEOUT = 0.6
+ENDPOINT_MID_SENTENCE_TIMEOUT = 2.0
+ENDPOINT_MAX_PARTIALS = 8
+
+_NUMBER_WORDS = (
+    r'zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|'
+    r'fifteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety|hundred|thousand'
+)
+_MONTHS = (
+    r'january|february|march|april|may|june|july|august|september|october|'
+    r'november|december|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec'
+)
+
+ANSWER_PATTERNS = {
+    'amount': re.compile(
+        rf'\$\s?\d|\b\d[\d,]*(\.\d+)?\s*(k|dollars?|bucks)\b|\b({_NUMBER_WORDS})\s+dollars?\b'
+        r'|\b(fully met|not met|none of|haven\'t met|hasn\'t met)\b',
+        re.IGNORECASE
+    ),
+    'percentage': re.compile(
+        rf'\d+\s*(%|percent)|\b({_NUMBER_WORDS})\s+percent\b|\b(full|half|no) coverage\b',
+        re.IGNORECASE
+    ),
+    'date': re.compile(
+        rf'\b\d{{1,2}}\s*[/.-]+\s*\d{{1,2}}\s*[/.-]+\s*\d{{2,4}}\b|\b({_MONTHS})\b\.?\s+\d{{1,2}}'
+        r'|\b(start|beginning) of the year\b',
+        re.IGNORECASE
+    ),
+    # A yes or no opening the turn. Anywhere else these words turn up in hedges
+    # ("I'm not sure", "that's not correct, it's...", "there is a waiting
+    # period, let me see"), so they do not count there
+    'yes_no': re.compile(
+        r'^\W*(yes|yeah|yep|yup|no|nope|go ahead|(it\'s |it is )?(not )?required)\b',
+        re.IGNORECASE
+    ),
+    'status': re.compile(r'\b(active|inactive|eligible|ineligible|terminated|not covered)\b', re.IGNORECASE),
+    'plan': re.compile(r'\b(ppo|hmo|dhmo|epo|pos|indemnity|medicaid)\b', re.IGNORECASE),
+    'period': re.compile(
+        r'\b(calendar|fiscal|contract|benefit|plan) year\b|\b\d+[- ]?(month|year)s?\b|\bno waiting\b',
+        re.IGNORECASE
+    )
+}
+
+# Words a speaker trails off on when they are about to continue
+_MID_SENTENCE_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'but', 'for', 'is', 'it', 'of', 'or', 'per',
+    'so', 'the', 'their', 'to', 'uh', 'um', 'was', 'with', 'about', 'has', 'have'
+}
 
 def initialize_enhanced_recognition():
     recognizer = sr.Recognizer()
@@ -13,9 +71,10 @@ def initialize_enhanced_recognition():
     recognizer.dynamic_energy_ratio = 1.5
     recognizer.pause_threshold = 1.0
     
-    def remove_noise(audio_data):
+    def remove_noise(audio_data, sample_rate=None):
         audio_array = np.frombuffer(audio_data.frame_data, dtype=np.int16)
-        nyquist = 22050 / 2
+        # The capture's own rate: 8 kHz telephony, 16 kHz or the 22050 Hz default
+        nyquist = (sample_rate or getattr(audio_data, 'sample_rate', None) or 22050) / 2
         low = 300 / nyquist
         high = 3000 / nyquist
         b, a = signal.butter(4, [low, high], btype='band')
@@ -25,14 +84,45 @@ def initialize_enhanced_recognition():
     recognizer.remove_noise = remove_noise
     return recognizer
 
-def listen_for_speech(recognizer, source, play_obj=None):
+@traced('stt')
+def transcribe_audio(audio_data, backend=None):
+    """Transcribe captured AudioData with the process-wide shared STT model"""
+    raw_data = audio_data.get_raw_data(convert_rate=STT_SAMPLE_RATE, convert_width=2)
+    audio = np.frombuffer(raw_data, dtype=np.int16).astype(np.float32) / 32768.0
+    if model_server.client_enabled():
+        return model_server.get_client().transcribe(audio)
+    return transcribe_array(audio, backend)
+
+def preload_stt_model():
+    """Load the STT model up front, unless a model server hosts it"""
+    if not model_server.client_enabled():
+        get_stt_model()
+
+def has_expected_answer(text, expected_type):
+    """Check whether a (partial) transcript already contains the expected answer type"""
+    pattern = ANSWER_PATTERNS.get(expected_type)
+    return bool(text and pattern and pattern.search(text))
+
+def is_mid_sentence(text):
+    """Heuristic check for a transcript that stops in the middle of a sentence"""
+    stripped = (text or '').strip()
+    if not stripped or stripped.endswith((',', '-', '...')):
+        return True
+    last_word = re.sub(r'[^\w\']', '', stripped.split()[-1].lower())
+    return last_word in _MID_SENTENCE_WORDS
+
+def listen_for_speech(recognizer, source, play_obj=None, expected_type=None, transcribe=None, on_partial=None):
     print("\nListening...")
     if play_obj and play_obj.is_playing():
         play_obj.stop()
+
+    if expected_type in ANSWER_PATTERNS and transcribe is not None:
+        return _listen_with_endpointing(recognizer, source, expected_type, transcribe, on_partial)
         
     try:
         full_audio_data = b''
         is_speaking = False
+        last_speech = None
         
         while True:
             try:
@@ -40,6 +130,7 @@ def listen_for_speech(recognizer, source, play_obj=None):
                 if len(audio.get_raw_data()) > 0:
                     is_speaking = True
                     full_audio_data += audio.get_raw_data()
+                    last_speech = time.perf_counter()
                 
                 if is_speaking:
                     try:
@@ -54,9 +145,79 @@ def listen_for_speech(recognizer, source, play_obj=None):
                 
         if not full_audio_data:
             return None
-            
+
+        record('endpoint', time.perf_counter() - last_speech, mode='pause')
         return sr.AudioData(full_audio_data, audio.sample_rate, audio.sample_width)
         
     except Exception as e:
         print(f"Error in listening: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def _listen_with_endpointing(recognizer, source, expected_type, transcribe, on_partial=None):
+    """Listen until the expected answer is heard, adapting the wait to partial transcripts.
+
+    Each phrase between VAD pauses is transcribed once, on its own, and the
+    partial transcript is the phrases so far joined, so decoding cost grows
+    linearly with the length of the turn. The returned AudioData carries that
+    transcript as ``transcript``, which covers the full captured audio, so
+    callers can skip a second decode. on_partial, if given, is called with
+    each partial transcript as it arrives.
+    """
+    original_pause = recognizer.pause_threshold
+    recognizer.pause_threshold = ENDPOINT_PAUSE_THRESHOLD
+    chunks = []
+    phrases = []
+    audio = None
+    partial_text = ''
+    last_speech = None
+    early_close = False
+
+    try:
+        while len(chunks) < ENDPOINT_MAX_PARTIALS:
+            if not chunks:
+                timeout = 0.5
+            elif is_mid_sentence(partial_text):
+                timeout = ENDPOINT_MID_SENTENCE_TIMEOUT
+            else:
+                timeout = ENDPOINT_PROBE_TIMEOUT
+
+            try:
+                audio = recognizer.listen(source, timeout=timeout)
+            except sr.WaitTimeoutError:
+                if chunks:
+                    break
+                continue
+
+            raw_data = audio.get_raw_data()
+            if not raw_data:
+                continue
+            chunks.append(raw_data)
+            last_speech = time.perf_counter()
+
+            phrase = transcribe(sr.AudioData(raw_data, audio.sample_rate, audio.sample_width))
+            if phrase:
+                phrases.append(phrase.strip())
+            partial_text = ' '.join(phrases)
+            print(f"Partial transcript: {partial_text}")
+            if on_partial is not None:
+                on_partial(partial_text)
+
+            if has_expected_answer(partial_text, expected_type) and not is_mid_sentence(partial_text):
+                print(f"Endpoint: expected {expected_type} heard, closing turn")
+                early_close = True
+                break
+
+        if not chunks:
+            return None
+
+        record('endpoint', time.perf_counter() - last_speech, mode='semantic',
+               expected_type=expected_type, early_close=early_close)
+        result = sr.AudioData(b''.join(chunks), audio.sample_rate, audio.sample_width)
+        result.transcript = partial_text
+        return result
+
+    except Exception as e:
+        print(f"Error in listening: {str(e)}")
+        return None
+    finally:
+        recognizer.pause_threshold = original_pause
@@ -0,0 +1,198 @@
+"""8 kHz mu-law telephony audio in and out of the pipeline.
+
+Phone audio arrives as G.711 mu-law at 8 kHz; Whisper wants 16 kHz PCM and
+the voices speak at 22050 Hz. TelephonyIngress decodes mu-law through a
+lookup table and resamples each incoming frame to STT_SAMPLE_RATE;
+TelephonyEgress resamples each outgoing TTS chunk to 8 kHz and encodes it.
+Both use StreamResampler, a polyphase FIR resampler that keeps only the
+last few input samples between chunks, so a call is converted frame by
+frame instead of as one whole buffer at the end.
+
+    python telephony.py --seconds 60
+"""
+import time
+import argparse
+from math import gcd, ceil
+
+import numpy as np
+from scipy import signal
+
+from stt import STT_SAMPLE_RATE
+
+TELEPHONY_SAMPLE_RATE = 8000
+MULAW_BIAS = 0x21
+MULAW_TOP = 0x1FFF
+# Half-length of the anti-aliasing filter in multiples of the larger rate
+# factor, and its Kaiser window beta (as scipy.signal.resample_poly)
+FILTER_HALF_LENGTH = 10
+FILTER_BETA = 5.0
+
+
+def _mulaw_decode_table():
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = (((codes & 0x0F) << 3) + 0x84 << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def _mulaw_encode_table():
+    # Indexed by the uint16 bit pattern of an int16 sample; 14-bit G.711 reference encoder
+    samples = np.arange(65536, dtype=np.int32)
+    samples = np.where(samples >= 32768, samples - 65536, samples) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    # Anything past the top segment encodes as its largest step
+    magnitude = np.minimum(np.abs(samples) + MULAW_BIAS, MULAW_TOP)
+    segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    mantissa = (magnitude >> (segment + 1)) & 0x0F
+    return (((segment << 4) | mantissa) ^ mask).astype(np.uint8)
+
+
+MULAW_DECODE = _mulaw_decode_table()
+MULAW_ENCODE = _mulaw_encode_table()
+
+
+def mulaw_decode(data):
+    """mu-law bytes to int16 PCM"""
+    return MULAW_DECODE[np.frombuffer(data, dtype=np.uint8)]
+
+
+def mulaw_encode(pcm):
+    """int16 PCM to mu-law bytes"""
+    pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+    return MULAW_ENCODE[pcm.view(np.uint16)].tobytes()
+
+
+class StreamResampler:
+    """Polyphase FIR resampling, one chunk at a time.
+
+    The rate ratio is reduced to up/down; the anti-aliasing filter is split
+    into `up` phases of `taps` coefficients each, and every output sample is
+    one dot product of a phase with the last `taps` input samples. Between
+    chunks only taps - 1 input samples and the output position are kept, so
+    feeding a stream in pieces gives the same samples as feeding it whole.
+    Output lags the input by the filter's group delay (about
+    FILTER_HALF_LENGTH input samples).
+    """
+    def __init__(self, rate_in, rate_out):
+        divisor = gcd(rate_in, rate_out)
+        self.rate_in, self.rate_out = rate_in, rate_out
+        self.up, self.down = rate_out // divisor, rate_in // divisor
+        factor = max(self.up, self.down)
+        length = 2 * FILTER_HALF_LENGTH * factor + 1
+        self.taps = ceil(length / self.up)
+        h = signal.firwin(length, 1 / factor, window=('kaiser', FILTER_BETA)) * self.up
+        h = np.concatenate([h, np.zeros(self.taps * self.up - length)])
+        # phases[p, j] multiplies input sample i - (taps - 1 - j) for output phase p,
+        # so a phase lines up with an ascending window of input
+        self.phases = np.ascontiguousarray(h.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.consumed = 0
+        self.position = 0
+
+    def process(self, chunk):
+        """Resample the next chunk of a stream; int16 in gives int16 out"""
+        chunk = np.asarray(chunk)
+        as_pcm16 = chunk.dtype == np.int16
+        if not chunk.size:
+            return np.zeros(0, dtype=np.int16 if as_pcm16 else np.float32)
+        buffer = np.concatenate([self.history, chunk.astype(np.float32, copy=False)])
+
+        # Every output whose newest input sample has arrived
+        last = self.consumed + len(chunk)
+        count = max(0, (last * self.up - 1 - self.position) // self.down + 1)
+        times = self.position + np.arange(count, dtype=np.int64) * self.down
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+        out = np.einsum('nk,nk->n', windows[times // self.up - self.consumed], self.phases[times % self.up])
+
+        self.position += count * self.down
+        self.consumed = last
+        self.history = buffer[len(buffer) - (self.taps - 1):]
+        if as_pcm16:
+            return np.clip(out, -32768, 32767).astype(np.int16)
+        return out
+
+    def flush(self):
+        """The tail still inside the filter at the end of a stream"""
+        tail = np.zeros(FILTER_HALF_LENGTH * max(self.up, self.down) // self.up + 1, dtype=np.int16)
+        return self.process(tail)
+
+
+class TelephonyIngress:
+    """Caller audio: mu-law (or int16) frames at the line rate to int16 PCM for STT"""
+    def __init__(self, rate_in=TELEPHONY_SAMPLE_RATE, rate_out=STT_SAMPLE_RATE, encoding='mulaw'):
+        self.encoding = encoding
+        self.resampler = StreamResampler(rate_in, rate_out) if rate_in != rate_out else None
+
+    def feed(self, data):
+        pcm = mulaw_decode(data) if self.encoding == 'mulaw' else np.frombuffer(data, dtype=np.int16)
+        return self.resampler.process(pcm) if self.resampler else pcm
+
+
+class TelephonyEgress:
+    """Agent audio: TTS PCM chunks to mu-law (or int16) frames at the line rate"""
+    def __init__(self, rate_in, rate_out=TELEPHONY_SAMPLE_RATE, encoding='mulaw'):
+        self.encoding = encoding
+        self.resampler = StreamResampler(rate_in, rate_out) if rate_in != rate_out else None
+
+    def reset(self):
+        """Start a new reply without the previous reply's filter tail"""
+        if self.resampler:
+            self.resampler.reset()
+
+    def encode(self, pcm):
+        pcm = self.resampler.process(np.asarray(pcm, dtype=np.int16)) if self.resampler else pcm
+        return mulaw_encode(pcm) if self.encoding == 'mulaw' else np.ascontiguousarray(pcm, dtype=np.int16).tobytes()
+
+
+def benchmark(seconds=60, frame_ms=20, tts_rate=22050):
+    """Time the streaming paths against real time and check them against whole-buffer resample_poly"""
+    rng = np.random.default_rng(0)
+    t = np.arange(seconds * TELEPHONY_SAMPLE_RATE) / TELEPHONY_SAMPLE_RATE
+    line = (8000 * np.sin(2 * np.pi * 440 * t) + rng.normal(0, 500, t.size)).astype(np.int16)
+    mulaw = mulaw_encode(line)
+    t = np.arange(seconds * tts_rate) / tts_rate
+    voice = (8000 * np.sin(2 * np.pi * 300 * t)).astype(np.int16)
+
+    decoded = mulaw_decode(mulaw)
+    error = np.abs(decoded.astype(np.int32) - line).max()
+    print(f"mu-law round trip: max error {error} on a tone peaking near {np.abs(line).max()}")
+
+    for name, rate_in, data, run in (
+        ('ingress 8k mu-law -> 16k', TELEPHONY_SAMPLE_RATE, mulaw, TelephonyIngress().feed),
+        ('egress 22.05k -> 8k mu-law', tts_rate, voice, TelephonyEgress(tts_rate).encode),
+    ):
+        frame = rate_in * frame_ms // 1000
+        start = time.perf_counter()
+        produced = 0
+        for offset in range(0, len(data), frame):
+            produced += len(run(data[offset:offset + frame]))
+        elapsed = time.perf_counter() - start
+        frames = ceil(len(data) / frame)
+        print(f"{name}: {seconds / elapsed:.0f}x real time, "
+              f"{elapsed / frames * 1e6:.1f} us per {frame_ms} ms frame, {produced} samples out")
+
+    # The streamed output equals the whole-buffer polyphase result, less the filter delay
+    resampler = StreamResampler(TELEPHONY_SAMPLE_RATE, STT_SAMPLE_RATE)
+    frame = TELEPHONY_SAMPLE_RATE * frame_ms // 1000
+    streamed = np.concatenate([resampler.process(decoded[offset:offset + frame].astype(np.float32))
+                               for offset in range(0, len(decoded), frame)])
+    start = time.perf_counter()
+    whole = signal.resample_poly(decoded.astype(np.float32), resampler.up, resampler.down)
+    elapsed = time.perf_counter() - start
+    delay = FILTER_HALF_LENGTH * max(resampler.up, resampler.down)
+    delay = delay // resampler.down
+    span = min(len(whole), len(streamed) - delay)
+    mismatch = np.abs(streamed[delay:delay + span] - whole[:span]).max()
+    print(f"whole-buffer resample_poly: {seconds / elapsed:.0f}x real time; "
+          f"streamed output differs by at most {mismatch:.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=int, default=60, help='length of the benchmark stream')
+    parser.add_argument('--frame-ms', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.seconds, args.frame_ms)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('dotenv')
+pytest.importorskip('numpy')
+pytest.importorskip('speech_recognition')
+pytest.importorskip('whisper')
+pytest.importorskip('simpleaudio')
+
+from campaign import campaign_status, write_status
+
+
+def test_scripted_call_is_never_complete():
+    assert campaign_status({'status': 'complete', 'skipped': False}) == 'simulated'
+    assert campaign_status({'status': 'incomplete', 'skipped': False}) == 'incomplete'
+
+
+def test_fresh_live_record_stays_complete():
+    assert campaign_status({'status': 'complete', 'skipped': True}) == 'complete'
+
+
+def test_status_file_marks_scripted_calls_simulated(tmp_path):
+    path = tmp_path / 'status.csv'
+    write_status([{'patient_id': '111', 'name': 'A B', 'status': campaign_status({'status': 'complete', 'skipped': False}),
+                   'skipped': False, 'attempts': 1, 'turns': 21, 'wall_s': 0.5, 'missing': [], 'error': None}],
+                 str(path))
+    assert 'complete' not in path.read_text()
+    assert ',simulated,' in path.read_text()
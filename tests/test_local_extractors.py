@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_extractors import parse_boolean, parse_status
+
+
+@pytest.mark.parametrize('text', [
+    "No problem, go ahead",
+    "No, not at all",
+    "Nope, go ahead",
+])
+def test_boolean_leaves_polarity_flipping_replies_open(text):
+    assert parse_boolean(text) is None
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Yes.", True),
+    ("Nope", False),
+    ("No, it's not required.", False),
+    ("Go ahead", True),
+])
+def test_boolean_reads_plain_replies(text, expected):
+    assert parse_boolean(text) is expected
+
+
+def test_status_leaves_mixed_members_open():
+    assert parse_status("The patient is active, the spouse terminated last year") is None
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Active", 'Active'),
+    ("Coverage is no longer active", 'Inactive'),
+    ("She's not currently eligible", 'Inactive'),
+])
+def test_status_reads_plain_replies(text, expected):
+    assert parse_status(text) == expected
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prior_verifications import DAY, apply_prior_verification
+from results_store import open_store
+from schema import FIELDS, VerificationRecord
+
+PATIENT = {'member_number': '123456789', 'insurance_provider': 'Delta Dental',
+           'first_name': 'Jane', 'last_name': 'Doe'}
+
+
+def _store_with_full_record(path, source='live'):
+    collected = {}
+    for category, field, _, answer_type, _ in FIELDS:
+        collected.setdefault(category, {})[field] = True if answer_type == 'yes_no' else f"{field} value"
+    store = open_store(str(path))
+    store.save({'status': 'complete', 'missing': [], 'collected': collected}, PATIENT, source=source)
+    store.close()
+    return store
+
+
+def _verification():
+    return SimpleNamespace(record=VerificationRecord(), prefilled=set())
+
+
+def test_fully_fresh_record_skips_the_call(tmp_path):
+    store = _store_with_full_record(tmp_path / 'results.jsonl')
+    verification = _verification()
+    assert apply_prior_verification(verification, PATIENT, store=store) is True
+    assert verification.record.remaining == 0
+
+
+def test_next_day_asks_the_moving_balances_again(tmp_path):
+    store = _store_with_full_record(tmp_path / 'results.jsonl')
+    verification = _verification()
+    assert apply_prior_verification(verification, PATIENT, store=store, now=time.time() + 2 * DAY) is False
+    assert verification.record.remaining == 2
+
+
+def test_campaign_rows_are_not_reused(tmp_path):
+    store = _store_with_full_record(tmp_path / 'results.jsonl', source='campaign')
+    verification = _verification()
+    assert apply_prior_verification(verification, PATIENT, store=store) is False
+    assert not verification.prefilled
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompts
+
+
+def test_templates_within_token_budgets():
+    assert prompts.check_budgets() == []
+
+
+def test_every_template_has_a_budget():
+    assert set(prompts.TOKEN_BUDGETS) == set(prompts.TEMPLATES)
+
+
+def test_over_budget_templates_are_reported():
+    assert prompts.check_budgets({name: 1 for name in prompts.TEMPLATES}) == list(prompts.TEMPLATES)
@@ -0,0 +1,65 @@
+import os
+import re
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('dotenv')
+pytest.importorskip('speech_recognition')
+pytest.importorskip('whisper')
+pytest.importorskip('simpleaudio')
+
+from schema import SPEC_BY_FIELD
+from speculation import Speculation
+from verification import InsuranceVerification
+
+SPEC = SPEC_BY_FIELD[('benefits', 'annual_maximum')]
+
+
+class GatedChat:
+    """Answers the amount prompt with the last dollar figure it was sent, once released"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = 0
+
+    def send_message(self, content, history=True):
+        self.calls += 1
+        self.release.wait(5)
+        amounts = re.findall(r'\$(\d[\d,]*)', content['text'])
+        return SimpleNamespace(text=amounts[-1].replace(',', '') if amounts else 'None')
+
+
+def _speculation():
+    chat = GatedChat()
+    verification = InsuranceVerification("Test Dental", {}, chat=chat)
+    flow_manager = SimpleNamespace(is_patient_info_phase=False, current_spec=lambda: SPEC)
+    return Speculation(verification, flow_manager), chat
+
+
+def test_partial_with_a_candidate_is_extracted_before_the_endpoint():
+    speculation, chat = _speculation()
+    # The rep is mid-sentence: no endpoint yet
+    speculation.observe("The annual maximum is $1,500 and")
+    assert speculation.future.result(timeout=5) == 1500.0
+
+    final = "The annual maximum is $1,500 and that resets in January."
+    assert speculation.result(SPEC, final) == 1500.0
+    assert chat.calls == 1
+
+
+def test_changed_candidate_restarts_extraction():
+    speculation, chat = _speculation()
+    chat.release.clear()
+    speculation.observe("The annual maximum is $1,000")
+    first = speculation.future
+    speculation.observe("The annual maximum is $1,000, sorry, $1,500")
+    assert speculation.future is not first
+    chat.release.set()
+
+    assert speculation.result(SPEC, "The annual maximum is $1,000, sorry, $1,500.") == 1500.0
+    assert speculation.result(SPEC, "The annual maximum is $2,000.") is None
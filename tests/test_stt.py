@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('speech_recognition')
+pytest.importorskip('whisper')
+pytest.importorskip('simpleaudio')
+
+from stt import has_expected_answer, is_mid_sentence
+
+
+@pytest.mark.parametrize('text', [
+    "I'm not sure, let me check.",
+    "That's not correct, it's a different plan.",
+    "There is a waiting period, let me see.",
+    "Sure, give me one second while I pull that up.",
+])
+def test_hedges_do_not_close_a_yes_no_turn(text):
+    assert not has_expected_answer(text, 'yes_no')
+
+
+@pytest.mark.parametrize('text', [
+    "Yes, it does.",
+    "No, there isn't.",
+    "Nope.",
+    "Not required.",
+    "It's required for crowns.",
+    "Go ahead.",
+])
+def test_answers_close_a_yes_no_turn(text):
+    assert has_expected_answer(text, 'yes_no')
+    assert not is_mid_sentence(text)
@@ -0,0 +1,55 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('dotenv')
+
+from verification import InsuranceVerification
+
+
+class ScriptedChat:
+    """Answers every prompt with the same text and counts the calls"""
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def send_message(self, content, history=True):
+        self.calls += 1
+        return SimpleNamespace(text=self.text)
+
+
+def _verification(answer):
+    verification = InsuranceVerification("Test Dental", {}, chat=ScriptedChat(answer))
+    verification.extraction_backends = ('local', 'llm')
+    return verification
+
+
+@pytest.mark.parametrize('reply', [
+    "No problem, go ahead",
+    "No, not at all",
+    "Nope, go ahead",
+])
+def test_consent_replies_go_to_the_llm(reply):
+    verification = _verification('TRUE')
+    question = "Do you mind if I ask a few questions about the patient's benefits?"
+    assert verification.extract_boolean(question, reply) is True
+    assert verification.last_extraction_backend == 'llm'
+    assert verification.chat.calls == 1
+
+
+def test_mixed_status_goes_to_the_llm():
+    verification = _verification('Active')
+    reply = "The patient is active, the spouse terminated last year"
+    assert verification.extract_status(reply, "Is the patient's coverage active?") == 'Active'
+    assert verification.last_extraction_backend == 'llm'
+
+
+def test_one_word_reply_skips_the_llm():
+    verification = _verification('FALSE')
+    assert verification.extract_boolean("Is there a waiting period?", "Yes.") is True
+    assert verification.last_extraction_backend == 'local'
+    assert verification.chat.calls == 0
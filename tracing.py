@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+import functools
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Per-turn stage tracing. Every span is appended to a JSONL file and folded
+# into in-memory latency reservoirs that back a Prometheus text snapshot.
+TRACE_FILE = os.getenv('TRACE_FILE', 'trace_spans.jsonl')
+METRICS_FILE = os.getenv('TRACE_METRICS_FILE', 'trace_metrics.prom')
+RESERVOIR_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+_context = contextvars.ContextVar('trace_context', default=None)
+
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, metrics_path=METRICS_FILE):
+        self.path = path
+        self.metrics_path = metrics_path
+        self._lock = threading.Lock()
+        self._file = None
+        self._durations = defaultdict(lambda: deque(maxlen=RESERVOIR_SIZE))
+        self._totals = defaultdict(lambda: [0, 0.0])
+        self._counters = defaultdict(int)
+        self._hooks = []
+
+    def add_hook(self, hook):
+        """Register hook(event, stage, context) called with 'start' and 'end' around each span"""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def _notify(self, event, stage, context):
+        for hook in list(self._hooks):
+            try:
+                hook(event, stage, context)
+            except Exception as e:
+                print(f"Error in trace hook: {str(e)}")
+
+    def _write(self, record):
+        if not self.path:
+            return
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', buffering=1)
+            self._file.write(line)
+
+    def record(self, stage, duration, start=None, **attrs):
+        """Record an already measured stage duration in seconds"""
+        context = _context.get() or {}
+        with self._lock:
+            self._durations[stage].append(duration)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += duration
+        record = {
+            'ts': round(start if start is not None else time.time() - duration, 6),
+            'stage': stage,
+            'duration_ms': round(duration * 1000, 3),
+            'session_id': context.get('session_id'),
+            'turn': context.get('turn'),
+            'field': context.get('field')
+        }
+        record.update(attrs)
+        self._write(record)
+
+    def increment(self, name, amount=1, **labels):
+        """Increment a named counter, exported alongside stage latencies"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        context = _context.get() or {}
+        self._notify('start', stage, context)
+        wall_start = time.time()
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, start=wall_start, **attrs)
+            self._notify('end', stage, context)
+
+    def stage_count(self, stage):
+        with self._lock:
+            return self._totals[stage][0] if stage in self._totals else 0
+
+    def quantiles(self, stage):
+        with self._lock:
+            values = sorted(self._durations.get(stage, ()))
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+
+    def prometheus_text(self):
+        """Prometheus text exposition of stage latency summaries and counters"""
+        lines = [
+            '# HELP agent_stage_latency_seconds Latency of each pipeline stage per turn',
+            '# TYPE agent_stage_latency_seconds summary'
+        ]
+        with self._lock:
+            stages = sorted(self._totals)
+            totals = {stage: tuple(self._totals[stage]) for stage in stages}
+            counters = dict(self._counters)
+        for stage in stages:
+            for q, value in self.quantiles(stage).items():
+                lines.append(f'agent_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            count, total = totals[stage]
+            lines.append(f'agent_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'agent_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f'# TYPE agent_{name}_total counter')
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name != name:
+                    continue
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'agent_{name}_total{{{label_text}}} {value}' if label_text
+                             else f'agent_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_snapshot(self, path=None):
+        path = path or self.metrics_path
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+tracer = Tracer()
+
+
+def start_session(session_id=None):
+    """Start a traced session in the current context and return its id"""
+    session_id = session_id or uuid.uuid4().hex[:12]
+    _context.set({'session_id': session_id, 'turn': 0, 'field': None, 'turn_start': None})
+    return session_id
+
+
+def _ensure_context():
+    context = _context.get()
+    if context is None:
+        start_session()
+        context = _context.get()
+    return context
+
+
+def start_turn():
+    """Open a new turn; its latency runs until end_turn (first response audio)"""
+    context = _ensure_context()
+    context['turn'] += 1
+    context['turn_start'] = time.perf_counter()
+    return context['turn']
+
+
+def end_turn(**attrs):
+    """Close the open turn, recording its end-to-end latency"""
+    context = _context.get()
+    if not context or context.get('turn_start') is None:
+        return None
+    duration = time.perf_counter() - context['turn_start']
+    context['turn_start'] = None
+    tracer.record('turn', duration, **attrs)
+    return duration
+
+
+def set_field(category, field):
+    """Tag subsequent spans with the verification field being worked on"""
+    context = _ensure_context()
+    context['field'] = f"{category}.{field}" if category and field else None
+
+
+def span(stage, **attrs):
+    return tracer.span(stage, **attrs)
+
+
+def record(stage, duration, **attrs):
+    tracer.record(stage, duration, **attrs)
+
+
+def increment(name, amount=1, **labels):
+    tracer.increment(name, amount, **labels)
+
+
+def traced(stage):
+    """Decorator recording a span for every call of the wrapped function"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedChat:
+    """Chat session proxy that records a span for every send_message"""
+    def __init__(self, chat):
+        self._chat = chat
+
+    def send_message(self, content, *args, **kwargs):
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        with tracer.span('send_message', prompt_chars=len(text)):
+            return self._chat.send_message(content, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize_traces(path=TRACE_FILE):
+    """p50/p95 per stage from a span file, with each stage's share of turn time"""
+    durations = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            durations[record['stage']].append(record['duration_ms'])
+
+    turn_total = sum(durations.get('turn', ())) or None
+    print(f"{'stage':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'share':>8}")
+    for stage, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        p50 = values[int(0.5 * (len(values) - 1))]
+        p95 = values[int(0.95 * (len(values) - 1))]
+        share = f"{sum(values) / turn_total:.0%}" if turn_total and stage != 'turn' else ''
+        print(f"{stage:<24}{len(values):>7}{p50:>10.1f}{p95:>10.1f}{share:>8}")
+
+
+if __name__ == '__main__':
+    import sys
+    summarize_traces(sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE)
@@ -1,18 +1,129 @@
-from TTS.api import TTS
+import os
+import time
 import numpy as np
 import simpleaudio as sa
-from datetime import time
+from model_registry import get_model
+from tracing import span, end_turn
 
-def initialize_tts():
-    return TTS(model_name="tts_models/en/ljspeech/tacotron2-DDC", progress_bar=False)
+# Coqui LJSpeech voices selectable per deployment. tacotron2 is autoregressive;
+# glow-tts, speedy-speech and fast-pitch generate all frames in one pass.
+TTS_MODELS = {
+    'tacotron2': 'tts_models/en/ljspeech/tacotron2-DDC',
+    'glow-tts': 'tts_models/en/ljspeech/glow-tts',
+    'speedy-speech': 'tts_models/en/ljspeech/speedy-speech',
+    'fast-pitch': 'tts_models/en/ljspeech/fast_pitch',
+    'vits': 'tts_models/en/ljspeech/vits'
+}
+DEFAULT_TTS_BACKEND = 'tacotron2'
 
-def handle_speech_output(queue, play_obj, wav_data, recognizer, source):
+# The 'tone' backend stands in for a real voice in load tests
+TONE_CHARS_PER_SECOND = 15
+TONE_TTS_RTF = float(os.getenv('TONE_TTS_RTF', '0.05'))
+
+# Playback peak for normalized PCM; slightly below full scale so crossfaded
+# segments never clip.
+PCM_PEAK = 0.95
+
+
+def to_pcm16(wav, peak=PCM_PEAK):
+    """Convert a float waveform to contiguous int16 PCM with peak normalization.
+
+    The float data is copied once into a float32 buffer that is scaled in place,
+    then cast once to int16. int16 input is returned as is.
+    """
+    if isinstance(wav, np.ndarray) and wav.dtype == np.int16:
+        return np.ascontiguousarray(wav)
+    if isinstance(wav, list):
+        wav = np.fromiter(wav, dtype=np.float32, count=len(wav))
+    else:
+        wav = np.array(wav, dtype=np.float32)
+
+    if not wav.size:
+        return np.zeros(0, dtype=np.int16)
+    top = max(float(wav.max()), -float(wav.min()), 0.01)
+    np.multiply(wav, 32767 * peak / top, out=wav)
+    return wav.astype(np.int16)
+
+
+class TTSBackend:
+    """Interface every TTS backend implements"""
+    name = None
+    sample_rate = 22050
+
+    def tts(self, text):
+        """Synthesize text and return the waveform as a float sequence"""
+        raise NotImplementedError
+
+    def pcm(self, text):
+        """Synthesize text as normalized, contiguous int16 PCM"""
+        return to_pcm16(self.tts(text=text))
+
+    def split_sentences(self, text):
+        return [text]
+
+    def tts_stream(self, text):
+        """Yield int16 PCM sentence by sentence so playback can start early"""
+        for sentence in self.split_sentences(text):
+            if sentence.strip():
+                yield self.pcm(sentence)
+
+
+class CoquiBackend(TTSBackend):
+    def __init__(self, name, model_name):
+        from TTS.api import TTS
+        self.name = name
+        self.model_name = model_name
+        self.model = get_model(('tts', model_name), lambda: TTS(model_name=model_name, progress_bar=False))
+        self.sample_rate = self.model.synthesizer.output_sample_rate
+
+    def tts(self, text):
+        return self.model.tts(text=text)
+
+    def split_sentences(self, text):
+        return self.model.synthesizer.split_into_sentences(text)
+
+
+class ToneBackend(TTSBackend):
+    """Stand-in voice for load tests: a tone as long as the speech would be, costing rtf x its duration"""
+    name = 'tone'
+
+    def __init__(self, sample_rate=22050, chars_per_second=TONE_CHARS_PER_SECOND, rtf=TONE_TTS_RTF):
+        self.sample_rate = sample_rate
+        self.chars_per_second = chars_per_second
+        self.rtf = rtf
+
+    def pcm(self, text):
+        duration = max(0.2, len(text) / self.chars_per_second)
+        if self.rtf:
+            time.sleep(duration * self.rtf)
+        t = np.arange(int(duration * self.sample_rate), dtype=np.float32) / self.sample_rate
+        return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+
+    def tts(self, text):
+        return self.pcm(text).astype(np.float32) / 32768.0
+
+
+def initialize_tts(backend=None):
+    import model_server
+    if model_server.client_enabled():
+        return model_server.remote_tts_backend()
+    backend = backend or os.getenv('TTS_BACKEND', DEFAULT_TTS_BACKEND)
+    if backend == 'tone':
+        return ToneBackend()
+    if backend not in TTS_MODELS:
+        raise ValueError(f"Unknown TTS backend '{backend}', expected one of {tuple(TTS_MODELS)}")
+    return CoquiBackend(backend, TTS_MODELS[backend])
+
+def handle_speech_output(queue, play_obj, wav_data, recognizer, source, sample_rate=22050):
     try:
-        wav_norm = wav_data * (32767 / max(0.01, np.max(np.abs(wav_data))))
-        audio_obj = sa.WaveObject(wav_norm.astype(np.int16), 1, 2, 22050)
+        # Hand the int16 buffer to simpleaudio without another copy
+        pcm = to_pcm16(wav_data)
+        audio_obj = sa.WaveObject(memoryview(pcm), 1, 2, sample_rate)
         
         if not play_obj or not play_obj.is_playing():
-            play_obj = audio_obj.play()
+            with span('playback_start'):
+                play_obj = audio_obj.play()
+            end_turn()
             
             while play_obj.is_playing():
                 try:
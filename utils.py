@@ -6,6 +6,14 @@ import pandas as pd
 from langchain_community.embeddings import HuggingFaceInstructEmbeddings
 from langchain_community.vectorstores import FAISS
 from flow import verify_patient
+from tracing import traced, increment
+from model_registry import get_model
+import model_server
+from llm import DeadlineExceeded
+from local_llm import INFO_PATTERN
+from schema import CATEGORIES
+
+EMBEDDING_MODEL = "hkunlp/instructor-base"
 
 def format_date(date_str):
     date_obj = datetime.strptime(date_str, '%Y-%m-%d')
@@ -52,27 +60,39 @@ def get_verification_summary(verification):
         'status': 'incomplete'
     }
     
-    for category in verification.verification_data:
-        summary['collected'][category] = {}
-        for field, value in verification.verification_data[category].items():
-            if value is not None:
-                summary['collected'][category][field] = value
-            else:
-                summary['missing'].append(f"{category}.{field}")
+    collected = summary['collected']
+    for category in CATEGORIES:
+        collected[category] = {}
+    for spec, value in verification.record.items():
+        if value is not None:
+            collected[spec.category][spec.name] = value
+        else:
+            summary['missing'].append(spec.key)
     
-    if not summary['missing']:
+    if verification.record.complete:
         summary['status'] = 'complete'
+    summary['prefilled'] = sorted(getattr(verification, 'prefilled', ()))
     
     return summary
 
+def load_instructor_embeddings():
+    """The shared instructor-base embedding model"""
+    return get_model(('embed', EMBEDDING_MODEL), lambda: HuggingFaceInstructEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True}
+    ))
+
+def load_embeddings():
+    """Embeddings for the correction index, served by the model server when one is configured"""
+    if model_server.client_enabled():
+        return model_server.RemoteEmbeddings()
+    return load_instructor_embeddings()
+
 def initialize_correction_system():
     try:
         df = pd.read_csv("./correction_lookup.csv")
-        embeddings = HuggingFaceInstructEmbeddings(
-            model_name="hkunlp/instructor-base",
-            model_kwargs={"device": "cpu"},
-            encode_kwargs={"normalize_embeddings": True}
-        )
+        embeddings = load_embeddings()
         misheard_texts = df['misheard'].tolist()
         faiss_index = FAISS.from_texts(texts=misheard_texts, embedding=embeddings)
         print("Correction system initialized successfully")
@@ -82,6 +102,7 @@ def initialize_correction_system():
         return None, None
 
 
+@traced('find_similar_terms')
 def find_similar_terms(query, faiss_index, df, current_context = "patient information", threshold = 0.70):
     """Search for similar terms using FAISS index with context"""
     if not query or not query.strip():
@@ -132,6 +153,7 @@ def get_llm_correction(text: str, verification) -> dict:
         print(f"Error in LLM correction: {str(e)}")
         return None
 
+@traced('validate_input_context')
 def validate_input_context(text: str, verification, faiss_index=None, correction_df=None) -> dict:
     try:
         # Get current state safely
@@ -153,16 +175,11 @@ def validate_input_context(text: str, verification, faiss_index=None, correction
             # Try to extract information FIRST before any correction
             current_category = getattr(verification.conversation_manager, 'current_category', None)
             if current_category:
-                current_fields = verification.conversation_manager.insurance_qa[current_category].keys()
-                current_field = None
-                
-                for field in current_fields:
-                    if verification.verification_data[current_category][field] is None:
-                        current_field = field
-                        break
+                spec = verification.conversation_manager.current_spec()
+                current_field = spec.name if spec is not None else None
 
                 if current_field:
-                    current_question = verification.conversation_manager.insurance_qa[current_category][current_field]['question']
+                    current_question = spec.question
                     print(f"Current field: {current_field}")
                     print(f"Current question: {current_question}")
 
@@ -179,8 +196,12 @@ def validate_input_context(text: str, verification, faiss_index=None, correction
                     Return ONLY 'True' if extractable info exists, 'False' if not.
                     Text: "{text}" """
                     
-                    response = verification.chat.send_message({"text": info_prompt})
-                    has_info = response.text.strip().lower() == 'true'
+                    try:
+                        response = verification.chat.send_message({"text": info_prompt})
+                        has_info = response.text.strip().lower() == 'true'
+                    except DeadlineExceeded:
+                        increment('llm_fallbacks', check='has_info')
+                        has_info = bool(INFO_PATTERN.search(text))
                     print(f"Contains relevant info for {current_field}: {has_info}")
                     
                     if has_info: